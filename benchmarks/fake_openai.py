@@ -0,0 +1,143 @@
+"""
+Local stand-in for the OpenAI chat completions endpoint.
+
+Answers POST /v1/chat/completions (plain and streamed) after a configurable
+latency, so end-to-end runs can be timed without network, cost or noise.
+Point the CLI at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+    python benchmarks/fake_openai.py --port 8765 --latency 0.3 --token-delay 0.01
+
+With --rate-limit-every N, every Nth request is answered with a 429 and a
+retry-after header instead, to exercise the client's retries.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+DEFAULT_MESSAGE = "feat: add synthetic benchmark changes\n\n- Update generated modules\n- Rename helpers"
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], latency: float = 0.0, token_delay: float = 0.0, message: str = DEFAULT_MESSAGE,
+                 rate_limit_every: int = 0, retry_after: float = 1.0):
+        super().__init__(address, FakeOpenAIHandler)
+        self.latency = latency  # seconds before the first byte of an answer
+        self.token_delay = token_delay  # seconds between streamed pieces
+        self.message = message
+        self.rate_limit_every = rate_limit_every  # 0: never
+        self.retry_after = retry_after  # seconds, sent with every 429
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        server: FakeOpenAIServer = self.server
+        with server.lock:
+            server.requests += 1
+            limited = server.rate_limit_every and server.requests % server.rate_limit_every == 0
+        if limited:
+            self.send_json({"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                           status=429, headers={"retry-after": f"{server.retry_after:g}"})
+            return
+        prompt_tokens = sum(len(str(m.get("content", ""))) // 4 for m in body.get("messages", []))
+        message = server.message
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            message = json.dumps({"messages": [server.message] * max(1, str(body).count("### Commit"))})
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(message) // 4,
+            "total_tokens": prompt_tokens + len(message) // 4,
+        }
+        time.sleep(server.latency)
+        if body.get("stream"):
+            self.stream(body, message, usage)
+        else:
+            self.send_json({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": message}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+    def send_json(self, data, status: int = 200, headers: Optional[dict] = None):
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def stream(self, body, message: str, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(data: Optional[dict]):
+            line = b"data: " + (json.dumps(data).encode() if data is not None else b"[DONE]") + b"\n\n"
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            self.wfile.flush()
+
+        base = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model", "fake")}
+        words = message.split(" ")
+        for i, word in enumerate(words):
+            piece = word if i == 0 else " " + word
+            event({**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+            time.sleep(self.server.token_delay)
+        event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            event({**base, "choices": [], "usage": usage})
+        event(None)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def start_server(latency: float = 0.0, token_delay: float = 0.0, port: int = 0, rate_limit_every: int = 0) -> FakeOpenAIServer:
+    """Start the server on a background thread; stop it with `.shutdown()`."""
+    server = FakeOpenAIServer(("127.0.0.1", port), latency, token_delay, rate_limit_every=rate_limit_every)
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before answering")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds between streamed pieces")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth request with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="seconds in the retry-after header of a 429")
+    args = parser.parse_args()
+    server = FakeOpenAIServer(("127.0.0.1", args.port), args.latency, args.token_delay,
+                              rate_limit_every=args.rate_limit_every, retry_after=args.retry_after)
+    print(f"OPENAI_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Cold-start benchmark for the git-wise CLI.
+
+Runs each subcommand in a fresh interpreter several times and records the
+best and median wall-clock time. Results are printed as a table and can be
+written as JSON with --output.
+
+    python benchmarks/startup.py --runs 10 --output startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = [
+    ["--help"],
+    ["--version"],
+    ["show-config"],
+    ["doctor"],
+    ["start", "--help"],
+    ["show-diff", "--help"],
+]
+
+ENTRY = "from git_wise.cli import main; main()"
+
+
+def time_command(args, runs, cwd, entry=ENTRY):
+    timings = []
+    for _ in range(runs):
+        begin = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", entry, *args],
+            cwd=cwd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        timings.append((time.perf_counter() - begin) * 1000)
+    return {
+        "command": " ".join(args),
+        "runs": runs,
+        "best_ms": round(min(timings), 1),
+        "median_ms": round(statistics.median(timings), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="runs per command")
+    parser.add_argument("--cwd", default=os.getcwd(), help="directory to run the commands in")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    # Baseline: how long does a bare interpreter take to start here?
+    baseline = time_command([], args.runs, args.cwd, entry="pass")
+    baseline["command"] = "<interpreter>"
+
+    results = [baseline] + [time_command(command, args.runs, args.cwd) for command in COMMANDS]
+
+    width = max(len(r["command"]) for r in results)
+    print(f"{'command':<{width}}  {'best':>9}  {'median':>9}")
+    for r in results:
+        print(f"{r['command']:<{width}}  {r['best_ms']:>7.1f}ms  {r['median_ms']:>7.1f}ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "benchmark": "startup",
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
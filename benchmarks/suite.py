@@ -0,0 +1,148 @@
+"""
+Benchmark suite for git-wise.
+
+Builds a synthetic repository (see synthetic_repo.py), starts the fake OpenAI
+server (see fake_openai.py) and times:
+
+- get_all_staged_diffs, in AI and user mode
+- extract_diff_hunks over every modified file's patch
+- TokenCounter.count_tokens over the prompt sections
+- CommitMessageGenerator._create_messages
+- `git-wise start` end to end, in a fresh interpreter against the fake server
+
+Results are printed as a table and can be written as JSON with --output, to
+compare releases. A step that cannot run here (e.g. the tokenizer cannot be
+downloaded) is reported with its error instead of a timing.
+
+    python benchmarks/suite.py --runs 5 --files 2000 --latency 0.3 --output suite.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openai import start_server  # noqa: E402
+from synthetic_repo import RepoSpec, make_repo  # noqa: E402
+
+ENTRY = "from git_wise.cli import main; main()"
+
+
+def measure(name, fn, runs):
+    timings = []
+    try:
+        for _ in range(runs):
+            begin = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - begin) * 1000)
+    except Exception as e:
+        return {"name": name, "runs": len(timings), "error": f"{type(e).__name__}: {e}"}
+    return {
+        "name": name,
+        "runs": runs,
+        "best_ms": round(min(timings), 2),
+        "median_ms": round(statistics.median(timings), 2),
+    }
+
+
+def run_start(repo_path, home, base_url, args=()):
+    env = dict(
+        os.environ,
+        HOME=home,  # no ~/.git-wise.yaml: defaults only
+        OPENAI_API_KEY="sk-benchmark",
+        OPENAI_BASE_URL=base_url,
+        GIT_WISE_OFFLINE="1",
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", ENTRY, "start", "--no-cache", *args],
+        cwd=repo_path,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError((result.stdout + result.stderr).strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="runs per step")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake server latency in seconds")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="fake server delay between streamed pieces")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    for name, value in asdict(RepoSpec()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=value, help="synthetic repository: %(default)s")
+    args = parser.parse_args()
+    spec = RepoSpec(**{name: getattr(args, name) for name in asdict(RepoSpec())})
+
+    from git.repo import Repo as GitRepo
+    from git_wise.core.prompts import SYSTEM_PROMPT
+    from git_wise.utils.git_utils import extract_diff_hunks, get_all_staged_diffs, iter_staged_files
+
+    server = start_server(args.latency, args.token_delay)
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    results = []
+    with tempfile.TemporaryDirectory(prefix="git-wise-bench-") as tmp:
+        repo_path = os.path.join(tmp, "repo")
+        results.append(measure("make synthetic repo", lambda: make_repo(repo_path, spec), 1))
+        repo = GitRepo(repo_path)
+
+        results.append(measure("get_all_staged_diffs (ai)", lambda: get_all_staged_diffs(repo), args.runs))
+        results.append(measure("get_all_staged_diffs (user)", lambda: get_all_staged_diffs(repo, for_prompt=False), args.runs))
+
+        patches = [f.diff for f in iter_staged_files(repo) if f.status in ("modified", "renamed") and f.diff]
+        results.append(measure("extract_diff_hunks", lambda: [extract_diff_hunks(p) for p in patches], args.runs))
+
+        sections = ["\n".join(info) for info in get_all_staged_diffs(repo).values()]
+        generator = None
+        try:
+            from git_wise.core.generator import AIProvider, CommitMessageGenerator, format_context
+            generator = CommitMessageGenerator(AIProvider.OPENAI)
+        except Exception as e:
+            error = {"error": f"{type(e).__name__}: {e}"}
+            results.append({"name": "TokenCounter.count_tokens", "runs": 0, **error})
+            results.append({"name": "_create_messages", "runs": 0, **error})
+        if generator is not None:
+            counter = generator.token_counter
+            results.append(measure("TokenCounter.count_tokens", lambda: [counter.count_tokens(s) for s in sections], args.runs))
+            chunks, _ = generator.chunker.chunk(sections)
+            context = format_context("brief", "en", {})
+            results.append(measure("_create_messages", lambda: generator._create_messages(SYSTEM_PROMPT, chunks, context), args.runs))
+
+        home = os.path.join(tmp, "home")
+        os.makedirs(home)
+        results.append(measure("start (end to end)", lambda: run_start(repo_path, home, server.base_url), args.runs))
+        results.append(measure("start --no-stream (end to end)", lambda: run_start(repo_path, home, server.base_url, ["--no-stream"]), args.runs))
+    server.shutdown()
+
+    width = max(len(r["name"]) for r in results)
+    print(f"{'step':<{width}}  {'best':>11}  {'median':>11}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['name']:<{width}}  error: {r['error']}")
+        else:
+            print(f"{r['name']:<{width}}  {r['best_ms']:>9.1f}ms  {r['median_ms']:>9.1f}ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "benchmark": "suite",
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "git": subprocess.run(["git", "--version"], capture_output=True, text=True).stdout.strip(),
+                "spec": asdict(spec),
+                "fake_server": {"latency": args.latency, "token_delay": args.token_delay, "requests": server.requests},
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
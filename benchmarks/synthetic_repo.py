@@ -0,0 +1,132 @@
+"""
+Synthetic git repositories for the benchmarks.
+
+Builds a repository with a history of `history` commits (written with
+`git fast-import`, so deep histories take seconds) and then stages a mix of
+changes on top: small edits, large modified files, renames, new binaries,
+new and deleted files. The same arguments always produce the same repository.
+
+    python benchmarks/synthetic_repo.py /tmp/bench-repo --files 2000 --history 500
+"""
+import argparse
+import os
+import random
+import shutil
+import subprocess
+from dataclasses import asdict, dataclass
+
+
+@dataclass
+class RepoSpec:
+    files: int = 500  # tracked files before the staged changes
+    modified: int = 100  # small edits
+    large: int = 5  # modified files that are rewritten to `large_kb`
+    large_kb: int = 512
+    renames: int = 20  # renamed, with a small edit
+    binaries: int = 10  # new binary files
+    new: int = 50
+    deleted: int = 20
+    history: int = 200  # commits before the staged changes
+    depth: int = 3  # directory levels
+    seed: int = 0
+
+
+def source_file(rng: random.Random, name: str, lines: int) -> str:
+    body = []
+    for i in range(lines // 2):
+        body.append(f"def {name}_{i}(value):\n    return value * {rng.randint(1, 999)} + {i}\n")
+    return "".join(body)
+
+
+def make_paths(rng: random.Random, spec: RepoSpec):
+    paths = []
+    for i in range(spec.files):
+        parts = [f"pkg{rng.randint(0, 9)}"] + [f"mod{rng.randint(0, 5)}" for _ in range(rng.randint(0, spec.depth - 1))]
+        paths.append("/".join(parts + [f"file_{i}.py"]))
+    return paths
+
+
+def git(path, *args, **kwargs):
+    return subprocess.run(["git", *args], cwd=path, check=True, capture_output=True, **kwargs)
+
+
+def fast_import_stream(rng: random.Random, spec: RepoSpec, paths) -> bytes:
+    """A fast-import stream: one commit adding every file, then `history - 1` small commits."""
+    out = []
+
+    def data(content: bytes):
+        out.append(b"data %d\n" % len(content) + content + b"\n")
+
+    def commit(index: int, message: str, changes):
+        out.append(b"commit refs/heads/main\n")
+        out.append(b"committer Bench <bench@example.com> %d +0000\n" % (1700000000 + index * 60))
+        data(message.encode())
+        for path, content in changes:
+            out.append(b"M 100644 inline " + path.encode() + b"\n")
+            data(content.encode())
+
+    commit(1, "initial import", [(p, source_file(rng, f"f{i}", 40)) for i, p in enumerate(paths)])
+    for index in range(2, spec.history + 1):
+        touched = rng.sample(paths, min(len(paths), rng.randint(1, 6)))
+        commit(index, f"change {index}", [(p, source_file(rng, f"h{index}", 40)) for p in touched])
+    return b"".join(out)
+
+
+def make_repo(path: str, spec: RepoSpec = RepoSpec()) -> str:
+    """Create the repository at `path` (replacing it) and stage the changes. Returns `path`."""
+    rng = random.Random(spec.seed)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    git(path, "init", "-q")
+    git(path, "config", "user.email", "bench@example.com")
+    git(path, "config", "user.name", "Bench")
+
+    paths = make_paths(rng, spec)
+    git(path, "fast-import", "--quiet", input=fast_import_stream(rng, spec, paths))
+    git(path, "symbolic-ref", "HEAD", "refs/heads/main")
+    git(path, "reset", "-q", "--hard")
+
+    def write(relative: str, content):
+        full = os.path.join(path, relative)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, "wb" if isinstance(content, bytes) else "w") as f:
+            f.write(content)
+
+    pool = list(paths)
+    rng.shuffle(pool)
+    take = lambda n: [pool.pop() for _ in range(min(n, len(pool)))]
+
+    for p in take(spec.modified):
+        with open(os.path.join(path, p), "a") as f:
+            f.write(source_file(rng, "edit", 6))
+    for p in take(spec.large):
+        write(p, source_file(rng, "large", spec.large_kb * 1024 // 36))
+    renamed = take(spec.renames)
+    for i, p in enumerate(renamed):
+        target = os.path.join(os.path.dirname(p), f"renamed_{i}.py")
+        git(path, "mv", p, target)
+        with open(os.path.join(path, target), "a") as f:
+            f.write("# moved\n")
+    for p in take(spec.deleted):
+        os.remove(os.path.join(path, p))
+    for i in range(spec.binaries):
+        write(f"assets/blob_{i}.bin", bytes(rng.getrandbits(8) for _ in range(4096)) + b"\0")
+    for i in range(spec.new):
+        write(f"pkg_new/new_{i}.py", source_file(rng, f"n{i}", 30))
+    git(path, "add", "-A")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    for name, value in asdict(RepoSpec()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=value)
+    args = vars(parser.parse_args())
+    path = args.pop("path")
+    make_repo(path, RepoSpec(**args))
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
 __version__ = "0.1.0"
 
-from .cli import main
+
+def main():
+    # the CLI is only imported when it runs, see client.py
+    from .cli import main
+    main()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,157 @@
+"""
+`git-wise batch`: commit messages for many repositories and worktrees at once.
+
+Every repository's staged changes are collected in a pool of worker processes
+(git calls, blob reads and filtering are per repository and mostly CPU and
+process bound). The model requests of all repositories go through one shared
+pool of `concurrency` threads in this process and one scheduler per provider and
+model (core/scheduler.py), so the provider sees at most that many requests at a
+time, within its rate limits, however many repositories there are. Each request
+starts as soon as its repository is collected. One JSON result per repository
+is handed to `emit` as soon as it is done, so the whole batch takes about as
+long as its slowest repository rather than the sum of all of them.
+"""
+import contextlib
+import glob
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from git_wise.core.staged import StagedPrompt, collect_prompt, generate_for_prompt, make_generator
+
+STATUS_GENERATED = "generated"
+STATUS_CACHED = "cached"
+STATUS_EMPTY = "nothing staged"
+STATUS_ERROR = "error"
+
+
+def expand_paths(patterns: Iterable[str], worktrees: bool = False) -> List[str]:
+    """
+    Repository paths from paths and glob patterns (e.g. `~/src/*`), in order and
+    without duplicates. With `worktrees`, every worktree of each repository is added.
+    """
+    paths: List[str] = []
+    seen = set()
+
+    def add(path: str):
+        key = os.path.realpath(path)
+        if key not in seen:
+            seen.add(key)
+            paths.append(path)
+
+    for pattern in patterns:
+        pattern = os.path.expanduser(pattern)
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            add(path)
+            if worktrees:
+                for worktree in list_worktrees(path):
+                    add(worktree)
+    return paths
+
+
+def list_worktrees(path: str) -> List[str]:
+    result = subprocess.run(["git", "worktree", "list", "--porcelain"], cwd=path, capture_output=True, text=True)
+    if result.returncode != 0:
+        return []
+    return [line[len("worktree "):] for line in result.stdout.splitlines() if line.startswith("worktree ")]
+
+
+def make_result(path: str, status: str, **fields) -> Dict[str, Any]:
+    result = {
+        "path": path,
+        "status": status,
+        "message": None,
+        "tokens": 0,
+        "files": 0,
+        "excluded": [],
+        "collect_ms": None,
+        "generate_ms": None,
+        "error": None,
+    }
+    result.update(fields)
+    return result
+
+
+def collect_repository(path: str, config: Dict, use_cache: bool) -> Optional[StagedPrompt]:
+    """Runs in a worker process."""
+    from git_wise.utils.git_utils import get_repo
+    # stdout carries the results, warnings go to stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        return collect_prompt(get_repo(path), config, use_cache=use_cache)
+
+
+def run_batch(
+    paths: List[str],
+    config: Dict,
+    emit: Callable[[Dict[str, Any]], None],
+    jobs: Optional[int] = None,
+    concurrency: int = 4,
+    use_cache: bool = True,
+) -> List[Dict[str, Any]]:
+    """Generate the messages of `paths`, calling `emit` with each result as it is done. Returns all results."""
+    results: List[Dict[str, Any]] = []
+    # (provider, model) -> CommitMessageGenerator, shared by all repositories so they share its scheduler
+    # and rate limits; a generator keeps no per-call state across threads (last_stats is per thread)
+    generators: Dict[Any, Any] = {}
+    generators_lock = threading.Lock()
+
+    def finish(result: Dict[str, Any]):
+        results.append(result)
+        emit(result)
+
+    def generate(prompt: StagedPrompt) -> Dict[str, Any]:
+        started = time.perf_counter()
+        with generators_lock:
+            key = (prompt.provider, prompt.model)
+            if key not in generators:
+                generators[key] = make_generator(prompt, config, concurrency)
+            generator = generators[key]
+        message, tokens = generate_for_prompt(prompt, generator, config)
+        return finished(prompt, STATUS_GENERATED, message=message, tokens=tokens, generate_ms=round((time.perf_counter() - started) * 1000))
+
+    def finished(prompt: StagedPrompt, status: str, **fields) -> Dict[str, Any]:
+        return make_result(
+            prompt.path, status, files=len(prompt.diffs), excluded=prompt.excluded,
+            collect_ms=round(prompt.seconds * 1000), **fields,
+        )
+
+    if not paths:
+        return results
+    jobs = jobs or min(len(paths), os.cpu_count() or 1)
+    # spawn: the request threads must not be forked into the workers
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as processes, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="git-wise request") as requests:
+        collecting = {processes.submit(collect_repository, path, config, use_cache): path for path in paths}
+        generating = {}
+        pending = set(collecting)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in collecting:
+                    path = collecting[future]
+                    try:
+                        prompt = future.result()
+                    except Exception as e:
+                        finish(make_result(path, STATUS_ERROR, error=str(e) or type(e).__name__))
+                        continue
+                    if prompt is None:
+                        finish(make_result(path, STATUS_EMPTY))
+                    elif prompt.cached_message is not None:
+                        finish(finished(prompt, STATUS_CACHED, message=prompt.cached_message))
+                    else:
+                        request = requests.submit(generate, prompt)
+                        generating[request] = path
+                        pending.add(request)
+                else:
+                    try:
+                        finish(future.result())
+                    except Exception as e:
+                        finish(make_result(generating[future], STATUS_ERROR, error=str(e) or type(e).__name__))
+    return results
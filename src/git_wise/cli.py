@@ -1,25 +1,24 @@
 import click
+from contextlib import contextmanager, redirect_stdout
 from rich.console import Console
 from rich.text import Text
 from rich.panel import Panel
-import questionary
-from git_wise.core.generator import CommitMessageGenerator
-from git_wise.config import load_config, save_config, get_api_key
-from git_wise.utils.git_utils import get_all_staged_diffs, get_current_repo_info, print_staged_changes
-from git_wise.core.generator import AIProvider
+from git_wise.config import load_config, save_config, get_api_key, is_offline
 import sys
 from git_wise.utils.exceptions import GitWiseError
-from git.exc import InvalidGitRepositoryError
-from typing import List
-import pyperclip
-from rich.syntax import Syntax
+from typing import Callable, List, Optional
 import os
 import tempfile
+import time
 import traceback
 from git_wise.models.git_models import Language, DetailLevel, Model
 
+# NOTE: openai, tiktoken, GitPython, questionary and pyperclip are imported inside the
+# commands that need them, so `git-wise --help`, `show-config` and `doctor` start fast.
+
 console = Console()
 VERSION = "0.1.0"
+SHOW_DIFF_MAX_BYTES = 8 * 1024  # per file, for show-diff
 
 @click.group()
 @click.version_option(VERSION, '-v', '--version', message='Git-Wise Version: %(version)s')
@@ -30,9 +29,11 @@ def cli():
     
     Use 'git-wise COMMAND --help' for more information about specific commands.
     """
-    pass
+    from git_wise.utils.tracing import enable_tracing
+    enable_tracing()  # GIT_WISE_TRACE, for every command
 
 def configure_language(current_config):
+    import questionary
     language_choice = questionary.select(
         "Select your default commit message language:",
         choices=[lang.value[0] for lang in Language],
@@ -52,6 +53,7 @@ def configure_language(current_config):
     return current_config
 
 def configure_detail_level(current_config):
+    import questionary
     detail_level = questionary.select(
         "Select the detail level for commit messages:",
         choices=[level.value[0] for level in DetailLevel],
@@ -70,6 +72,7 @@ def configure_api_key(current_config):
     return current_config
 
 def configure_model(current_config):
+    import questionary
     model_choice = questionary.select(
         "Select the default model:",
         choices=[model.value[0] for model in Model],
@@ -80,6 +83,7 @@ def configure_model(current_config):
     return current_config
 
 def configure_interactive(current_config):
+    import questionary
     interactive = questionary.confirm(
         "Do you want to enable interactive mode by default?",
         default=True
@@ -88,6 +92,7 @@ def configure_interactive(current_config):
     return current_config
 
 def configure_unlimited_chunk(current_config):
+    import questionary
     unlimited_chunk = questionary.confirm(
         "Do you want to enable unlimited chunk mode by default?",
         default=False
@@ -95,9 +100,31 @@ def configure_unlimited_chunk(current_config):
     current_config['unlimited_chunk'] = unlimited_chunk
     return current_config
 
+def configure_provider(current_config):
+    import questionary
+    from git_wise.core.providers import DEFAULT_PROVIDER, get_providers
+    provider = questionary.select(
+        "Select the default provider (per repository: git config git-wise.provider <name>):",
+        choices=sorted(get_providers(current_config)),
+        default=current_config.get('provider', DEFAULT_PROVIDER)
+    ).ask()
+    current_config['provider'] = provider
+    return current_config
+
+def configure_max_concurrency(current_config):
+    import questionary
+    max_concurrency = questionary.text(
+        "Max concurrent requests when summarizing large changes:",
+        default=str(current_config.get('max_concurrency', 4)),
+        validate=lambda text: text.isdigit() and int(text) > 0
+    ).ask()
+    current_config['max_concurrency'] = int(max_concurrency)
+    return current_config
+
 @cli.command()
 def init():
     """Initialize or reconfigure Git-Wise"""
+    import questionary
     config = load_config()
     
     if config:
@@ -133,63 +160,263 @@ def init():
     type=click.Choice([level.value[1] for level in DetailLevel]),
     help='Commit message detail level'
 )
-# TODO: feature: split changes into multiple commits
-# @click.option('--split', '-s', is_flag=True, help='Split changes into multiple commits')
-@click.option('--use-author-key', '-a', is_flag=True, help='Use author\'s API key, but not work! because I am poor :(🫡😎🥹')
+@click.option('--split', '-s', is_flag=True, help='Split changes into multiple commits')
+@click.option('--max-files', type=click.IntRange(min=1), default=5, show_default=True, help='Max files per commit with --split')
+@click.option('--use-author-key', '-a', is_flag=True, hidden=True, help='Deprecated, has no effect')
 @click.option('--interactive', '-i', is_flag=True, help='Interactive mode, I will ask you to confirm the commit message and create the commit!')
 @click.option('--unlimited-chunk', '-u', is_flag=True, help='Enable unlimited chunk mode for processing large changes')
-def start(language, detail, use_author_key, interactive, unlimited_chunk):
+@click.option('--concurrency', '-c', type=click.IntRange(min=1), help='Max concurrent requests when summarizing large changes (default: max_concurrency in config)')
+@click.option('--no-cache', is_flag=True, help='Ignore the cached message for unchanged staged changes and ask the AI again')
+@click.option('--offline', is_flag=True, help='Never contact GitHub for repository context, only use what is cached (also: GIT_WISE_OFFLINE=1)')
+@click.option('--verbose', '-V', is_flag=True, help='Show how long each stage took')
+@click.option('--no-stream', is_flag=True, help='Wait for the whole message instead of showing it while it is generated')
+@click.option('--no-filter', is_flag=True, help='Also send generated, vendored, ignored and minified files to the AI')
+@click.option('--provider', '-p', help='Provider to generate with, e.g. openai or local (default: git config git-wise.provider, then provider in config)')
+@click.option('--budget', type=click.IntRange(min=1000), help='Token budget of the prompt; lower-priority files over it are summarized in one line (default: token_budget in config)')
+@click.option('--candidates', '-k', type=click.IntRange(min=1, max=8), help='Messages to ask for in one request, to pick from with --interactive (default: candidates in config, 1)')
+@click.option('--dry-run', is_flag=True, help='Show which files are sent in full or summarized and the estimated tokens, without calling the AI')
+@click.option('--trace', is_flag=False, flag_value='-', metavar='[PATH]', help='Write timing spans as JSON lines to PATH, or to stderr without one (also: GIT_WISE_TRACE)')
+@click.option('--profile', type=click.Path(dir_okay=False), help='Write cProfile stats of this run to this file')
+def start(trace, profile, use_author_key, **options):
     """Generate commit messages for staged changes"""
+    if use_author_key:
+        # TODO: remove in the next release
+        console.print("[yellow]--use-author-key is deprecated and has no effect, API keys come from the provider configuration.[/yellow]")
+    from git_wise.utils.tracing import enable_tracing, span
+    enable_tracing(trace)
+    if not profile:
+        with span("start"):
+            run_start(**options)
+        return
+    
+    import cProfile
+    from git_wise.utils import pipeline
+    # cProfile only sees the thread it runs in, so the stages run one after the other
+    pipeline.RUN_INLINE = True
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(run_start, **options)
+    finally:
+        pipeline.RUN_INLINE = False  # `git-wise serve` runs more commands in this process
+        profiler.dump_stats(profile)
+        console.print(f"[dim]Profile written to {profile} (view it with: python -m pstats {profile})[/dim]")
+
+def run_start(language, detail, split, max_files, interactive, unlimited_chunk, concurrency, no_cache, offline, verbose, no_stream, no_filter, provider, budget, candidates, dry_run):
+    from git.exc import InvalidGitRepositoryError
+    from git_wise.core.cache import DiffCache, MessageCache, prompt_settings
+    from git_wise.core.prompts import PROMPT_VERSION
+    from git_wise.utils.git_utils import get_repo, get_git_wise_dir, get_all_staged_diffs, get_current_repo_info
+    from git_wise.utils.pipeline import Stage, print_stage_timings
+    from git_wise.utils.tracing import span
+    origin = time.perf_counter()
     try:
         console.print("[bold gray]Checking configuration...[/bold gray]")
-        config = load_config()
-        api_key = get_api_key(use_author_key)
-        if not api_key:
+        with span("configuration") as attrs:
+            config = load_config()
+            from git_wise.core.providers import resolve_provider
+            try:
+                provider = resolve_provider(config, provider)
+            except ValueError as e:
+                raise GitWiseError(str(e))
+            attrs["provider"] = provider.name
+        api_key = provider.resolve_api_key()
+        if not api_key and not dry_run:
             raise GitWiseError(
                 "OpenAI API key not set. Please run 'git-wise init' to configure, "
-                "or use --use-author-key option."
+                "or set one for the provider in the config."
             )
         
-        generator = CommitMessageGenerator(AIProvider.OPENAI, model=config.get('default_model'), unlimited_chunk=config.get('unlimited_chunk', False))
-        
+        model = provider.model or config.get('default_model') or Model.GPT4O_MINI.value[1]
         language = language or config.get('default_language', 'en')
         detail = detail or config.get('detail_level', 'brief')
         interactive = interactive or config.get('interactive', False)
         unlimited_chunk = unlimited_chunk or config.get('unlimited_chunk', False)
+        budget = budget or config.get('token_budget')
+        candidates = candidates or config.get('candidates', 1)
+        offline = is_offline(config, offline)
         console.print("[bold green]Checking configuration success![/bold green]")
         
+        def collect_staged_changes():
+            repo = get_repo()
+            diff_cache = DiffCache(get_git_wise_dir(repo, "diffs"))
+            diffs = get_all_staged_diffs(repo, diff_cache=diff_cache)
+            excluded = []
+            if diffs and not no_filter:
+                from git_wise.core.filters import filter_staged_changes, get_ignore_patterns
+                with span("filter", files=len(diffs)) as attrs:
+                    diffs, excluded = filter_staged_changes(repo, diffs, get_ignore_patterns(repo, config))
+                    attrs["excluded"] = len(excluded)
+            return repo, diffs, excluded, diff_cache
+        
+        def setup_generator():
+            from git_wise.core.generator import CommitMessageGenerator, DEFAULT_MAX_CONCURRENCY
+            max_concurrency = concurrency or config.get('max_concurrency', DEFAULT_MAX_CONCURRENCY)
+            return CommitMessageGenerator(provider, model=model, unlimited_chunk=unlimited_chunk, max_concurrency=max_concurrency)
+        
+        def load_token_counter():
+            from git_wise.core.tokenizer import TokenCounter
+            return TokenCounter(model)
+        
+        # None of these depend on each other, so they all run at the same time.
+        # Client setup and repository context are not needed on a cache hit and are simply dropped.
+        stages = [
+            Stage("staged changes", collect_staged_changes),
+            Stage("repository context", get_current_repo_info, offline=offline),
+            # a dry run only counts tokens and needs no client (nor API key)
+            Stage("tokenizer", load_token_counter) if dry_run else Stage("client setup", setup_generator),
+        ]
+        diff_stage, repo_info_stage, generator_stage = stages
+        
         console.print("[bold]Analyzing staged changes...[/bold]")
-        diffs = get_all_staged_diffs()
+        repo, diffs, excluded, diff_cache = diff_stage.result()
         if not diffs:
             raise GitWiseError("No staged files found. Stage your changes using 'git add' first.")
+        if excluded:
+            console.print(f"[dim]Left out of the prompt ({len(excluded)} files, use --no-filter to include them):[/dim]")
+            for item in excluded:
+                console.print(f"[dim]  {item.path}: {item.reason}[/dim]")
         
-        changes: List[List[str]] = []
-        for value in diffs.values():
-            if isinstance(value, dict):
-                changes.append([v for v in value.values()])
-            elif isinstance(value, list):
-                changes.append(value)
-            else:
-                changes.append([value])
+        from git_wise.core.planner import prompt_sections
+        file_sections = prompt_sections(diffs)
                 
         console.print("[bold green]Staged changes found![/bold green]")
-        console.print("[bold]Getting current repository information...[/bold]")
-        repo_info = get_current_repo_info()
-        console.print(Text(f"repository information found.repo info", style="green", justify="left"))
-        # if split:
-        if False:
-            pass
+        if split:
+            from git_wise.core.splitter import split_commits, get_co_changes, create_commits
+            from git_wise.utils.git_utils import list_staged_files
+            staged = list_staged_files(repo)
+            if any(change.status == "unknown" for change in staged):
+                raise GitWiseError("Cannot split changes with unmerged paths. Resolve the conflicts first.")
+            groups = split_commits(staged, max_files, get_co_changes(repo, staged))
+            group_sections = [[file_sections[change.path] for change in group if change.path in file_sections] for group in groups]
+            console.print(f"[bold]Split {len(staged)} files into {len(groups)} commits.[/bold]")
+            if dry_run:
+                for index, group in enumerate(groups, start=1):
+                    files = "\n".join(change.path for change in group)
+                    console.print(Panel(Text(files), title=f"Commit {index}/{len(groups)}", border_style="blue"))
+                diff_cache.save()
+                return
+            
+            console.print("[bold]Getting current repository information...[/bold]")
+            repo_info = repo_info_stage.result()
+            generator = generator_stage.result()
+            diff_cache.seed(generator.token_counter, file_sections)
+            console.print(f"[bold]Generating {len(groups)} commit messages by AI...[/bold]")
+            request_stage = Stage("model requests", generator.generate_commit_messages, group_sections, language, detail, repo_info)
+            stages.append(request_stage)
+            messages, token = request_stage.result()
+            diff_cache.save(generator.token_counter, file_sections)
+            for index, (group, message) in enumerate(zip(groups, messages), start=1):
+                files = "\n".join(f"  {change.path}" for change in group)
+                console.print(Panel(Text(f"{message.strip('`').strip()}\n\n{files}"), title=f"Commit {index}/{len(groups)}", border_style="blue"))
+            cached = f", {generator.cached_tokens} cached" if generator.cached_tokens else ""
+            retries = f", {generator.retries} retries" if generator.retries else ""
+            console.print(f"[dim]{token} tokens{cached}{retries}[/dim]")
+            if verbose:
+                print_stage_timings(console, stages, origin)
+            
+            if interactive:
+                import questionary
+                if questionary.confirm(f"Do you want to create these {len(groups)} commits?").ask():
+                    create_commits(repo, groups, [message.strip('`').strip() for message in messages])
+                    console.print(f"[green]{len(groups)} commits created successfully![/green]")
+                    console.print("[bold]Tip: Now, You can push them with 'git push' 🫡[/bold]")
         else:
-            changes_str = "\n".join(["\n".join(change) for change in changes])
+            sections = list(file_sections.values())
+            if dry_run:
+                from git_wise.core.generator import CommitMessageGenerator, format_context
+                from git_wise.core.planner import plan_prompt
+                from git_wise.core.prompts import SYSTEM_PROMPT
+                token_counter = generator_stage.result()
+                diff_cache.seed(token_counter, file_sections)
+                plan = plan_prompt(diffs, token_counter, budget or CommitMessageGenerator.TOKEN_BUDGET, exact=True)
+                diff_cache.save(token_counter, file_sections)
+                context = format_context(detail, language, repo_info_stage.result())
+                print_prompt_plan(plan, sum(token_counter.count_tokens_batch([SYSTEM_PROMPT, context])), unlimited_chunk)
+                return
+            
+            with span("cache lookup") as attrs:
+                cache = MessageCache(get_git_wise_dir(repo, "messages"))
+                settings = prompt_settings(budget, unlimited_chunk, filtered=not no_filter)
+                cache_key = MessageCache.make_key(sections, language, detail, f"{provider.name}/{model}", PROMPT_VERSION, settings)
+                commit_message = None if no_cache else cache.get(cache_key)
+                attrs["hit"] = commit_message is not None
+            
+            def prepare_generator():
+                """The generator, repository context and planned sections, once the background stages are done."""
+                console.print("[bold]Getting current repository information...[/bold]")
+                repo_info = repo_info_stage.result()
+                console.print(Text(f"repository information found.repo info", style="green", justify="left"))
+                generator = generator_stage.result()
+                diff_cache.seed(generator.token_counter, file_sections)
+                if excluded:
+                    from git_wise.core.filters import count_saved_tokens
+                    console.print(f"[dim]Filtering saved about {count_saved_tokens(excluded, generator.token_counter)} tokens.[/dim]")
+                planned = sections
+                if not unlimited_chunk:
+                    from git_wise.core.planner import plan_prompt
+                    plan = plan_prompt(diffs, generator.token_counter, budget or generator.TOKEN_BUDGET)
+                    planned = plan.sections
+                    if plan.summarized:
+                        console.print(f"[yellow]{len(plan.summarized)} lower-priority files are summarized in one line to fit the token budget of {plan.budget} tokens (see --dry-run).[/yellow]")
+                return generator, repo_info, planned
             
-            console.print("[bold]Generating commit message by AI...[/bold]")
-            commit_message, token = generator.generate_commit_message(changes_str, language, detail, repo_info)
-            display_commit_message(commit_message, token, interactive)
+            generator = None
+            prompt = None  # messages of the final request, for regenerating
+            if commit_message is not None:
+                console.print("[bold green]Using the cached commit message for these staged changes (use --no-cache to generate a new one).[/bold green]")
+                messages = [commit_message]
+                token = 0
+                stats = None
+                stages = [diff_stage]
+                diff_cache.save()
+            else:
+                generator, repo_info, planned = prepare_generator()
+                console.print("[bold]Generating commit message by AI...[/bold]")
+
+                def request(generate, *args, **kwargs):
+                    # the stats and prompt of a call are kept per thread: take them from the stage's
+                    result = generate(*args, **kwargs)
+                    return result, generator.last_stats, generator.last_prompt
+
+                if candidates > 1:
+                    # one request for all of them; n > 1 answers are not streamed
+                    request_stage = Stage("model request", request, generator.generate_candidates, planned, language, detail, repo_info, candidates)
+                    stages.append(request_stage)
+                    (messages, token), stats, prompt = request_stage.result()
+                else:
+                    with stream_preview(enabled=not no_stream) as on_delta:
+                        request_stage = Stage("model request", request, generator.generate_commit_message, planned, language, detail, repo_info, on_delta=on_delta)
+                        stages.append(request_stage)
+                        (commit_message, token), stats, prompt = request_stage.result()
+                    messages = [commit_message]
+                commit_message = messages[0]
+                cache.put(cache_key, commit_message)
+                diff_cache.save(generator.token_counter, file_sections)
+            display_commit_message(commit_message, token, interactive, stats)
+            print_candidates(messages[1:], first_number=2, total=len(messages))
+            if verbose:
+                print_stage_timings(console, stages, origin)
             
             if interactive:
-                if questionary.confirm("Do you want to use this commit message?").ask():
+                def regenerate(previous: str, hint: Optional[str]) -> List[str]:
+                    nonlocal generator, prompt
+                    if generator is None:
+                        # the message came from the cache: build the prompt once, then ask for others
+                        generator, repo_info, planned = prepare_generator()
+                        prompt, _ = generator.prepare_prompt(planned, language, detail, repo_info)
+                    with console.status("Regenerating..."):
+                        answers, tokens = generator.regenerate(previous, hint, candidates, prompt=prompt)
+                    print_candidates(answers)
+                    cached = f", {generator.last_stats.cached_tokens} cached" if generator.last_stats.cached_tokens else ""
+                    console.print(f"[dim]{tokens} tokens{cached}, {generator.last_stats.latency:.2f}s[/dim]")
+                    return answers
+                
+                chosen = pick_commit_message(messages, regenerate)
+                if chosen is not None:
+                    # the next run on these changes starts from the message that was taken
+                    cache.put(cache_key, chosen)
                     import subprocess
-                    subprocess.run(['git', 'commit', '-m', commit_message])
+                    subprocess.run(['git', 'commit', '-m', chosen])
                     console.print("[green]Commit created successfully![/green]")
                     console.print("[bold]Tip: Now, You can push it with 'git push' 🫡[/bold]")
                 
@@ -204,11 +431,130 @@ def start(language, detail, use_author_key, interactive, unlimited_chunk):
         traceback.print_exc()
         sys.exit(1)
 
-def display_commit_message(message: str, token: int, is_interactive: bool = False):
+@contextmanager
+def stream_preview(enabled: bool = True):
+    """
+    Show the message while it is streamed in a live panel, which is removed again
+    once the final, formatted message is printed. Yields the on_delta callback.
+    """
+    if not enabled:
+        yield None
+        return
+    from rich.live import Live
+    streamed: List[str] = []
+    with Live(Panel("...", title="Generating commit message", border_style="blue"), console=console, transient=True, refresh_per_second=15) as live:
+        def on_delta(text: str):
+            streamed.append(text)
+            live.update(Panel(Text("".join(streamed)), title="Generating commit message", border_style="blue"))
+        yield on_delta
+
+@contextmanager
+def pager_console(enabled: bool = True):
+    """
+    Yield a console whose output is piped through the user's pager while it is
+    printed, picked like git does (core.pager, GIT_PAGER, PAGER, less).
+    Only used when stdout is a terminal.
+    """
+    import subprocess
+    pager = None
+    if enabled and sys.stdout.isatty():
+        result = subprocess.run(['git', 'var', 'GIT_PAGER'], capture_output=True, text=True)
+        pager = result.stdout.strip() if result.returncode == 0 else os.environ.get('PAGER', 'less')
+    if not pager or pager == 'cat':
+        yield console
+        return
+    env = dict(os.environ)
+    env.setdefault('LESS', 'FRX')
+    env.setdefault('LV', '-c')
+    proc = subprocess.Popen(pager, shell=True, stdin=subprocess.PIPE, env=env, text=True, encoding='utf-8', errors='replace')
+    try:
+        yield Console(file=proc.stdin, force_terminal=True, width=console.width)
+    except BrokenPipeError:
+        pass  # the pager was quit before everything was printed
+    finally:
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        proc.wait()
+
+def print_candidates(messages: List[str], first_number: int = 1, total: Optional[int] = None):
+    """Show candidate messages in numbered panels."""
+    total = total or len(messages)
+    for number, message in enumerate(messages, start=first_number):
+        console.print(Panel(Text(message), title=f"Candidate {number}/{total}", border_style="blue"))
+
+def pick_commit_message(messages: List[str], regenerate: Callable[[str, Optional[str]], List[str]]) -> Optional[str]:
+    """
+    Let the user take one of the candidate messages, or ask for others (with a
+    hint) until one fits. `regenerate(rejected, hint)` returns the new candidates.
+    Returns None when cancelled.
+    """
+    import questionary
+    while True:
+        choices = [questionary.Choice(f"Use: {message.splitlines()[0] if message else ''}", value=index) for index, message in enumerate(messages)]
+        choices += [
+            questionary.Choice("Regenerate", value="regenerate"),
+            questionary.Choice("Regenerate with a hint...", value="hint"),
+            questionary.Choice("Cancel", value="cancel"),
+        ]
+        answer = questionary.select("Which commit message do you want to use?", choices=choices).ask()
+        if answer is None or answer == "cancel":
+            return None
+        if isinstance(answer, int):
+            return messages[answer]
+        hint = None
+        if answer == "hint":
+            hint = questionary.text("What should be different?").ask()
+            if not hint:
+                continue
+        messages = regenerate(messages[0], hint) or messages
+
+def print_prompt_plan(plan, system_tokens: int, unlimited_chunk: bool = False):
+    """Show what `start` would send: every file in full or summarized, and the estimated prompt tokens."""
+    from rich.table import Table
+    table = Table(title=f"Prompt plan (budget: {plan.budget} tokens)", border_style="blue")
+    table.add_column("File")
+    table.add_column("Kind")
+    table.add_column("Changes", justify="right")
+    table.add_column("Score", justify="right")
+    table.add_column("Tokens", justify="right")
+    table.add_column("Sent as")
+    for planned in sorted(plan.files, key=lambda f: -f.score):
+        table.add_row(
+            Text(planned.path),
+            planned.kind,
+            f"+{planned.added} -{planned.removed}",
+            f"{planned.score:.1f}",
+            str(planned.tokens),
+            "[yellow]summary[/yellow]" if planned.summarized and not unlimited_chunk else "[green]full[/green]",
+        )
+    console.print(table)
+    tokens = system_tokens + (plan.full_tokens if unlimited_chunk else plan.tokens)
+    console.print(
+        f"Estimated prompt: {tokens} tokens ({system_tokens} instructions and repository context, "
+        f"{tokens - system_tokens} changes) ≈ ${tokens * 0.150 / 1000000:.6f} USD (gpt-4o-mini input), plus the answer."
+    )
+    if plan.summarized and not unlimited_chunk:
+        console.print(f"[dim]{len(plan.summarized)} files are summarized; of {plan.full_tokens} tokens of changes, {plan.tokens} are sent. Raise --budget to send more.[/dim]")
+    console.print("[dim]Dry run: nothing was sent.[/dim]")
+
+def display_commit_message(message: str, token: int, is_interactive: bool = False, stats=None):
     """Display generated commit message with formatting"""
+    import pyperclip
+    from rich.syntax import Syntax
     message = message.strip('`').strip()
     
-    title = f"Generated Commit Message ({token} tokens)"
+    title = f"Generated Commit Message ({token} tokens"
+    if stats is not None and stats.cached_tokens:
+        title += f", {stats.cached_tokens} cached"
+    if stats is not None and stats.retries:
+        title += f", {stats.retries} retries"
+    if stats is not None and stats.time_to_first_token is not None:
+        title += f", first token {stats.time_to_first_token:.2f}s"
+    if stats is not None and stats.latency is not None:
+        title += f", total {stats.latency:.2f}s"
+    title += ")"
     cost = f"Cost: ${token * 0.150 / 1000000:.6f} USD 🥹 (gpt-4o-mini) (by https://openai.com/api/pricing/ date: 2024-10-20))"
     
     console.print(Panel.fit(
@@ -268,7 +614,8 @@ def doctor():
         checks.append(("Configuration file", "❌ Not found or invalid"))
     
     try:
-        get_current_repo_info()
+        from git_wise.utils.git_utils import get_current_repo_info
+        get_current_repo_info(offline=is_offline())
         checks.append(("Git repository", "✅ Valid"))
     except Exception:
         checks.append(("Git repository", "❌ Not found or invalid"))
@@ -305,8 +652,10 @@ def show_config():
             display_config[key] = model.value[0] if model else value
         elif key == 'interactive':
             display_config[key] = "Enabled" if value else "Disabled"
-        elif key == 'unlimited_chunk':
+        elif key in ('unlimited_chunk', 'offline'):
             display_config[key] = "Enabled" if value else "Disabled"
+        elif key == 'providers':
+            display_config[key] = ", ".join(value or {}) or "None"
         else:
             display_config[key] = value
 
@@ -314,19 +663,128 @@ def show_config():
         console.print(f"[bold green]{key}:[/bold green] {value}")
 
 @cli.command()
-def show_diff():
+@click.option('--max-bytes', type=int, default=SHOW_DIFF_MAX_BYTES, show_default=True, help='Bytes of content shown per file')
+@click.option('--no-pager', is_flag=True, help='Do not pipe the output into a pager')
+def show_diff(max_bytes, no_pager):
     """Show staged changes"""
     try:
-        diffs_for_user = get_all_staged_diffs(for_prompt=False)
-        if not diffs_for_user:
-            console.print("[yellow]No staged changes found.[/yellow]")
-            return
-        print_staged_changes(diffs_for_user)
+        from git_wise.utils.git_utils import get_repo, iter_staged_diffs, print_staged_changes
+        # files are read one at a time while they are printed
+        diffs_for_user = iter_staged_diffs(get_repo(), for_prompt=False, max_bytes=max_bytes)
+        with pager_console(enabled=not no_pager) as output:
+            print_staged_changes(diffs_for_user, output, preview_size=None)
         
     except Exception as e:
         console.print(f"[bold red]Error: {str(e).replace('[', '').replace(']', '')}[/bold red]")
         sys.exit(1)
-        
+
+@cli.command()
+@click.option('--socket', 'socket_path', type=click.Path(dir_okay=False), help='Socket to listen on (default: GIT_WISE_SOCKET, then git-wise-<uid>.sock in XDG_RUNTIME_DIR or /tmp)')
+@click.option('--stop', is_flag=True, help='Stop the running daemon instead of starting one')
+def serve(socket_path, stop):
+    """Keep git-wise loaded in the background so start and show-diff answer faster"""
+    import socket
+    if not hasattr(socket, 'AF_UNIX'):
+        console.print("[bold red]Error: git-wise serve needs Unix domain sockets, which this platform does not have[/bold red]")
+        sys.exit(1)
+    from git_wise import daemon
+    if stop:
+        if daemon.stop(socket_path):
+            console.print("[bold green]Daemon stopped[/bold green]")
+        else:
+            console.print("[yellow]No daemon is running[/yellow]")
+        return
+    try:
+        daemon.serve(socket_path, on_ready=lambda path: console.print(f"[bold green]Listening on {path}[/bold green] (Ctrl-C to stop)"))
+    except RuntimeError as e:
+        console.print(f"[bold red]Error: {e}[/bold red]")
+        sys.exit(1)
+
+@cli.command()
+@click.option('--debounce', type=click.FloatRange(min=0), default=1.0, show_default=True, help='Seconds the index must stay unchanged before generating')
+def watch(debounce):
+    """Generate the message in the background whenever the staged changes settle"""
+    from git.exc import InvalidGitRepositoryError
+    from git_wise.utils.git_utils import get_repo
+    from git_wise import watch as watcher
+    try:
+        repo = get_repo()
+    except InvalidGitRepositoryError:
+        console.print("[red]Error: Not a git repository. Please run this command inside a git repository.[/red]")
+        sys.exit(1)
+    try:
+        watcher.watch(repo, debounce, on_event=lambda text: console.print(f"[dim]{time.strftime('%H:%M:%S')}[/dim] {text}"))
+    except KeyboardInterrupt:
+        pass
+
+@cli.command()
+@click.argument('paths', nargs=-1, required=True)
+@click.option('--worktrees', '-w', is_flag=True, help='Also process every worktree of the given repositories')
+@click.option('--jobs', '-j', type=click.IntRange(min=1), help='Worker processes collecting staged changes (default: one per CPU)')
+@click.option('--concurrency', '-c', type=click.IntRange(min=1), help='Max concurrent requests over all repositories (default: max_concurrency in config)')
+@click.option('--no-cache', is_flag=True, help='Ignore cached messages and ask the AI again')
+def batch(paths, worktrees, jobs, concurrency, no_cache):
+    """Generate messages for many repositories, one JSON line each
+
+    PATHS are repositories or glob patterns such as '~/src/*'; '-' reads paths from stdin, one per line.
+    """
+    import json
+    from git_wise.batch import STATUS_ERROR, expand_paths, run_batch
+    from git_wise.core.generator import DEFAULT_MAX_CONCURRENCY
+    if '-' in paths:
+        paths = [path for path in paths if path != '-'] + [line.strip() for line in sys.stdin if line.strip()]
+    config = load_config()
+    output = sys.stdout
+    # the results are the only thing on stdout, notices (e.g. retries) go to stderr
+    with redirect_stdout(sys.stderr):
+        results = run_batch(
+            expand_paths(paths, worktrees=worktrees),
+            config,
+            emit=lambda result: click.echo(json.dumps(result, ensure_ascii=False), file=output),
+            jobs=jobs,
+            concurrency=concurrency or config.get('max_concurrency', DEFAULT_MAX_CONCURRENCY),
+            use_cache=not no_cache,
+        )
+    if any(result['status'] == STATUS_ERROR for result in results):
+        sys.exit(1)
+
+@cli.group()
+def hook():
+    """Install or remove the prepare-commit-msg hook that fills in the message"""
+
+@hook.command()
+@click.option('--deadline', type=click.FloatRange(min=0), default=10.0, show_default=True, help='Seconds the hook waits for a message that git-wise watch has not prepared')
+@click.option('--force', is_flag=True, help='Replace a prepare-commit-msg hook that git-wise did not install')
+def install(deadline, force):
+    """Make `git commit` open with the generated message"""
+    import subprocess
+    from git_wise.hook import install as install_hook
+    try:
+        path = install_hook(deadline=deadline, force=force)
+    except FileExistsError as e:
+        console.print(f"[red]Error: {e}[/red]")
+        sys.exit(1)
+    except subprocess.CalledProcessError:
+        console.print("[red]Error: Not a git repository. Please run this command inside a git repository.[/red]")
+        sys.exit(1)
+    console.print(f"[bold green]Installed {path}[/bold green]")
+    console.print("[dim]Run 'git-wise watch' to have messages ready before you commit.[/dim]")
+
+@hook.command()
+def uninstall():
+    """Remove the hook installed by git-wise hook install"""
+    import subprocess
+    from git_wise.hook import uninstall as uninstall_hook
+    try:
+        path = uninstall_hook()
+    except subprocess.CalledProcessError:
+        console.print("[red]Error: Not a git repository. Please run this command inside a git repository.[/red]")
+        sys.exit(1)
+    if path:
+        console.print(f"[bold green]Removed {path}[/bold green]")
+    else:
+        console.print("[yellow]No git-wise hook is installed[/yellow]")
+
 @cli.command()
 @click.option('--default-language', '-l', is_flag=True, help='Set default language')
 @click.option('--detail-level', '-d', is_flag=True, help='Set detail level')
@@ -334,7 +792,9 @@ def show_diff():
 @click.option('--model', '-m', is_flag=True, help='Set default model')
 @click.option('--interactive', '-i', is_flag=True, help='Set interactive mode')
 @click.option('--unlimited-chunk', '-u', is_flag=True, help='Set unlimited chunk mode')
-def config(default_language, detail_level, api_key, model, interactive, unlimited_chunk):
+@click.option('--max-concurrency', '-c', is_flag=True, help='Set max concurrent requests for large changes')
+@click.option('--provider', '-p', is_flag=True, help='Set default provider')
+def config(default_language, detail_level, api_key, model, interactive, unlimited_chunk, max_concurrency, provider):
     """Update specific configuration settings"""
     config = load_config()
     
@@ -356,7 +816,13 @@ def config(default_language, detail_level, api_key, model, interactive, unlimite
     if unlimited_chunk:
         config = configure_unlimited_chunk(config)
     
-    if not any([default_language, detail_level, api_key, model, interactive, unlimited_chunk]):
+    if max_concurrency:
+        config = configure_max_concurrency(config)
+    
+    if provider:
+        config = configure_provider(config)
+    
+    if not any([default_language, detail_level, api_key, model, interactive, unlimited_chunk, max_concurrency, provider]):
         console.print("[yellow]No configuration changes specified. Use options to update specific settings.[/yellow]")
         console.print("Available options:")
         console.print("  --default-language, -l  Set default language")
@@ -365,6 +831,8 @@ def config(default_language, detail_level, api_key, model, interactive, unlimite
         console.print("  --model, -m             Set default model")
         console.print("  --interactive, -i       Set interactive mode")
         console.print("  --unlimited-chunk, -u   Set unlimited chunk mode")
+        console.print("  --max-concurrency, -c   Set max concurrent requests for large changes")
+        console.print("  --provider, -p          Set default provider")
         return
     
     save_config(config)
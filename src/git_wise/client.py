@@ -0,0 +1,167 @@
+"""
+The `git-wise` entry point, and the thin client of `git-wise serve`.
+
+When a daemon is listening, `start` and `show-diff` are sent to it instead of
+being run here: the command line, working directory and environment go over a
+Unix socket, and the output comes back as it is printed. Everything else, and
+every command that needs this terminal (prompts), runs in this process as usual.
+Only the standard library is imported until a command runs here.
+"""
+import contextlib
+import json
+import os
+import shutil
+import socket
+import sys
+from typing import Callable, List, Optional, TextIO
+
+# Commands the daemon runs; options that need this process' terminal keep a command here
+FORWARDED_COMMANDS = {"start", "show-diff"}
+LOCAL_OPTIONS = {"--interactive", "--help"}
+LOCAL_FLAGS = {"i", "h"}  # short forms, also within clusters like -si
+VALUE_FLAGS = {"l", "d", "c", "p", "k"}  # short options of `start` taking a value: the rest of a cluster is it
+CONNECT_TIMEOUT = 0.5  # seconds; a daemon that does not answer by then is not used
+
+
+def get_socket_path() -> str:
+    """GIT_WISE_SOCKET, or git-wise-<uid>.sock in XDG_RUNTIME_DIR or the temp directory."""
+    path = os.environ.get("GIT_WISE_SOCKET")
+    if path:
+        return path
+    directory = os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("TMPDIR") or "/tmp"
+    return os.path.join(directory, f"git-wise-{os.getuid()}.sock")
+
+
+def get_server_id() -> str:
+    """Client and daemon must run the same code: a daemon from another install or version is not used."""
+    from git_wise import __version__
+    return f"{__version__} {os.path.dirname(os.path.abspath(__file__))}"
+
+
+def should_forward(argv: List[str]) -> bool:
+    if not hasattr(socket, "AF_UNIX") or os.environ.get("GIT_WISE_NO_DAEMON", "").lower() in ("1", "true", "yes", "on"):
+        return False
+    return bool(argv) and argv[0] in FORWARDED_COMMANDS and not needs_terminal(argv[1:])
+
+
+def needs_terminal(args: List[str]) -> bool:
+    """Whether `args` have an option that needs this terminal, parsed like click does."""
+    for arg in args:
+        if arg == "--":
+            break
+        if arg.startswith("--"):
+            if arg.split("=", 1)[0] in LOCAL_OPTIONS:
+                return True
+        elif arg.startswith("-"):
+            for flag in arg[1:]:
+                if flag in LOCAL_FLAGS:
+                    return True
+                if flag in VALUE_FLAGS:
+                    break
+    return False
+
+
+def connect(path: Optional[str] = None) -> Optional[socket.socket]:
+    """A connection to the daemon, or None when none is running."""
+    path = path or get_socket_path()
+    try:
+        # the request carries the environment (API keys): never send it to another user's socket
+        if os.stat(path).st_uid != os.getuid():
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(path)
+    except OSError:
+        return None
+    sock.settimeout(None)
+    return sock
+
+
+def forward(argv: List[str], stdout: Optional[TextIO] = None, stderr: Optional[TextIO] = None, tty: Optional[bool] = None) -> Optional[int]:
+    """
+    Run a command in the daemon and return its exit status.
+
+    Returns None, without any output, when there is no daemon or it asks for the
+    command to be run locally (e.g. it would prompt); the caller runs it then.
+    """
+    sock = connect()
+    if sock is None:
+        return None
+    return run_remote(sock, argv, stdout, stderr, tty)
+
+
+def run_remote(sock: socket.socket, argv: List[str], stdout: Optional[TextIO] = None, stderr: Optional[TextIO] = None, tty: Optional[bool] = None) -> Optional[int]:
+    """Send a command over a connection from `connect` and stream its output, see `forward`."""
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    request = {
+        "server_id": get_server_id(),
+        "argv": argv,
+        "cwd": os.getcwd(),
+        "env": dict(os.environ),
+        "tty": stdout.isatty() if tty is None else tty,
+        "columns": shutil.get_terminal_size().columns,
+    }
+    started = False
+    with sock, sock.makefile("rwb") as stream:
+        try:
+            stream.write(json.dumps(request).encode("utf-8") + b"\n")
+            stream.flush()
+            for line in stream:
+                message = json.loads(line)
+                if "out" in message or "err" in message:
+                    started = True
+                    target = stdout if "out" in message else stderr
+                    target.write(message.get("out") or message.get("err"))
+                    target.flush()
+                elif "fallback" in message:
+                    return None
+                elif "exit" in message:
+                    return message["exit"]
+        except OSError:
+            pass
+    if not started:
+        return None  # the daemon went away before doing anything, run the command here
+    stderr.write("git-wise: lost the connection to the daemon\n")
+    return 1
+
+
+class LazyOutput:
+    """A stream opened by `open_stream` on the first write, e.g. a pager only once there is something to page."""
+
+    def __init__(self, open_stream: Callable[[], TextIO]):
+        self._open_stream = open_stream
+        self._stream: Optional[TextIO] = None
+
+    def write(self, text: str) -> int:
+        if self._stream is None:
+            self._stream = self._open_stream()
+        return self._stream.write(text)
+
+    def flush(self) -> None:
+        if self._stream is not None:
+            self._stream.flush()
+
+
+def main():
+    argv = sys.argv[1:]
+    sock = connect() if should_forward(argv) else None
+    if sock is not None:
+        if argv[0] == "show-diff" and "--no-pager" not in argv and sys.stdout.isatty():
+            # page the daemon's output here, like the local command does; only once
+            # it prints, a fallback runs the local command, which opens its own pager
+            with contextlib.ExitStack() as stack:
+                def open_pager() -> TextIO:
+                    from git_wise.cli import pager_console
+                    return stack.enter_context(pager_console()).file
+                status = run_remote(sock, argv, stdout=LazyOutput(open_pager), tty=True)
+        else:
+            status = run_remote(sock, argv)
+        if status is not None:
+            sys.exit(status)
+    from git_wise.cli import main as run_locally
+    run_locally()
+
+
+if __name__ == "__main__":
+    main()
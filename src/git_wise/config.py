@@ -1,5 +1,4 @@
 import os
-import yaml
 
 CONFIG_FILE = os.path.expanduser('~/.git-wise.yaml')
 
@@ -8,11 +7,13 @@ AUTHOR_API_KEY = "nothing"
 
 def load_config():
     if os.path.exists(CONFIG_FILE):
+        import yaml
         with open(CONFIG_FILE, 'r') as f:
             return yaml.safe_load(f) or {}
     return {}
 
 def save_config(config):
+    import yaml
     with open(CONFIG_FILE, 'w') as f:
         yaml.dump(config, f)
 
@@ -24,3 +25,13 @@ def get_api_key(use_author_key=False):
         return AUTHOR_API_KEY
     config = load_config()
     return config.get('openai_api_key') or os.environ.get('OPENAI_API_KEY')
+
+def is_offline(config=None, offline=False):
+    """Offline mode: --offline, `offline: true` in the config or GIT_WISE_OFFLINE=1."""
+    if offline:
+        return True
+    if config is None:
+        config = load_config()
+    if config.get('offline'):
+        return True
+    return os.environ.get('GIT_WISE_OFFLINE', '').lower() in ('1', 'true', 'yes', 'on')
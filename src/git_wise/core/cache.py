@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Bump DIFF_CACHE_VERSION whenever the extracted changes or the entries change, it is part of the diff cache key.
+DIFF_CACHE_VERSION = "1"
+
+
+def prompt_settings(budget: Optional[int], unlimited_chunk: bool, filtered: bool) -> Dict[str, Any]:
+    """The options that change the prompt built from the same sections, for MessageCache keys."""
+    return {"budget": budget, "unlimited_chunk": bool(unlimited_chunk), "filtered": bool(filtered)}
+
+
+class MessageCache:
+    """
+    Content-addressed on-disk cache of generated commit messages.
+
+    Entries are keyed on a hash of the normalized diff plus everything else that
+    shapes the message (language, detail level, model, prompt version and the
+    settings of `prompt_settings`), so an unchanged index gives the same key.
+    Each entry is a small JSON file whose mtime is refreshed on every hit; when
+    the directory grows over `max_bytes` the least recently used entries are
+    removed.
+    """
+
+    MAX_BYTES = 1024 * 1024
+
+    def __init__(self, cache_dir: str, max_bytes: int = MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(
+        sections: List[str],
+        language: str,
+        detail_level: str,
+        model: str,
+        prompt_version: str,
+        settings: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        digest = hashlib.sha256()
+        for part in (prompt_version, model, language, detail_level, json.dumps(settings or {}, sort_keys=True)):
+            digest.update(str(part).encode("utf-8") + b"\0")
+        for section in sections:
+            # line endings and trailing whitespace do not change the message
+            normalized = "\n".join(line.rstrip() for line in section.splitlines())
+            digest.update(normalized.encode("utf-8", "surrogateescape") + b"\0")
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)
+            return entry["message"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key: str, message: str) -> None:
+        try:
+            _write_entry(self.cache_dir, self._path(key), {"message": message, "created": time.time()})
+            _evict(self.cache_dir, self.max_bytes)
+        except OSError:
+            # caching is best effort, a read-only .git must not break commits
+            pass
+
+
+class DiffCache:
+    """
+    On-disk cache of AI mode changes per blob pair.
+
+    The changes between two blobs never change, so an entry is keyed on the
+    (old blob SHA, new blob SHA) pair, the path (through .gitattributes the
+    path decides the diff driver and whether a file is binary) and
+    DIFF_CACHE_VERSION. It holds the extracted hunks (or the contents of a new
+    file) plus the token count of the file's prompt section per encoding.
+    Files found here need no patch from git, no hunk extraction and no
+    tokenizer pass; after a small edit only the edited files are processed
+    again. Entries are JSON files evicted like MessageCache's.
+    """
+
+    MAX_BYTES = 32 * 1024 * 1024
+
+    def __init__(self, cache_dir: str, max_bytes: int = MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # path -> (key, entry) for the files seen in this run
+        self._entries: Dict[str, Tuple[str, dict]] = {}
+        self._dirty: Set[str] = set()  # paths whose entries are to be written
+
+    @staticmethod
+    def make_key(path: str, old_sha: Optional[str], new_sha: str) -> str:
+        return f"v{DIFF_CACHE_VERSION}-{old_sha or '0' * len(new_sha)}-{new_sha}-{_digest(path)[:16]}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, path: str, old_sha: Optional[str], new_sha: str) -> Optional[str]:
+        """The cached changes between the two blobs, or None."""
+        key = self.make_key(path, old_sha, new_sha)
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(self._path(key))
+            changes = entry["changes"]
+        except (OSError, ValueError, KeyError):
+            return None
+        self._entries[path] = (key, entry)
+        return changes
+
+    def put(self, path: str, old_sha: Optional[str], new_sha: str, changes: str) -> None:
+        """Remember the changes of a file processed in this run; written by `save`."""
+        self._entries[path] = (self.make_key(path, old_sha, new_sha), {"changes": changes, "tokens": {}})
+        self._dirty.add(path)
+
+    def seed(self, token_counter, sections: Dict[str, str]) -> None:
+        """Hand the cached token counts of `sections` (path -> prompt section) to the token counter."""
+        for path, section in sections.items():
+            _, entry = self._entries.get(path, (None, {}))
+            cached = entry.get("tokens", {}).get(token_counter.name)
+            if cached and cached[0] == _digest(section):
+                token_counter.known[section] = cached[1]
+
+    def save(self, token_counter=None, sections: Optional[Dict[str, str]] = None) -> None:
+        """Write new entries, and the token counts `token_counter` has for `sections`."""
+        if token_counter is not None:
+            for path, section in (sections or {}).items():
+                tokens = token_counter.known.get(section)
+                if path not in self._entries or tokens is None:
+                    continue
+                counts = self._entries[path][1].setdefault("tokens", {})
+                counted = [_digest(section), tokens]
+                if counts.get(token_counter.name) != counted:
+                    counts[token_counter.name] = counted
+                    self._dirty.add(path)
+        if not self._dirty:
+            return
+        try:
+            for path in self._dirty:
+                key, entry = self._entries[path]
+                _write_entry(self.cache_dir, self._path(key), entry)
+            _evict(self.cache_dir, self.max_bytes)
+        except OSError:
+            pass  # best effort, like MessageCache
+        self._dirty.clear()
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8", "surrogateescape")).hexdigest()
+
+
+def _write_entry(cache_dir: str, path: str, entry: dict) -> None:
+    """Write `entry` as JSON to `path` atomically, so readers never see half an entry."""
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, path)
+
+
+def _evict(cache_dir: str, max_bytes: int) -> None:
+    """Remove the least recently used entries until the directory is under `max_bytes`."""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".json"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
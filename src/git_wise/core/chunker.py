@@ -0,0 +1,124 @@
+from typing import List, Tuple
+
+# Sections and pieces are joined with a newline, which costs at most one token.
+SEPARATOR_TOKENS = 1
+
+
+class DiffChunker:
+    """
+    Pack per-file diff sections into as few chunks as possible under a token budget.
+
+    Whole files are kept together whenever they fit. A file that is larger than
+    the budget is split at hunk boundaries, then at line boundaries, and only a
+    single line that is itself over budget is cut at token boundaries.
+    Every piece is encoded once; chunk sizes are sums of those counts.
+    """
+
+    def __init__(self, token_counter, max_tokens: int):
+        self.token_counter = token_counter
+        self.max_tokens = max_tokens
+
+    def chunk(self, sections: List[str]) -> Tuple[List[str], int]:
+        """
+        Return the chunks and the total number of tokens in `sections`.
+
+        When the sections fit into one chunk by their byte lengths alone, they
+        are not encoded at all and the total is that upper bound.
+        """
+        if self.token_counter.fits(sections, self.max_tokens - SEPARATOR_TOKENS * len(sections)):
+            return ["\n".join(sections)] if sections else [], sum(self.token_counter.upper_bound(s) for s in sections)
+        counts = self.token_counter.count_tokens_batch(sections)
+        pieces: List[Tuple[str, int]] = []
+        for section, tokens in zip(sections, counts):
+            if tokens + SEPARATOR_TOKENS <= self.max_tokens:
+                pieces.append((section, tokens))
+            else:
+                pieces.extend(self._split_section(section))
+        chunks = [text for text, _ in self._pack(pieces, self.max_tokens)]
+        return chunks, sum(counts)
+
+    def _split_section(self, section: str) -> List[Tuple[str, int]]:
+        lines = section.split("\n")
+        hunk_starts = [i for i, line in enumerate(lines) if line.startswith("@@")]
+        if hunk_starts:
+            header = lines[:hunk_starts[0]]
+            bounds = hunk_starts + [len(lines)]
+            units = ["\n".join(lines[start:end]) for start, end in zip(bounds, bounds[1:])]
+        else:
+            # Whole-file content (e.g. a new file): keep the path line as the header
+            header, units = lines[:1], lines[1:]
+
+        header_text = "\n".join(header)
+        header_tokens = self.token_counter.count_tokens(header_text) + SEPARATOR_TOKENS if header else 0
+        if header_tokens > self.max_tokens // 4:
+            header_text, header_tokens = "", 0
+        budget = self.max_tokens - header_tokens
+
+        pieces = self._pack(self._fit(units, budget, split_lines=bool(hunk_starts)), budget)
+        if not header_text:
+            return pieces
+        return [(f"{header_text}\n{text}", tokens + header_tokens) for text, tokens in pieces]
+
+    def _fit(self, units: List[str], budget: int, split_lines: bool) -> List[Tuple[str, int]]:
+        """Count `units` and break down the ones that do not fit into `budget` on their own."""
+        fitted = []
+        for unit, tokens in zip(units, self.token_counter.count_tokens_batch(units)):
+            if tokens + SEPARATOR_TOKENS <= budget:
+                fitted.append((unit, tokens))
+            elif split_lines and "\n" in unit:
+                fitted.extend(self._fit(unit.split("\n"), budget, split_lines=False))
+            else:
+                fitted.extend(self._split_tokens(unit, budget - SEPARATOR_TOKENS))
+        return fitted
+
+    def _split_tokens(self, text: str, budget: int) -> List[Tuple[str, int]]:
+        """Last resort: cut a single oversized line at token boundaries."""
+        tokens = self.token_counter.encode(text)
+        pieces = []
+        carry = b""
+        # leave room for up to 3 bytes of a character carried over from the previous piece
+        budget = max(budget - 3, 1)
+        for start in range(0, len(tokens), budget):
+            part = tokens[start:start + budget]
+            data = carry + self.token_counter.decode_bytes(part)
+            cut = _utf8_boundary(data)
+            # Never cut a multi-byte character in half; its first bytes move to the next piece
+            data, carry = data[:cut], data[cut:]
+            pieces.append((data.decode("utf-8", "replace"), len(part)))
+        if carry:
+            pieces.append((carry.decode("utf-8", "replace"), 1))
+        return pieces
+
+    @staticmethod
+    def _pack(pieces: List[Tuple[str, int]], budget: int) -> List[Tuple[str, int]]:
+        """Greedily join consecutive pieces while they fit into `budget`."""
+        packed = []
+        current: List[str] = []
+        current_tokens = 0
+        for text, tokens in pieces:
+            cost = tokens + SEPARATOR_TOKENS
+            if current and current_tokens + cost > budget:
+                packed.append(("\n".join(current), current_tokens))
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += cost
+        if current:
+            packed.append(("\n".join(current), current_tokens))
+        return packed
+
+
+def _utf8_boundary(data: bytes) -> int:
+    """Length of the longest prefix of `data` that does not end inside a UTF-8 sequence."""
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte & 0xC0 == 0x80:  # continuation byte, keep looking for the lead byte
+            continue
+        if byte < 0x80:
+            return len(data)
+        expected = 2 if byte >= 0xC0 else 1
+        if byte >= 0xE0:
+            expected = 3
+        if byte >= 0xF0:
+            expected = 4
+        return len(data) if back >= expected else len(data) - back
+    return len(data)
@@ -0,0 +1,133 @@
+import fnmatch
+import subprocess
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from git import GitCommandError
+from git.repo import Repo as GitRepo
+
+# Files that only make the prompt longer. Extend with `ignore_patterns` in the config
+# or per repository with `git config --add git-wise.ignore '<glob>'`.
+DEFAULT_IGNORE_PATTERNS = [
+    "dist/",
+    "vendor/",
+    "node_modules/",
+    "__snapshots__/",
+    "*.snap",
+    "*.min.js",
+    "*.min.css",
+    "*.map",
+    "*.lock",
+    "package-lock.json",
+    "pnpm-lock.yaml",
+]
+
+# A change is treated as minified when it has a very long line and long lines on average
+MINIFIED_MAX_LINE = 500
+MINIFIED_AVERAGE_LINE = 200
+
+ATTRIBUTES = ("linguist-generated", "linguist-vendored", "diff")
+
+
+@dataclass
+class ExcludedFile:
+    path: str
+    reason: str
+    content: str  # what would have been sent to the AI
+    stub: str  # the one-line replacement that is sent instead
+
+
+def get_ignore_patterns(repo: GitRepo, config: Dict) -> List[str]:
+    """Default patterns, then `ignore_patterns` from the config, then the repository's git config."""
+    patterns = list(DEFAULT_IGNORE_PATTERNS)
+    patterns.extend(config.get('ignore_patterns') or [])
+    try:
+        patterns.extend(repo.git.config('--get-all', 'git-wise.ignore').splitlines())
+    except GitCommandError:
+        pass  # not set
+    return [p for p in patterns if p]
+
+
+def matches_pattern(path: str, pattern: str) -> bool:
+    """gitignore-like matching: `dir/` matches a directory anywhere, a pattern without '/' matches the file name."""
+    parts = path.split("/")
+    if pattern.endswith("/"):
+        return any(fnmatch.fnmatch(part, pattern[:-1]) for part in parts[:-1])
+    if "/" not in pattern:
+        return fnmatch.fnmatch(parts[-1], pattern)
+    return fnmatch.fnmatch(path, pattern.lstrip("/"))
+
+
+def get_attribute_exclusions(repo: GitRepo, paths: Iterable[str]) -> Dict[str, str]:
+    """Paths marked linguist-generated, linguist-vendored or -diff in the staged .gitattributes."""
+    paths = list(paths)
+    if not paths:
+        return {}
+    result = subprocess.run(
+        ['git', 'check-attr', '--cached', '-z', '--stdin', *ATTRIBUTES],
+        cwd=repo.working_dir,
+        input=("\0".join(paths) + "\0").encode('utf-8', 'surrogateescape'),
+        capture_output=True,
+    )
+    if result.returncode != 0:
+        return {}
+    # output: <path> NUL <attribute> NUL <value> NUL
+    fields = result.stdout.decode('utf-8', 'surrogateescape').split("\0")
+    reasons = {}
+    for path, attribute, value in zip(fields[0::3], fields[1::3], fields[2::3]):
+        if attribute in ("linguist-generated", "linguist-vendored") and value in ("set", "true"):
+            reasons.setdefault(path, f"{attribute.split('-')[1]} (.gitattributes)")
+        elif attribute == "diff" and value == "unset":
+            reasons.setdefault(path, "-diff (.gitattributes)")
+    return reasons
+
+
+def is_minified(content: str) -> bool:
+    lines = [line for line in content.split("\n") if line.strip()]
+    if not lines:
+        return False
+    longest = max(len(line) for line in lines)
+    return longest > MINIFIED_MAX_LINE and sum(len(line) for line in lines) / len(lines) > MINIFIED_AVERAGE_LINE
+
+
+def filter_staged_changes(
+    repo: GitRepo,
+    diffs: Dict[str, Union[Dict, List[str]]],
+    patterns: List[str],
+) -> Tuple[Dict[str, Union[Dict, List[str]]], List[ExcludedFile]]:
+    """
+    Replace generated, vendored, ignored and minified files in AI mode diffs by a one-line stub.
+
+    Returns the filtered diffs (same shape as the input) and what was excluded.
+    """
+    attribute_reasons = get_attribute_exclusions(repo, diffs.keys())
+    filtered = {}
+    excluded: List[ExcludedFile] = []
+    for path, info in diffs.items():
+        if not isinstance(info, list) or info[1] == "deleted":
+            filtered[path] = info
+            continue
+        content = info[2]
+        reason: Optional[str] = attribute_reasons.get(path)
+        if reason is None:
+            pattern = next((p for p in patterns if matches_pattern(path, p)), None)
+            if pattern is not None:
+                reason = f"ignored ({pattern})"
+        if reason is None and is_minified(content):
+            reason = "minified"
+        if reason is None:
+            filtered[path] = info
+            continue
+        stub = f"[Excluded from prompt: {reason}, {len(content.encode('utf-8', 'surrogateescape')) / 1024:.1f}KB of changes]"
+        filtered[path] = [info[0], info[1], stub]
+        excluded.append(ExcludedFile(path, reason, content, stub))
+    return filtered, excluded
+
+
+def count_saved_tokens(excluded: List[ExcludedFile], token_counter) -> int:
+    if not excluded:
+        return 0
+    # an estimate is enough for this note, and it does not load the tokenizer
+    original = token_counter.estimate_tokens_batch([e.content for e in excluded])
+    stubs = token_counter.estimate_tokens_batch([e.stub for e in excluded])
+    return sum(original) - sum(stubs)
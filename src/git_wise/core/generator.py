@@ -1,119 +1,342 @@
-from enum import Enum
-from openai import OpenAI
-from git_wise.config import get_api_key
-from typing import Dict, Any, List, Union, Tuple
-import tiktoken
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import json
+import threading
+import time
+from typing import Callable, Dict, Any, List, Optional, Union, Tuple
 from rich.console import Console
-from rich.text import Text
-from git_wise.models.git_models import Language, DetailLevel, Model
+from git_wise.models.git_models import Model
+from git_wise.core.chunker import DiffChunker
+from git_wise.core.prompts import (
+    SYSTEM_PROMPT, CONTEXT_PROMPT, SUMMARY_PROMPT, SUMMARY_CONTEXT_PROMPT, SPLIT_PROMPT, SPLIT_CONTEXT_PROMPT,
+    REGENERATE_PROMPT, REGENERATE_HINT_PROMPT,
+)
+from git_wise.core.providers import AIProvider, BUILTIN_PROVIDERS, ProviderConfig, get_client
+from git_wise.core.scheduler import RequestScheduler
+from git_wise.core.tokenizer import TokenCounter
+from git_wise.utils.tracing import span
 
 console = Console()
 
-class AIProvider(Enum):
-    OPENAI = "openai"
-    # TODO: add more providers. like:
-    # - github copilot
-    # - claude
-    # - ...?
+# Number of chunk summaries requested at the same time in map-reduce mode
+DEFAULT_MAX_CONCURRENCY = 4
+# Completion tokens charged up front against a tokens-per-minute limit, corrected by the real usage
+COMPLETION_TOKENS_ESTIMATE = 300
+
+@dataclass
+class GenerationStats:
+    """Usage and timings of one generate_commit_message call."""
+    total_tokens: int = 0
+    time_to_first_token: Optional[float] = None  # seconds, only for streamed responses
+    latency: Optional[float] = None  # seconds for the whole call, map-reduce included
+    cached_tokens: int = 0  # prompt tokens the provider served from its prompt cache
+    retries: int = 0  # requests repeated after rate limits or transient errors
+
+def format_context(detail_level: str, language: str, repo_info: Optional[Dict[str, Any]]) -> str:
+    """The per-run part of the prompt. Keys are sorted, so the same context is always the same bytes."""
+    return CONTEXT_PROMPT.format(
+        detail_level=detail_level,
+        language=language,
+        repo_info=json.dumps(repo_info, sort_keys=True, ensure_ascii=False, default=str),
+    )
 
-class TokenCounter:
-    def __init__(self, model: str = Model.GPT4O_MINI.value[1]):
-        self.encoding: tiktoken.Encoding = tiktoken.encoding_for_model(model)
-    
-    def count_tokens(self, message: str) -> int:
-        """Count tokens for a single message."""
-        return len(self.encoding.encode(message))
-    
 class CommitMessageGenerator:
     # just for reduce the token consumption
     MAX_CHUNKS = 8
     MAX_TOKENS = 16000  # Setting slightly below actual limit for safety
+    # Default budget of the planned prompt (core/planner.py), one chunk below the limit as slack for packing
+    TOKEN_BUDGET = (MAX_CHUNKS - 1) * MAX_TOKENS
     
-    def __init__(self, provider: AIProvider, model: str = Model.GPT4O_MINI.value[1], unlimited_chunk: bool = False):
-        self.provider = provider
+    def __init__(self, provider: Union[AIProvider, ProviderConfig], model: str = Model.GPT4O_MINI.value[1], unlimited_chunk: bool = False, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        # a bare AIProvider means its built-in provider, e.g. api.openai.com for OPENAI
+        self.provider = BUILTIN_PROVIDERS[provider.value] if isinstance(provider, AIProvider) else provider
         self.model = model
         self.client = None
         self.token_counter = TokenCounter(model)
+        self.chunker = DiffChunker(self.token_counter, self.MAX_TOKENS)
         self.unlimited_chunk = unlimited_chunk
+        self.max_concurrency = max_concurrency
+        # last_stats and last_prompt of the calls made on each thread, so concurrent calls (the
+        # per-group fallback of generate_commit_messages, batch jobs) do not see each other's
+        self._calls = threading.local()
+        self.cached_tokens = 0  # over all requests of this generator
+        self.retries = 0  # likewise
+        self._usage_lock = threading.Lock()
+        # every request of this generator, from any thread, goes through it
+        self.scheduler = RequestScheduler(
+            requests_per_minute=self.provider.rpm,
+            tokens_per_minute=self.provider.tpm,
+            max_concurrency=max_concurrency,
+            max_retries=self.provider.max_retries,
+        )
         self._initialize_client()
 
+    @property
+    def last_stats(self) -> Optional[GenerationStats]:
+        """Usage and timings of the last call on this thread."""
+        return getattr(self._calls, "stats", None)
+
+    @property
+    def last_prompt(self) -> Optional[List[Dict[str, str]]]:
+        """Messages of the last final request prepared on this thread, see prepare_prompt."""
+        return getattr(self._calls, "prompt", None)
+
     def _initialize_client(self):
-        if self.provider == AIProvider.OPENAI:
-            api_key = get_api_key()
-            self.client = OpenAI(api_key=api_key)
+        if self.provider.api == AIProvider.OPENAI:
+            self.client = get_client(self.provider)
         else:
             raise ValueError("Unsupported AI provider")
 
-    def _split_message(self, message: str, max_tokens: int) -> List[str]:
-        """Split the message into chunks of max_tokens."""
-        return [message[i:i + max_tokens] for i in range(0, len(message), max_tokens)]
-
-    def _create_messages(self, system_prompt: str, user_message: str) -> List[Dict[str, str]]:
+    def _create_messages(self, system_prompt: str, chunks: List[str], context: Optional[str] = None) -> List[Dict[str, str]]:
+        # static instructions first and the changes last, see prompts.py
         res = [{"role": "system", "content": system_prompt}]
-        
-        # 计算user_message 是否超过最大token限制，超过的话按照maxtoken进行拆分
-        message_tokens = self.token_counter.count_tokens(user_message)
-        
-        if message_tokens > self.MAX_TOKENS:
-             # If we reach here, even MAX_CHUNKS wasn't enough
-            #TODO: In the future, we can use a more advanced method to handle this, such as separately processing long text modification files to summarize the main points of the changes, and then placing them here for a unified request again?🤔
-            chunks = self._split_message(user_message, self.MAX_TOKENS)
-            if len(chunks) > self.MAX_CHUNKS:
-                if not self.unlimited_chunk:    
-                    console.print(f"[yellow]Warning: Your staged changes exceed the current token limit ({self.MAX_CHUNKS * self.MAX_TOKENS} tokens). You have {message_tokens} tokens of changes. To prevent excessive token consumption, we'll process only a subset of your changes. The commit message may not reflect all modifications. This limitation will be addressed in future updates to handle large files more effectively🥹🥹🥹.[/yellow]")
-                    chunks = chunks[:self.MAX_CHUNKS]
-                else:
-                    console.print(f"[yellow]Warning: Your staged changes exceed the current token limit ({self.MAX_CHUNKS * self.MAX_TOKENS} tokens). You have {message_tokens} tokens of changes. To prevent excessive token consumption, we'll process all your changes. This may lead to high costs. Please be aware of this and consider splitting your changes into smaller chunks.[/yellow]")
-            for chunk in chunks:
-                res.append({"role": "user", "content": chunk})
-        else:
-            res.append({"role": "user", "content": user_message})
-        
+        if context is not None:
+            res.append({"role": "user", "content": context})
+        for chunk in chunks:
+            res.append({"role": "user", "content": chunk})
         return res
 
-    def generate_commit_message(self, diff: str, language: str, detail_level: str, repo_info: Dict[str, Any]) -> Tuple[str, int]:
+    def _summarize_chunks(self, chunks: List[str], stats: Optional[GenerationStats] = None) -> Tuple[List[str], int]:
+        """
+        Map step: summarize every chunk with its own request, running up to
+        `max_concurrency` requests at the same time. Summaries keep the chunk order.
+        """
+        def summarize(index: int, chunk: str) -> Tuple[str, int]:
+            context = SUMMARY_CONTEXT_PROMPT.format(index=index + 1, total=len(chunks))
+            return self._generate_single_message(self._create_messages(SUMMARY_PROMPT, [chunk], context), stats=stats)
+
+        with span("summarize chunks", chunks=len(chunks)), ThreadPoolExecutor(max_workers=max(1, self.max_concurrency)) as executor:
+            results = list(executor.map(summarize, range(len(chunks)), chunks))
+        summaries = [f"Part {i + 1}/{len(chunks)}:\n{summary}" for i, (summary, _) in enumerate(results)]
+        return summaries, sum(tokens for _, tokens in results)
+
+    def prepare_prompt(self, diff: Union[str, List[str]], language: str, detail_level: str, repo_info: Dict[str, Any], stats: Optional[GenerationStats] = None) -> Tuple[List[Dict[str, str]], int]:
+        """
+        Build the messages of the final request: the changes packed into chunks,
+        summarized first when there are too many of them.
+
+        The messages are kept as `last_prompt`, so `regenerate` can ask again
+        without any of this work. Returns them and the tokens the summaries used;
+        their cached tokens and retries are added to `stats`, if given.
+        """
+        context = format_context(detail_level, language, repo_info)
+        sections = [diff] if isinstance(diff, str) else diff
+        # Pack the per-file sections into chunks of at most MAX_TOKENS tokens
+        with span("chunking", sections=len(sections)) as attrs:
+            chunks, message_tokens = self.chunker.chunk(sections)
+            attrs.update(chunks=len(chunks), tokens=message_tokens)
+        summary_tokens = 0
+
+        while len(chunks) > self.MAX_CHUNKS:
+            if self.unlimited_chunk:
+                console.print(f"[yellow]Warning: Your staged changes exceed the current token limit ({self.MAX_CHUNKS * self.MAX_TOKENS} tokens). You have {message_tokens} tokens of changes. To prevent excessive token consumption, we'll process all your changes. This may lead to high costs. Please be aware of this and consider splitting your changes into smaller chunks.[/yellow]")
+                break
+            # Map-reduce: summarize the chunks concurrently, then write the message from the summaries
+            console.print(f"[yellow]Your staged changes ({message_tokens} tokens) exceed the single request limit ({self.MAX_CHUNKS * self.MAX_TOKENS} tokens). Summarizing {len(chunks)} parts with up to {self.max_concurrency} concurrent requests...[/yellow]")
+            summaries, tokens = self._summarize_chunks(chunks, stats)
+            summary_tokens += tokens
+            reduced, message_tokens = self.chunker.chunk(summaries)
+            if len(reduced) >= len(chunks):
+                # summaries did not get any smaller, stop instead of looping forever
+                reduced = reduced[:self.MAX_CHUNKS]
+            chunks = reduced
+
+        self._calls.prompt = self._create_messages(SYSTEM_PROMPT, chunks, context)
+        return self._calls.prompt, summary_tokens
+
+    def generate_commit_message(self, diff: Union[str, List[str]], language: str, detail_level: str, repo_info: Dict[str, Any], on_delta: Optional[Callable[[str], None]] = None) -> Tuple[str, int]:
         """
         Generate a commit message based on the provided diff and configuration.
 
         Args:
-            diff (Union[Dict[str, str], List[Dict[str, str]]]): The staged changes, either as a dictionary or a list of dictionaries.
+            diff (Union[str, List[str]]): The staged changes, either as one string or as one section per file.
             language (str): The preferred language for the commit message.
             detail_level (str): The desired level of detail for the commit message.
             repo_info (Dict[str, Any]): Information about the repository context.
+            on_delta (Callable[[str], None], optional): If given, the final request is streamed and
+                every received piece of text is passed to it. Timings end up in `last_stats`.
 
         Returns:
             str: The generated commit message.
         """
-        system_prompt = f"""
-        You are a Git commit message generator that follows conventional commit practices. Your task is to generate a clear, concise, and meaningful commit message based on the staged changes provided.
-        Key guidelines for generating commit messages:
-
-        Start with a type prefix (feat, fix, docs, style, refactor, test, chore)
-        Keep the first line under 72 characters
-        Use the imperative mood ("add" not "added" or "adds")
-        Be descriptive but concise
-        Focus on WHY and WHAT changed, not HOW
-
-        Configuration:
-        Detail level: {detail_level}
-        Language preference: {language}
-        Repository context: {repo_info}
-        IMPORTANT: Your response must contain ONLY the commit message(s). Do not include any explanations, comments, or subjective assessments about the changes. Focus solely on describing the actual modifications made in the code.
+        started = time.perf_counter()
+        stats = GenerationStats()
+        messages, summary_tokens = self.prepare_prompt(diff, language, detail_level, repo_info, stats)
+        first_token_at = None
+
+        def on_token(text: str):
+            nonlocal first_token_at
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            on_delta(text)
+
+        message, tokens = self._generate_single_message(messages, on_delta=on_token if on_delta else None, stats=stats)
+        self._record_stats(stats, started, tokens + summary_tokens, first_token_at)
+        return message, tokens + summary_tokens
+
+    def generate_candidates(self, diff: Union[str, List[str]], language: str, detail_level: str, repo_info: Dict[str, Any], count: int) -> Tuple[List[str], int]:
+        """
+        Like generate_commit_message, but asks for `count` messages in one request
+        (`n`), so the prompt is sent and paid for once. Duplicates are dropped.
+        """
+        started = time.perf_counter()
+        stats = GenerationStats()
+        messages, summary_tokens = self.prepare_prompt(diff, language, detail_level, repo_info, stats)
+        answers, tokens = self._generate(messages, n=count, stats=stats)
+        self._record_stats(stats, started, tokens + summary_tokens)
+        return answers, tokens + summary_tokens
+
+    def regenerate(self, previous: str, hint: Optional[str] = None, count: int = 1, prompt: Optional[List[Dict[str, str]]] = None) -> Tuple[List[str], int]:
+        """
+        Ask again for the changes of `prompt` (by default the last prepare_prompt
+        on this thread), for messages other than `previous`.
+
+        The prompt is sent unchanged, followed by the rejected message and the
+        request for another one (with `hint`, if given): nothing is collected,
+        chunked or summarized again, and providers with prompt caching serve the
+        whole prefix from their cache.
+        """
+        prompt = prompt if prompt is not None else self.last_prompt
+        if prompt is None:
+            raise ValueError("There is no prompt to regenerate from yet")
+        started = time.perf_counter()
+        stats = GenerationStats()
+        request = REGENERATE_PROMPT + (REGENERATE_HINT_PROMPT.format(hint=hint) if hint else "")
+        messages = prompt + [{"role": "assistant", "content": previous}, {"role": "user", "content": request}]
+        answers, tokens = self._generate(messages, n=count, stats=stats)
+        self._record_stats(stats, started, tokens)
+        return answers, tokens
+
+    def _record_stats(self, stats: GenerationStats, started: float, total_tokens: int, first_token_at: Optional[float] = None) -> None:
+        stats.total_tokens = total_tokens
+        stats.time_to_first_token = None if first_token_at is None else first_token_at - started
+        stats.latency = time.perf_counter() - started
+        self._calls.stats = stats
+
+    def generate_commit_messages(self, groups: List[List[str]], language: str, detail_level: str, repo_info: Dict[str, Any]) -> Tuple[List[str], int]:
+        """
+        Generate one commit message per group of sections (see core/splitter.py).
+
+        When all groups fit in a single request they are sent together and the
+        messages come back as one JSON answer, so the instructions and repository
+        context are only paid for once. Otherwise, or when that answer is unusable,
+        every group gets its own generate_commit_message call, running up to
+        `max_concurrency` of them at the same time.
+
+        Returns:
+            Tuple[List[str], int]: The messages, in the order of `groups`, and the tokens used.
         """
-        messages = self._create_messages(system_prompt, diff)
-        return self._generate_single_message(messages)
+        tokens = 0
+        if len(groups) > 1:
+            sections = [f"### Commit {i + 1}\n" + "\n".join(group) for i, group in enumerate(groups)]
+            chunks, _ = self.chunker.chunk(sections)
+            if len(chunks) == 1:
+                context = format_context(detail_level, language, repo_info) + SPLIT_CONTEXT_PROMPT.format(total=len(groups))
+                messages = self._create_messages(SYSTEM_PROMPT + SPLIT_PROMPT, chunks, context)
+                answer, tokens = self._generate_single_message(messages, json_output=True)
+                messages = self._parse_messages(answer, len(groups))
+                if messages is not None:
+                    return messages, tokens
+
+        def generate(group: List[str]) -> Tuple[str, int]:
+            return self.generate_commit_message(group, language, detail_level, repo_info)
+
+        with ThreadPoolExecutor(max_workers=max(1, self.max_concurrency)) as executor:
+            results = list(executor.map(generate, groups))
+        return [message for message, _ in results], tokens + sum(t for _, t in results)
+
+    @staticmethod
+    def _parse_messages(answer: str, total: int) -> Optional[List[str]]:
+        try:
+            messages = json.loads(answer).get("messages")
+        except (ValueError, AttributeError):
+            return None
+        if not isinstance(messages, list) or len(messages) != total or not all(isinstance(m, str) and m.strip() for m in messages):
+            return None
+        return [m.strip() for m in messages]
 
-    def _generate_single_message(self, messages: List[Dict[str, str]]) -> Tuple[str, int]:
-        if self.provider == AIProvider.OPENAI:
-            completion = self.client.chat.completions.create(
+    def _generate_single_message(self, messages: List[Dict[str, str]], on_delta: Optional[Callable[[str], None]] = None, json_output: bool = False, stats: Optional[GenerationStats] = None) -> Tuple[str, int]:
+        answers, total_tokens = self._generate(messages, on_delta, json_output, stats=stats)
+        return answers[0], total_tokens
+
+    def _generate(self, messages: List[Dict[str, str]], on_delta: Optional[Callable[[str], None]] = None, json_output: bool = False, n: int = 1, stats: Optional[GenerationStats] = None) -> Tuple[List[str], int]:
+        """The distinct answers of one request for `n` choices, and the tokens it used. Retries and cached tokens are added to `stats`."""
+        with span("model request", provider=self.provider.name, model=self.model, stream=on_delta is not None, json=json_output, choices=n) as attrs:
+            attrs["prompt_chars"] = sum(len(m["content"]) for m in messages)
+            estimate = 0
+            if self.scheduler.limits_tokens:
+                estimate = sum(self.token_counter.count_tokens_batch([m["content"] for m in messages])) + COMPLETION_TOKENS_ESTIMATE
+            streamed = []
+
+            def deliver(text: str):
+                streamed.append(text)
+                on_delta(text)
+
+            def on_retry(attempt: int, delay: float, error: BaseException):
+                with self._usage_lock:
+                    self.retries += 1
+                    if stats is not None:
+                        stats.retries += 1
+                attrs["retries"] = attempt + 1
+                console.print(f"[yellow]{type(error).__name__}, retrying in {delay:.1f}s ({attempt + 1}/{self.scheduler.max_retries})...[/yellow]")
+
+            answers, total_tokens, cached_tokens = self.scheduler.run(
+                lambda: self._request(messages, deliver if on_delta else None, json_output, n),
+                tokens=estimate,
+                on_retry=on_retry,
+                # a stream that was already shown cannot be taken back
+                retryable=lambda: not streamed,
+            )
+            self.scheduler.record_usage(estimate, total_tokens)
+            attrs.update(total_tokens=total_tokens, cached_tokens=cached_tokens)
+        with self._usage_lock:
+            self.cached_tokens += cached_tokens
+            if stats is not None:
+                stats.cached_tokens += cached_tokens
+        return list(dict.fromkeys(answers)), total_tokens
+
+    def _request(self, messages: List[Dict[str, str]], on_delta: Optional[Callable[[str], None]], json_output: bool, n: int = 1) -> Tuple[List[str], int, int]:
+        """The answers (n choices, streams have one), total tokens and cached prompt tokens of one request."""
+        if self.provider.api == AIProvider.OPENAI:
+            if on_delta is None:
+                completion = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    n=n,
+                    temperature=0.7,
+                    **({"response_format": {"type": "json_object"}} if json_output else {}),
+                )
+
+                answers = [choice.message.content.strip() for choice in completion.choices]
+                return answers, completion.usage.total_tokens, _cached_tokens(completion.usage)
+
+            stream = self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 n=1,
                 temperature=0.7,
+                stream=True,
+                stream_options={"include_usage": True},
             )
-
-            message = completion.choices[0].message.content.strip()
-            total_tokens = completion.usage.total_tokens
-            return message, total_tokens
+            parts = []
+            total_tokens = cached_tokens = 0
+            for chunk in stream:
+                # usage arrives in a final chunk without choices
+                if chunk.usage:
+                    total_tokens = chunk.usage.total_tokens
+                    cached_tokens = _cached_tokens(chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    on_delta(delta)
+            return ["".join(parts).strip()], total_tokens, cached_tokens
         else:
-            raise ValueError("Unsupported AI provider")
\ No newline at end of file
+            raise ValueError("Unsupported AI provider")
+
+
+def _cached_tokens(usage) -> int:
+    # only reported by providers with prompt caching (OpenAI caches prefixes of 1024+ tokens)
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None) or 0
\ No newline at end of file
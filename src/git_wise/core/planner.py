@@ -0,0 +1,162 @@
+import math
+import posixpath
+from dataclasses import dataclass
+from typing import Dict, List, Union
+
+from git_wise.utils.tracing import span
+
+# How much a changed line of each kind of file is worth to the commit message
+KIND_WEIGHTS = {
+    "source": 1.0,
+    "config": 0.7,  # dependency bumps and settings often are the point of a commit
+    "test": 0.5,
+    "docs": 0.4,
+}
+RENAME_BONUS = 2.0  # renames are cheap to describe and explain a lot of the change
+
+TEST_DIRS = {"test", "tests", "spec", "specs", "__tests__", "testing"}
+DOCS_DIRS = {"doc", "docs"}
+DOCS_EXTENSIONS = {".md", ".rst", ".txt", ".adoc"}
+CONFIG_EXTENSIONS = {".json", ".yaml", ".yml", ".toml", ".ini", ".cfg", ".conf", ".env", ".xml", ".lock"}
+CONFIG_NAMES = {"dockerfile", "makefile", "requirements.txt", "setup.py", "setup.cfg", "pyproject.toml", ".gitignore", ".gitattributes"}
+
+
+@dataclass
+class PlannedFile:
+    path: str
+    status: str
+    kind: str
+    added: int
+    removed: int
+    score: float
+    tokens: int  # of the section that is sent: the full change or its summary
+    summarized: bool = False
+
+
+@dataclass
+class PromptPlan:
+    files: List[PlannedFile]  # in the order of the staged changes
+    sections: List[str]  # what is sent, one per file
+    budget: int
+    tokens: int  # of all sections
+    full_tokens: int  # of all sections without summaries
+
+    @property
+    def summarized(self) -> List[PlannedFile]:
+        return [f for f in self.files if f.summarized]
+
+
+def classify_path(path: str) -> str:
+    """source, test, config or docs, from the path alone."""
+    directory, name = posixpath.split(path.lower())
+    stem, extension = posixpath.splitext(name)
+    if name in CONFIG_NAMES:
+        return "config"
+    if (TEST_DIRS & set(directory.split("/"))) or stem.startswith("test_") or stem.endswith(("_test", ".test", ".spec")):
+        return "test"
+    if extension in DOCS_EXTENSIONS or (DOCS_DIRS & set(directory.split("/"))):
+        return "docs"
+    if extension in CONFIG_EXTENSIONS:
+        return "config"
+    return "source"
+
+
+def count_changed_lines(status: str, content: str):
+    """(added, removed) lines of an AI mode change: hunks for modified files, the content for new ones."""
+    if content.startswith("[") and "\n" not in content:
+        return 0, 0  # a note instead of the change (large file, excluded, deleted)
+    if status == "new":
+        return content.count("\n") + 1, 0
+    added = removed = 0
+    for line in content.split("\n"):
+        if line.startswith("+"):
+            added += 1
+        elif line.startswith("-"):
+            removed += 1
+    return added, removed
+
+
+def score_change(path: str, status: str, added: int, removed: int) -> float:
+    """Higher is more important: log-scaled changed lines, weighted by the kind of file."""
+    score = KIND_WEIGHTS[classify_path(path)] * (1 + math.log2(1 + added + removed))
+    if status == "renamed":
+        score += RENAME_BONUS
+    elif status == "deleted":
+        score += 1
+    return score
+
+
+def prompt_sections(diffs: Dict[str, Union[Dict, List[str]]]) -> Dict[str, str]:
+    """One prompt section per file (path -> section), so files and hunks can be kept together."""
+    sections = {}
+    for path, value in diffs.items():
+        if isinstance(value, dict):
+            change = list(value.values())
+        elif isinstance(value, list):
+            change = value
+        else:
+            change = [value]
+        sections[path] = "\n".join(change)
+    return sections
+
+
+def summarize_change(kind: str, added: int, removed: int) -> str:
+    return f"[Summary only, left out to fit the token budget: {kind} file, +{added} -{removed} lines]"
+
+
+def plan_prompt(
+    diffs: Dict[str, Union[Dict, List[str]]],
+    token_counter,
+    budget: int,
+    exact: bool = False,
+) -> PromptPlan:
+    """
+    Fit AI mode diffs into `budget` tokens by priority instead of by position.
+
+    Every file starts out as a one-line summary. Then, from the highest score
+    down, files get their full change back as long as it still fits, so a large
+    low-priority file cannot push out the smaller important ones after it.
+    Sections keep the order of `diffs`.
+
+    When all full changes fit into the budget by their byte lengths, nothing
+    is encoded and the token counts are those upper bounds, unless `exact`.
+    """
+    changes = [
+        info if isinstance(info, list) else [path, info.get("type", "unknown"), info.get("changes", "")]
+        for path, info in diffs.items()
+    ]
+    files = []
+    summaries = []
+    for path, status, content in changes:
+        added, removed = count_changed_lines(status, content)
+        kind = classify_path(path)
+        files.append(PlannedFile(path, status, kind, added, removed, score_change(path, status, added, removed), 0, summarized=True))
+        summaries.append("\n".join([path, status, summarize_change(kind, added, removed)]))
+
+    full_sections = ["\n".join(change) for change in changes]
+    if not exact and token_counter.fits(full_sections, budget):
+        for planned, full in zip(files, full_sections):
+            planned.tokens, planned.summarized = token_counter.upper_bound(full), False
+        used = sum(planned.tokens for planned in files)
+        return PromptPlan(files, full_sections, budget, used, used)
+    with span("token count", sections=len(full_sections)):
+        full_counts = token_counter.count_tokens_batch(full_sections)
+        summary_counts = token_counter.count_tokens_batch(summaries)
+    for planned, full, summary in zip(files, full_counts, summary_counts):
+        planned.tokens = summary
+        if full <= summary:
+            # small changes (and notes) are sent as they are
+            planned.tokens, planned.summarized = full, False
+    used = sum(planned.tokens for planned in files)
+
+    for index in sorted(range(len(files)), key=lambda i: -files[i].score):
+        if not files[index].summarized:
+            continue
+        extra = full_counts[index] - files[index].tokens
+        if used + extra <= budget:
+            used += extra
+            files[index].tokens = full_counts[index]
+            files[index].summarized = False
+
+    sections = [summary if planned.summarized else full for planned, full, summary in zip(files, full_sections, summaries)]
+    return PromptPlan(files, sections, budget, used, sum(full_counts))
@@ -0,0 +1,135 @@
+import os
+import subprocess
+import threading
+from dataclasses import dataclass, field, replace
+from enum import Enum
+from typing import Any, Dict, Optional, Tuple
+
+from git_wise.config import get_api_key
+from git_wise.core.scheduler import DEFAULT_MAX_RETRIES
+
+DEFAULT_PROVIDER = "openai"
+DEFAULT_TIMEOUT = 60.0  # seconds per request
+# Port of benchmarks/fake_openai.py; any OpenAI-compatible server can listen there
+LOCAL_BASE_URL = "http://127.0.0.1:8765/v1"
+
+
+class AIProvider(Enum):
+    """The API a provider speaks."""
+    OPENAI = "openai"  # chat completions, also served by most self-hosted servers
+    # TODO: add more providers. like:
+    # - github copilot
+    # - claude
+    # - ...?
+
+
+@dataclass(frozen=True)
+class ProviderConfig:
+    """
+    Where and how commit messages are generated.
+
+    `base_url` points the client at another OpenAI-compatible server
+    (None is api.openai.com, or OPENAI_BASE_URL when set).
+    """
+    name: str
+    api: AIProvider = AIProvider.OPENAI
+    base_url: Optional[str] = None
+    model: Optional[str] = None  # None: `default_model` from the config
+    timeout: float = DEFAULT_TIMEOUT
+    api_key: Optional[str] = field(default=None, repr=False)  # None: the OpenAI key, for OpenAI only
+    requires_api_key: bool = True
+    # limits of the account, enforced by core/scheduler.py (None: not limited here)
+    rpm: Optional[int] = None  # requests per minute
+    tpm: Optional[int] = None  # tokens per minute
+    max_retries: int = DEFAULT_MAX_RETRIES  # of one request on rate limits and transient errors
+
+    def resolve_api_key(self) -> Optional[str]:
+        if self.api_key:
+            return os.path.expandvars(self.api_key)
+        key = None
+        if self.name == DEFAULT_PROVIDER or self.base_url is None:
+            # the stored OpenAI key only ever goes to OpenAI, never to a local or custom server
+            key = get_api_key()
+        if key or self.requires_api_key:
+            return key
+        return "not-needed"  # the client insists on some key, local servers ignore it
+
+
+BUILTIN_PROVIDERS: Dict[str, ProviderConfig] = {
+    "openai": ProviderConfig("openai"),
+    "local": ProviderConfig("local", base_url=LOCAL_BASE_URL, timeout=30.0, requires_api_key=False),
+}
+
+
+def get_providers(config: Dict[str, Any]) -> Dict[str, ProviderConfig]:
+    """
+    The built-in providers, updated and extended by the `providers` section of the config:
+
+        providers:
+          local:
+            base_url: http://127.0.0.1:8080/v1
+            model: qwen2.5-coder
+          groq:
+            base_url: https://api.groq.com/openai/v1
+            api_key: $GROQ_API_KEY
+            timeout: 20
+            rpm: 30
+            tpm: 6000
+    """
+    providers = dict(BUILTIN_PROVIDERS)
+    for name, settings in (config.get('providers') or {}).items():
+        settings = dict(settings or {})
+        base = providers.get(name, ProviderConfig(name, requires_api_key=False))
+        if 'timeout' in settings:
+            settings['timeout'] = float(settings['timeout'])
+        for key in ('rpm', 'tpm', 'max_retries'):
+            if settings.get(key) is not None:
+                settings[key] = int(settings[key])
+        if 'api' in settings:
+            settings['api'] = AIProvider(settings['api'])
+        known = {key: value for key, value in settings.items() if key in ProviderConfig.__dataclass_fields__ and key != 'name'}
+        providers[name] = replace(base, **known)
+    return providers
+
+
+def get_repo_provider_name(cwd: Optional[str] = None) -> Optional[str]:
+    """The provider selected for the current repository with `git config git-wise.provider <name>`."""
+    result = subprocess.run(['git', 'config', '--get', 'git-wise.provider'], cwd=cwd, capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def resolve_provider(config: Dict[str, Any], name: Optional[str] = None, cwd: Optional[str] = None) -> ProviderConfig:
+    """
+    Pick the provider: `name` (--provider), then the repository's `git-wise.provider`,
+    then `provider` in the config, then OpenAI.
+    """
+    name = name or get_repo_provider_name(cwd) or config.get('provider') or DEFAULT_PROVIDER
+    providers = get_providers(config)
+    if name not in providers:
+        raise ValueError(f"Unknown provider '{name}'. Known providers: {', '.join(sorted(providers))}")
+    return providers[name]
+
+
+_clients: Dict[Tuple[ProviderConfig, Optional[str], Optional[str]], Any] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(provider: ProviderConfig):
+    """
+    The OpenAI client for `provider`, created once per process.
+
+    All generators and threads share it, so requests reuse its pool of
+    kept-alive connections instead of paying for a new TCP/TLS handshake each time.
+    The key and URL from the environment are part of the lookup, since a
+    long-running `git-wise serve` sees a new environment with every command.
+    """
+    api_key = provider.resolve_api_key()
+    key = (provider, api_key, provider.base_url or os.environ.get('OPENAI_BASE_URL'))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            from openai import OpenAI
+            # retries are left to the scheduler, which counts them and shares rate limit pauses
+            client = OpenAI(api_key=api_key, base_url=provider.base_url, timeout=provider.timeout, max_retries=0)
+            _clients[key] = client
+        return client
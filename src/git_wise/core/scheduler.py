@@ -0,0 +1,176 @@
+"""
+Rate-limited, retrying scheduling of model requests.
+
+Providers limit requests and tokens per minute (per model for OpenAI). A
+RequestScheduler wraps every request of one generator: it keeps a token bucket
+for each limit that is configured, runs at most `max_concurrency` requests at a
+time and retries rate limits (429), timeouts, connection errors and 5xx answers
+with exponential backoff, waiting as long as the provider's `retry-after` asks.
+A rate limit pauses every request of the scheduler, not only the one that got it.
+"""
+import email.utils
+import random
+import threading
+import time
+from typing import Any, Callable, Optional
+
+DEFAULT_MAX_RETRIES = 4
+BASE_DELAY = 1.0  # seconds before the first retry, doubled for every further one
+MAX_DELAY = 60.0
+RETRY_STATUSES = {408, 409, 429}  # and every 5xx
+
+
+class TokenBucket:
+    """
+    A budget of `per_minute` units that refills continuously.
+
+    Units are reserved up front and the caller is told how long to wait for
+    them, so waiting requests are served in the order they asked and nobody polls.
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self._clock = clock
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` units and return the seconds to wait until they are there."""
+        with self._lock:
+            self._refill()
+            # a request larger than the whole budget still has to go through once it is full
+            self.level -= min(amount, self.capacity)
+            return max(0.0, -self.level / self.rate)
+
+    def adjust(self, amount: float) -> None:
+        """Take (or give back, when negative) units after the fact, e.g. real usage over an estimate."""
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level - amount)
+
+
+def is_retryable(error: BaseException) -> bool:
+    import openai
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status in RETRY_STATUSES or status >= 500)
+
+
+def get_retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the provider asked to wait (retry-after-ms or retry-after, in seconds or as a date), or None."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestScheduler:
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_concurrency: int = 4,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        base_delay: float = BASE_DELAY,
+        max_delay: float = MAX_DELAY,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.requests = TokenBucket(requests_per_minute, clock) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, clock) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0  # over all requests
+        self.waited = 0.0  # seconds spent waiting for the budgets and backoff, over all requests
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._sleep = sleep
+        self._clock = clock
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def limits_tokens(self) -> bool:
+        return self.tokens is not None
+
+    def backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter, for the `attempt`th retry (0 is the first)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _wait(self, seconds: float) -> None:
+        if seconds > 0:
+            with self._lock:
+                self.waited += seconds
+            self._sleep(seconds)
+
+    def run(
+        self,
+        request: Callable[[], Any],
+        tokens: int = 0,
+        on_retry: Optional[Callable[[int, float, BaseException], None]] = None,
+        retryable: Optional[Callable[[], bool]] = None,
+    ) -> Any:
+        """
+        Call `request` within the budgets, retrying it on transient errors.
+
+        `tokens` is the estimate charged against the tokens-per-minute budget,
+        once: a retry is another request but not another prompt's worth of tokens.
+        `on_retry(attempt, delay, error)` is called before every retry, and
+        `retryable()`, if given, can veto one (e.g. once a stream has been shown).
+        """
+        attempt = 0
+        while True:
+            wait = max(
+                self.requests.reserve(1) if self.requests else 0.0,
+                self.tokens.reserve(tokens) if self.tokens and tokens and attempt == 0 else 0.0,
+            )
+            self._wait(max(wait, self._paused_until - self._clock()))
+            with self._slots:
+                try:
+                    return request()
+                except Exception as error:
+                    failure = error
+                    if attempt >= self.max_retries or not is_retryable(error) or (retryable and not retryable()):
+                        raise
+                    retry_after = get_retry_after(error)
+                    delay = min(self.max_delay, retry_after) if retry_after is not None else self.backoff(attempt)
+                    if getattr(error, "status_code", None) == 429:
+                        # everyone else would only run into the same limit
+                        with self._lock:
+                            self._paused_until = max(self._paused_until, self._clock() + delay)
+            with self._lock:
+                self.retries += 1
+            if on_retry is not None:
+                on_retry(attempt, delay, failure)
+            self._wait(delay)
+            attempt += 1
+
+    def record_usage(self, estimated: int, actual: int) -> None:
+        """Charge the tokens-per-minute budget for what a request really used instead of its estimate."""
+        if self.tokens and actual:
+            self.tokens.adjust(actual - estimated)
@@ -1,6 +1,194 @@
-# TODO feature: maybe we can use LLM to split the commits if the changes are too large🤔
-def split_commits(changes, max_files_per_commit=5):
+import os
+import posixpath
+import subprocess
+import tempfile
+from collections import Counter, defaultdict
+from itertools import combinations
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from git.repo import Repo as GitRepo
+
+from git_wise.models.git_models import StagedFile
+from git_wise.utils.exceptions import GitWiseError
+
+DEFAULT_MAX_FILES_PER_COMMIT = 5
+
+# Co-change history: files changed together in at least COCHANGE_MIN_COUNT of the
+# last COCHANGE_COMMITS commits belong together. Commits touching more than
+# COCHANGE_MAX_FILES files (mass renames, formatting runs) say nothing about that.
+COCHANGE_COMMITS = 200
+COCHANGE_MIN_COUNT = 2
+COCHANGE_MAX_FILES = 30
+
+NULL_SHA = "0" * 40
+
+
+def split_commits(
+    changes: List[StagedFile],
+    max_files_per_commit: int = DEFAULT_MAX_FILES_PER_COMMIT,
+    co_changes: Optional[Dict[Tuple[str, str], int]] = None,
+) -> List[List[StagedFile]]:
     """
-    split the large changes into multiple smaller commits
+    Split the staged changes into logical commits of at most `max_files_per_commit` files.
+
+    Files are joined strongest link first, as long as the group stays small enough:
+    1. a renamed file and the other changes in the directory it was moved out of,
+    2. files that were changed together in earlier commits (`co_changes`, see get_co_changes),
+    3. files in the same directory,
+    4. files under the same top-level directory.
+
+    Every change ends up in exactly one group; groups are ordered by their first file
+    in `changes`.
     """
-    pass
+    paths = [change.path for change in changes]
+    parent = {path: path for path in paths}
+    members = {path: 1 for path in paths}
+
+    def find(path: str) -> str:
+        while parent[path] != path:
+            parent[path] = parent[parent[path]]
+            path = parent[path]
+        return path
+
+    def join(a: str, b: str) -> bool:
+        root_a, root_b = find(a), find(b)
+        if root_a == root_b:
+            return True
+        if members[root_a] + members[root_b] > max_files_per_commit:
+            return False
+        parent[root_b] = root_a
+        members[root_a] += members.pop(root_b)
+        return True
+
+    def pack(key: Callable[[str], str]) -> None:
+        # greedily merge the groups sharing a key, in path order
+        roots: Dict[str, List[str]] = defaultdict(list)
+        for path in paths:
+            root = find(path)
+            if root not in roots[key(path)]:
+                roots[key(path)].append(root)
+        for bucket in roots.values():
+            current = bucket[0]
+            for root in bucket[1:]:
+                if not join(current, root):
+                    current = root
+
+    by_directory: Dict[str, List[str]] = defaultdict(list)
+    for path in paths:
+        by_directory[posixpath.dirname(path)].append(path)
+
+    for change in changes:
+        if change.status == "renamed" and change.old_path:
+            for other in by_directory.get(posixpath.dirname(change.old_path), []):
+                join(change.path, other)
+
+    for (a, b), count in sorted((co_changes or {}).items(), key=lambda item: (-item[1], item[0])):
+        if count >= COCHANGE_MIN_COUNT and a in parent and b in parent:
+            join(a, b)
+
+    pack(posixpath.dirname)
+    pack(lambda path: path.split("/", 1)[0] if "/" in path else "")
+
+    groups: Dict[str, List[StagedFile]] = {}
+    for change in changes:
+        groups.setdefault(find(change.path), []).append(change)
+    return list(groups.values())
+
+
+def get_co_changes(
+    repo: GitRepo,
+    changes: Iterable[StagedFile],
+    max_commits: int = COCHANGE_COMMITS,
+) -> Counter:
+    """
+    Count how often pairs of staged files were changed in the same commit recently.
+
+    Renamed files are looked up under their old path as well. Returns a Counter
+    keyed on sorted `(path, path)` pairs of current paths.
+    """
+    current = {}
+    for change in changes:
+        current[change.path] = change.path
+        if change.old_path:
+            current.setdefault(change.old_path, change.path)
+    result = subprocess.run(
+        ['git', '-c', 'core.quotePath=false', 'log', f'-{max_commits}', '--no-merges', '--name-only', '--format=%x00'],
+        cwd=repo.working_dir,
+        capture_output=True,
+        text=True,
+        encoding='utf-8',
+        errors='surrogateescape',
+    )
+    pairs = Counter()
+    if result.returncode != 0:
+        return pairs  # no commits yet
+    for commit in result.stdout.split("\0"):
+        files = [line for line in commit.split("\n") if line]
+        if len(files) > COCHANGE_MAX_FILES:
+            continue
+        touched = sorted({current[f] for f in files if f in current})
+        pairs.update(combinations(touched, 2))
+    return pairs
+
+
+def create_commits(repo: GitRepo, groups: List[List[StagedFile]], messages: List[str]) -> List[str]:
+    """
+    Create one commit per group on top of HEAD, without touching the working tree.
+
+    Each group's index entries are applied to a temporary index (GIT_INDEX_FILE)
+    that starts from HEAD; `git write-tree` and `git commit-tree` then turn it into
+    a commit. HEAD is moved once, to the last commit, after checking that its tree
+    is exactly the staged tree, so a failure leaves the repository unchanged.
+    Commit hooks are not run.
+
+    Returns:
+        List[str]: The SHAs of the new commits, oldest first.
+    """
+    head = _git(repo, 'rev-parse', '--verify', '--quiet', 'HEAD', check=False) or None
+    staged_tree = _git(repo, 'write-tree')
+    commits = []
+    with tempfile.TemporaryDirectory(prefix='git-wise-') as tmp:
+        env = dict(os.environ, GIT_INDEX_FILE=os.path.join(tmp, 'index'))
+        if head:
+            _git(repo, 'read-tree', head, env=env)
+        parent = head
+        tree = None
+        for group, message in zip(groups, messages):
+            _git(repo, 'update-index', '-z', '--index-info', env=env, input=_index_info(group))
+            tree = _git(repo, 'write-tree', env=env)
+            args = ['commit-tree', tree, '-m', message] + (['-p', parent] if parent else [])
+            parent = _git(repo, *args)
+            commits.append(parent)
+    if tree != staged_tree:
+        raise GitWiseError("The split commits do not add up to the staged changes, nothing was committed.")
+    _git(repo, 'update-ref', '-m', 'git-wise: split commit', 'HEAD', parent, head or NULL_SHA)
+    return commits
+
+
+def _index_info(group: List[StagedFile]) -> str:
+    """`git update-index -z --index-info` input applying the staged state of `group`."""
+    entries = []
+    for change in group:
+        if change.status == "renamed" and change.old_path:
+            entries.append(f"0 {NULL_SHA}\t{change.old_path}")
+        if change.status == "deleted":
+            entries.append(f"0 {NULL_SHA}\t{change.path}")
+        else:
+            entries.append(f"{change.new_mode} {change.new_sha}\t{change.path}")
+    return "".join(entry + "\0" for entry in entries)
+
+
+def _git(repo: GitRepo, *args: str, env: Optional[Dict[str, str]] = None, input: Optional[str] = None, check: bool = True) -> str:
+    result = subprocess.run(
+        ['git', *args],
+        cwd=repo.working_dir,
+        env=env,
+        input=input,
+        capture_output=True,
+        text=True,
+        encoding='utf-8',
+        errors='surrogateescape',
+    )
+    if check and result.returncode != 0:
+        raise GitWiseError(f"git {args[0]} failed: {result.stderr.strip()}")
+    return result.stdout.strip()
@@ -0,0 +1,123 @@
+"""
+Commit messages for the staged changes without the `start` command around them.
+
+`git-wise watch`, the prepare-commit-msg hook and `git-wise batch` generate with
+the settings a plain `start` would use and share its caches. Collecting a
+repository's prompt (StagedPrompt) is separate from generating its message, so
+batch can collect in worker processes and send the requests from one place.
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from git.repo import Repo as GitRepo
+
+from git_wise.config import is_offline
+from git_wise.utils.exceptions import GitWiseError
+
+
+@dataclass
+class StagedPrompt:
+    """What is needed to generate one repository's message; picklable."""
+    path: str  # the repository's working directory
+    language: str
+    detail: str
+    provider: Any  # ProviderConfig
+    model: str
+    diffs: Dict[str, Any]
+    file_sections: Dict[str, str]  # path -> prompt section, see planner.prompt_sections
+    cache_key: str
+    cached_message: Optional[str] = None
+    repo_info: Optional[Dict[str, Any]] = None
+    diff_cache: Any = None  # DiffCache, for its token counts
+    excluded: List[str] = field(default_factory=list)
+    seconds: float = 0.0  # spent collecting
+
+
+def message_settings(config: Dict, cwd: Optional[str] = None) -> Tuple[str, str, str, str]:
+    """(language, detail level, provider, model) of a `start` without options in `cwd`."""
+    from git_wise.core.providers import resolve_provider
+    from git_wise.models.git_models import Model
+    try:
+        provider = resolve_provider(config, cwd=cwd)
+    except ValueError as e:
+        raise GitWiseError(str(e))
+    model = provider.model or config.get('default_model') or Model.GPT4O_MINI.value[1]
+    return config.get('default_language', 'en'), config.get('detail_level', 'brief'), provider.name, model
+
+
+def collect_prompt(repo: GitRepo, config: Dict, use_cache: bool = True) -> Optional[StagedPrompt]:
+    """Collect and filter the staged changes and look up their cached message. None when nothing is staged."""
+    from git_wise.core.cache import DiffCache, MessageCache, prompt_settings
+    from git_wise.core.filters import filter_staged_changes, get_ignore_patterns
+    from git_wise.core.planner import prompt_sections
+    from git_wise.core.prompts import PROMPT_VERSION
+    from git_wise.core.providers import resolve_provider
+    from git_wise.utils.git_utils import get_all_staged_diffs, get_current_repo_info, get_git_wise_dir
+
+    started = time.perf_counter()
+    language, detail, provider_name, model = message_settings(config, repo.working_dir)
+    provider = resolve_provider(config, provider_name)
+    if not provider.resolve_api_key():
+        raise GitWiseError("OpenAI API key not set. Please run 'git-wise init' to configure.")
+
+    diff_cache = DiffCache(get_git_wise_dir(repo, "diffs"))
+    diffs = get_all_staged_diffs(repo, diff_cache=diff_cache)
+    if not diffs:
+        return None
+    diffs, excluded = filter_staged_changes(repo, diffs, get_ignore_patterns(repo, config))
+    file_sections = prompt_sections(diffs)
+    settings = prompt_settings(config.get('token_budget'), config.get('unlimited_chunk', False), filtered=True)
+    cache_key = MessageCache.make_key(list(file_sections.values()), language, detail, f"{provider.name}/{model}", PROMPT_VERSION, settings)
+    prompt = StagedPrompt(
+        repo.working_dir, language, detail, provider, model, diffs, file_sections, cache_key,
+        diff_cache=diff_cache, excluded=[item.path for item in excluded],
+    )
+    if use_cache:
+        prompt.cached_message = MessageCache(get_git_wise_dir(repo, "messages")).get(cache_key)
+    if prompt.cached_message is not None:
+        diff_cache.save()
+    else:
+        prompt.repo_info = get_current_repo_info(repo.working_dir, offline=is_offline(config))
+    prompt.seconds = time.perf_counter() - started
+    return prompt
+
+
+def make_generator(prompt: StagedPrompt, config: Dict, max_concurrency: Optional[int] = None):
+    from git_wise.core.generator import CommitMessageGenerator, DEFAULT_MAX_CONCURRENCY
+    return CommitMessageGenerator(
+        prompt.provider, model=prompt.model, unlimited_chunk=config.get('unlimited_chunk', False),
+        max_concurrency=max_concurrency or config.get('max_concurrency', DEFAULT_MAX_CONCURRENCY),
+    )
+
+
+def generate_for_prompt(prompt: StagedPrompt, generator, config: Dict) -> Tuple[str, int]:
+    """Generate the message of a collected prompt with `generator` and cache it. Returns (message, tokens)."""
+    from git_wise.core.cache import MessageCache
+    from git_wise.core.planner import plan_prompt
+    from git_wise.utils.git_utils import get_git_wise_dir, get_repo
+
+    sections = list(prompt.file_sections.values())
+    prompt.diff_cache.seed(generator.token_counter, prompt.file_sections)
+    if not generator.unlimited_chunk:
+        sections = plan_prompt(prompt.diffs, generator.token_counter, config.get('token_budget') or generator.TOKEN_BUDGET).sections
+    message, tokens = generator.generate_commit_message(sections, prompt.language, prompt.detail, prompt.repo_info)
+    # written through the repository path, the prompt may come from another process
+    MessageCache(get_git_wise_dir(get_repo(prompt.path), "messages")).put(prompt.cache_key, message)
+    prompt.diff_cache.save(generator.token_counter, prompt.file_sections)
+    return message, tokens
+
+
+def generate_message(repo: GitRepo, config: Dict) -> Optional[str]:
+    """
+    The message `start` would generate for the staged changes, without any output.
+
+    Uses and fills the same caches as `start`. None when nothing is staged.
+    """
+    prompt = collect_prompt(repo, config)
+    if prompt is None:
+        return None
+    if prompt.cached_message is not None:
+        return prompt.cached_message
+    message, _ = generate_for_prompt(prompt, make_generator(prompt, config), config)
+    return message
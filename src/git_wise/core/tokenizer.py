@@ -0,0 +1,206 @@
+"""
+Token counting, with the tokenizer loaded only when an exact count is needed.
+
+Loading a tiktoken encoding reads a BPE file of several MB (downloading it on a
+clean machine), which takes hundreds of milliseconds. Most commits never need
+it: a token is at least one byte, so the UTF-8 length of a text bounds its
+token count, and text that is under a limit by that bound fits without being
+encoded (`TokenCounter.fits`).
+
+Encoding files are read from tiktoken's cache in TIKTOKEN_CACHE_DIR when that
+is set, otherwise from the directory bundled with the package
+(`git_wise/data/tiktoken`) or ~/.cache/git-wise/tiktoken, where tiktoken
+downloads them once. Offline (GIT_WISE_OFFLINE=1) nothing is downloaded. When
+the file cannot be had, counts are estimated from byte lengths instead.
+"""
+import contextlib
+import hashlib
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+from rich.console import Console
+
+from git_wise.models.git_models import Model
+from git_wise.utils.tracing import span
+
+console = Console()
+
+_encodings: Dict[str, Any] = {}  # per process, like tiktoken's own registry: the fallback warns once
+_encodings_lock = threading.Lock()
+
+DEFAULT_ENCODING = "o200k_base"  # models of other providers: counts are estimates either way
+# Model name prefixes of the older encoding; everything else, gpt-4o included, uses DEFAULT_ENCODING
+CL100K_PREFIXES = ("gpt-4", "gpt-3.5", "text-embedding-")
+O200K_PREFIXES = ("gpt-4o", "gpt-4.1", "gpt-4.5")
+ENCODING_URL = "https://openaipublic.blob.core.windows.net/encodings/{name}.tiktoken"
+BUNDLED_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "tiktoken")
+BYTES_PER_TOKEN_ESTIMATE = 3  # on the low side for code and diffs, so estimates rather overcount
+
+
+def encoding_name(model: str) -> str:
+    """The encoding of `model`, without importing tiktoken (which alone takes ~150ms)."""
+    if model.startswith(CL100K_PREFIXES) and not model.startswith(O200K_PREFIXES):
+        return "cl100k_base"
+    return DEFAULT_ENCODING
+
+
+def get_cache_dir() -> str:
+    """Where git-wise keeps downloaded encodings; unlike tiktoken's default, it survives reboots."""
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "git-wise", "tiktoken")
+
+
+def find_cached_encoding(name: str) -> Optional[str]:
+    """The cache directory that already has the file of encoding `name`, if any."""
+    key = hashlib.sha1(ENCODING_URL.format(name=name).encode()).hexdigest()
+    for directory in (os.environ.get("TIKTOKEN_CACHE_DIR"), BUNDLED_CACHE_DIR, get_cache_dir()):
+        if directory and os.path.isfile(os.path.join(directory, key)):
+            return directory
+    return None
+
+
+@contextlib.contextmanager
+def tiktoken_cache_dir(directory: Optional[str]) -> Iterator[None]:
+    """
+    Point tiktoken at `directory`, the one that has the file, for one load.
+    Without it, downloads go to the user's cache directory if they chose one, else to ours.
+    """
+    previous = os.environ.get("TIKTOKEN_CACHE_DIR")
+    if directory is None:
+        if previous is not None or "DATA_GYM_CACHE_DIR" in os.environ:
+            yield
+            return
+        directory = get_cache_dir()
+    os.environ["TIKTOKEN_CACHE_DIR"] = directory
+    try:
+        yield
+    finally:
+        if previous is None:
+            os.environ.pop("TIKTOKEN_CACHE_DIR", None)
+        else:
+            os.environ["TIKTOKEN_CACHE_DIR"] = previous
+
+
+class ApproximateEncoding:
+    """
+    Stands in for a tiktoken encoding that cannot be loaded: every token is
+    BYTES_PER_TOKEN_ESTIMATE bytes of the text, so chunks still split and
+    rejoin losslessly and counts stay close to the real ones.
+    """
+    name = "approximate"
+
+    def encode_ordinary(self, text: str) -> List[int]:
+        data = text.encode("utf-8", "surrogateescape")
+        step = BYTES_PER_TOKEN_ESTIMATE
+        # the leading 1 byte keeps zero bytes at the start of a piece
+        return [int.from_bytes(b"\x01" + data[i:i + step], "big") for i in range(0, len(data), step)]
+
+    def encode_ordinary_batch(self, texts: List[str]) -> List[List[int]]:
+        return [self.encode_ordinary(text) for text in texts]
+
+    def decode_bytes(self, tokens: List[int]) -> bytes:
+        return b"".join(token.to_bytes((token.bit_length() + 7) // 8, "big")[1:] for token in tokens)
+
+
+def load_encoding(name: str):
+    """The tiktoken encoding `name` from a local cache or downloaded once, else an ApproximateEncoding."""
+    with _encodings_lock:
+        if name not in _encodings:
+            _encodings[name] = _load_encoding(name)
+        return _encodings[name]
+
+
+def _load_encoding(name: str):
+    offline = os.environ.get("GIT_WISE_OFFLINE", "").lower() in ("1", "true", "yes", "on")
+    with span("tokenizer load", encoding=name) as attrs:
+        directory = find_cached_encoding(name)
+        attrs["cached"] = directory is not None
+        if directory is None and offline:
+            encoding = ApproximateEncoding()
+        else:
+            try:
+                import tiktoken
+                with tiktoken_cache_dir(directory):
+                    encoding = tiktoken.get_encoding(name)
+            except Exception as e:
+                # no network, a blocked download or a corrupt file: counting must not stop a commit
+                console.print(f"[yellow]Could not load the {name} tokenizer ({type(e).__name__}), token counts are estimated.[/yellow]")
+                encoding = ApproximateEncoding()
+        attrs["fallback"] = isinstance(encoding, ApproximateEncoding)
+    return encoding
+
+
+class TokenCounter:
+    def __init__(self, model: str = Model.GPT4O_MINI.value[1]):
+        self.model = model
+        self.name = encoding_name(model)
+        # counts of whole texts (prompt sections) already known, e.g. from the diff cache
+        self.known: Dict[str, int] = {}
+        self._encoding = None
+
+    @property
+    def encoding(self):
+        """The encoding, loaded on first use."""
+        if self._encoding is None:
+            encoding = load_encoding(self.name)
+            self.name = encoding.name
+            self._encoding = encoding
+        return self._encoding
+
+    @property
+    def loaded(self) -> bool:
+        return self._encoding is not None
+
+    def upper_bound(self, message: str) -> int:
+        """At least the token count of `message`, without encoding it: the known count or the UTF-8 length."""
+        known = self.known.get(message)
+        return known if known is not None else len(message.encode("utf-8", "surrogateescape"))
+
+    def fits(self, messages: List[str], limit: int) -> bool:
+        """
+        Whether `messages` have at most `limit` tokens together, by upper bounds
+        only. False means "count them".
+        """
+        total = 0
+        for message in messages:
+            # a character is at most 4 bytes: only measure the bytes when that is not enough
+            bound = len(message) * 4
+            if total + bound > limit:
+                bound = self.upper_bound(message)
+            total += bound
+            if total > limit:
+                return False
+        return True
+
+    def encode(self, message: str) -> List[int]:
+        # Diffs are plain text, special token markers in them must not be treated as such
+        return self.encoding.encode_ordinary(message)
+
+    def count_tokens(self, message: str) -> int:
+        """Count tokens for a single message."""
+        return len(self.encode(message))
+
+    def count_tokens_batch(self, messages: List[str]) -> List[int]:
+        """
+        Count tokens for several messages in one (multi-threaded) encoding pass.
+
+        Counts are remembered in `known`, so the sections the planner counted
+        are not encoded again by the chunker.
+        """
+        missing = [m for m in dict.fromkeys(messages) if m not in self.known]
+        if missing:
+            for message, tokens in zip(missing, self.encoding.encode_ordinary_batch(missing)):
+                self.known[message] = len(tokens)
+        return [self.known[m] for m in messages]
+
+    def estimate_tokens_batch(self, messages: List[str]) -> List[int]:
+        """Exact counts when known or the encoding is loaded anyway, otherwise estimates from the byte length."""
+        if self.loaded:
+            return self.count_tokens_batch(messages)
+        return [
+            self.known[m] if m in self.known else -(-len(m.encode("utf-8", "surrogateescape")) // BYTES_PER_TOKEN_ESTIMATE)
+            for m in messages
+        ]
+
+    def decode_bytes(self, tokens: List[int]) -> bytes:
+        return self.encoding.decode_bytes(tokens)
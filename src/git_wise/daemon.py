@@ -0,0 +1,233 @@
+"""
+`git-wise serve`: one long-running process that keeps git-wise warm.
+
+Imports, tiktoken encodings (cached per process by tiktoken), OpenAI clients
+with their kept-alive connections (core/providers.get_client) and repository
+handles survive from one command to the next, so a forwarded `start` mostly
+waits on the model. Commands come from the thin client (client.py) and run one
+at a time, because each one takes over the working directory, environment and
+standard streams of this process while it runs.
+"""
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import traceback
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from git_wise.client import connect, get_server_id, get_socket_path
+
+
+class _Stream(io.TextIOBase):
+    """stdout or stderr of a forwarded command: every write is sent to the client as a message."""
+
+    encoding = "utf-8"
+
+    def __init__(self, wfile, name: str, lock: threading.Lock):
+        self._wfile = wfile
+        self._name = name
+        self._lock = lock
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if text:
+            with self._lock:
+                self._wfile.write(json.dumps({self._name: text}).encode("utf-8") + b"\n")
+                self._wfile.flush()
+        return len(text)
+
+    def isatty(self) -> bool:
+        return False  # no pager or prompt is started on this side
+
+
+def _send(wfile, message: Dict[str, Any]) -> None:
+    wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+    wfile.flush()
+
+
+def _peer_uid(sock: socket.socket) -> Optional[int]:
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None  # not on Linux; the socket file's permissions still apply
+    pid, uid, gid = struct.unpack("3i", sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")))
+    return uid
+
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        uid = _peer_uid(self.request)
+        if uid is not None and uid != os.getuid():
+            return
+        line = self.rfile.readline()
+        if not line:
+            return
+        request = json.loads(line)
+        if request.get("stop"):
+            _send(self.wfile, {"exit": 0})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+            return
+        reason = fallback_reason(request)
+        if reason:
+            _send(self.wfile, {"fallback": reason})
+            return
+        try:
+            run_request(request, self.wfile)
+        except OSError:
+            pass  # the client went away (e.g. Ctrl-C)
+
+
+def fallback_reason(request: Dict[str, Any]) -> Optional[str]:
+    """Why the client should run the command itself, if it should."""
+    if request.get("server_id") != get_server_id():
+        return "different git-wise version"
+    argv = request.get("argv") or []
+    if argv[:1] == ["start"]:
+        from git_wise.config import load_config
+        if load_config().get("interactive"):
+            return "interactive mode asks for confirmation"
+    return None
+
+
+def run_request(request: Dict[str, Any], wfile) -> None:
+    with command_context(request, wfile):
+        status = run_command(request["argv"])
+        # the client is done here; stages nobody waited for finish before the state is taken back
+        _send(wfile, {"exit": status})
+
+
+def run_command(argv: List[str]) -> int:
+    """Run a git-wise command line in this process and return its exit status."""
+    import click
+    from git_wise.cli import cli
+    try:
+        result = cli.main(args=argv, prog_name="git-wise", standalone_mode=False)
+        return result if isinstance(result, int) else 0
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except click.exceptions.Exit as e:
+        return e.exit_code
+    except click.ClickException as e:
+        e.show()
+        return e.exit_code
+    except click.Abort:
+        print("Aborted!", file=sys.stderr)
+        return 1
+    except Exception:
+        traceback.print_exc()
+        return 1
+
+
+@contextmanager
+def command_context(request: Dict[str, Any], wfile):
+    """
+    Give the process the client's working directory, environment and streams
+    for the duration of one command, and take them back afterwards, once every
+    stage the command started has finished (on a cache hit, the ones it no
+    longer needed are still running).
+    """
+    from rich.console import Console
+    from git_wise.utils.blob_reader import close_blob_readers
+    from git_wise.utils.pipeline import wait_for_stages
+    from git_wise.utils.tracing import disable_tracing
+
+    saved_environ = dict(os.environ)
+    saved_cwd = os.getcwd()
+    saved_streams = sys.stdin, sys.stdout, sys.stderr
+    saved_consoles = []
+    lock = threading.Lock()
+    try:
+        os.environ.clear()
+        os.environ.update(request.get("env") or {})
+        os.chdir(request["cwd"])
+        sys.stdin = io.StringIO()
+        sys.stdout = _Stream(wfile, "out", lock)
+        sys.stderr = _Stream(wfile, "err", lock)
+        # the modules' consoles were made for the daemon's terminal
+        for name, module in list(sys.modules.items()):
+            if name.startswith("git_wise") and isinstance(getattr(module, "console", None), Console):
+                saved_consoles.append((module, module.console))
+                module.console = Console(file=sys.stdout, force_terminal=request.get("tty"), width=request.get("columns"))
+        disable_tracing()
+        yield
+    finally:
+        wait_for_stages()
+        disable_tracing()
+        # cat-file processes keep the index they started with, do not carry them over
+        close_blob_readers()
+        for module, console in saved_consoles:
+            module.console = console
+        sys.stdin, sys.stdout, sys.stderr = saved_streams
+        os.chdir(saved_cwd)
+        os.environ.clear()
+        os.environ.update(saved_environ)
+
+
+def warm_up() -> None:
+    """Load what every `start` needs: the command modules, the tokenizer and the provider's client."""
+    from git_wise.cli import cli  # noqa: F401
+    from git_wise.config import load_config
+    from git_wise.core.tokenizer import TokenCounter
+    from git_wise.core.providers import get_client, resolve_provider
+    from git_wise.models.git_models import Model
+    from git_wise.utils.git_utils import keep_repos_open
+    keep_repos_open()
+    config = load_config()
+    provider = resolve_provider(config)
+    # loaded here once: a command only loads it when it needs exact counts
+    TokenCounter(provider.model or config.get('default_model') or Model.GPT4O_MINI.value[1]).encoding
+    if provider.resolve_api_key():
+        get_client(provider)
+
+
+def serve(path: Optional[str] = None, on_ready=None) -> None:
+    """Listen on `path` until stopped (SIGTERM, Ctrl-C or `git-wise serve --stop`)."""
+    path = path or get_socket_path()
+    existing = connect(path)
+    if existing is not None:
+        existing.close()
+        raise RuntimeError(f"A git-wise daemon is already listening on {path}")
+    if os.path.exists(path):
+        os.unlink(path)  # left behind by a daemon that did not exit cleanly
+    try:
+        warm_up()
+    except Exception as e:
+        print(f"Warning: warm-up failed, continuing without it: {e}", file=sys.stderr)
+
+    old_umask = os.umask(0o177)  # the socket is for this user only
+    try:
+        # not a threading server: one command at a time, handled by the serving thread
+        server = socketserver.UnixStreamServer(path, CommandHandler)
+    finally:
+        os.umask(old_umask)
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        if on_ready is not None:
+            on_ready(path)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def stop(path: Optional[str] = None) -> bool:
+    """Ask the daemon on `path` to exit. Returns False when none is running."""
+    sock = connect(path)
+    if sock is None:
+        return False
+    with sock, sock.makefile("rwb") as stream:
+        _send(stream, {"stop": True})
+        stream.readline()
+    return True
@@ -0,0 +1,119 @@
+"""
+The prepare-commit-msg hook: `git commit` opens with the generated message.
+
+`git-wise hook install` writes a hook that runs this module. When `git-wise
+watch` has already stored a message for the staged tree, the hook only reads
+it; otherwise it generates one, but gives up after a deadline so a commit never
+waits on the model for long. The hook never fails the commit.
+"""
+import argparse
+import os
+import shlex
+import subprocess
+import sys
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import List, Optional
+
+DEFAULT_DEADLINE = 10.0  # seconds to wait for a message that was not precomputed
+HOOK_NAME = "prepare-commit-msg"
+HOOK_MARKER = "# installed by git-wise"
+
+
+def get_hook_path(repo_dir: str = ".") -> str:
+    """Where git looks for the hook, core.hooksPath included."""
+    result = subprocess.run(["git", "rev-parse", "--git-path", f"hooks/{HOOK_NAME}"], cwd=repo_dir, capture_output=True, text=True, check=True)
+    return os.path.join(repo_dir, result.stdout.strip())
+
+
+def hook_script(deadline: float) -> str:
+    command = [sys.executable, "-m", "git_wise.hook", "--deadline", f"{deadline:g}"]
+    return f'#!/bin/sh\n{HOOK_MARKER}\nexec {" ".join(shlex.quote(part) for part in command)} "$@"\n'
+
+
+def install(repo_dir: str = ".", deadline: float = DEFAULT_DEADLINE, force: bool = False) -> str:
+    """Write the hook and return its path. An existing hook of someone else's is only replaced with `force`."""
+    path = get_hook_path(repo_dir)
+    if os.path.exists(path) and not force and not is_ours(path):
+        raise FileExistsError(f"{path} already exists and was not installed by git-wise (use --force to replace it)")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(hook_script(deadline))
+    os.chmod(path, 0o755)
+    return path
+
+
+def uninstall(repo_dir: str = ".") -> Optional[str]:
+    """Remove the hook if git-wise installed it, and return its path."""
+    path = get_hook_path(repo_dir)
+    if not os.path.exists(path) or not is_ours(path):
+        return None
+    os.remove(path)
+    return path
+
+
+def is_ours(path: str) -> bool:
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return HOOK_MARKER in f.read()
+    except OSError:
+        return False
+
+
+def find_message(deadline: float) -> Optional[str]:
+    """The precomputed message for the staged tree, or one generated within `deadline` seconds."""
+    from git_wise.config import load_config
+    from git_wise.core.staged import generate_message
+    from git_wise.utils.git_utils import get_repo
+    from git_wise.utils.pipeline import Stage
+    from git_wise.utils.tracing import span
+    from git_wise.watch import precomputed_cache, precomputed_key, staged_tree
+
+    repo = get_repo()
+    config = load_config()
+    tree = staged_tree(repo)
+    if tree is not None:
+        with span("precomputed lookup") as attrs:
+            message = precomputed_cache(repo).get(precomputed_key(tree, config))
+            attrs["hit"] = message is not None
+        if message is not None:
+            return message
+    # on a daemon thread: when the deadline passes, the commit goes on without it
+    stage = Stage("fallback generation", generate_message, repo, config)
+    message = stage.result(timeout=deadline)
+    return message.strip('`').strip() if message else None
+
+
+def run(message_file: str, source: Optional[str] = None, deadline: float = DEFAULT_DEADLINE) -> int:
+    """Put the message in front of what git wrote to `message_file` (its comments)."""
+    if source:
+        return 0  # -m/-F, a template, merge, squash or amend: there already is a message
+    try:
+        message = find_message(deadline)
+    except FutureTimeoutError:
+        print(f"git-wise: no commit message within {deadline:g}s, run 'git-wise watch' to have it ready", file=sys.stderr)
+        return 0
+    except Exception as e:
+        print(f"git-wise: no commit message: {e}", file=sys.stderr)
+        return 0
+    if not message:
+        return 0
+    with open(message_file, "r+", encoding="utf-8") as f:
+        template = f.read()
+        f.seek(0)
+        f.write(f"{message}\n{template}")
+        f.truncate()
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="git-wise prepare-commit-msg hook")
+    parser.add_argument("--deadline", type=float, default=DEFAULT_DEADLINE)
+    parser.add_argument("message_file")
+    parser.add_argument("source", nargs="?")
+    parser.add_argument("sha", nargs="?")
+    args = parser.parse_args(argv)
+    sys.exit(run(args.message_file, args.source, args.deadline))
+
+
+if __name__ == "__main__":
+    main()
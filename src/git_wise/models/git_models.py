@@ -1,4 +1,7 @@
 from enum import Enum
+from dataclasses import dataclass
+from typing import Optional
+
 class Language(Enum):
     ENGLISH = ("English (default)", "en")
     CHINESE = ("Chinese", "zh")
@@ -34,4 +37,19 @@ class DetailLevel(Enum):
 
 class Model(Enum):
     GPT4O_MINI = ("GPT-4o-mini (Recommended, sufficient for most cases and more cost-effective)", "gpt-4o-mini")
-    GPT4O = ("GPT-4o (Full capability, higher cost)", "gpt-4o")
\ No newline at end of file
+    GPT4O = ("GPT-4o (Full capability, higher cost)", "gpt-4o")
+
+@dataclass
+class StagedFile:
+    """One staged path as reported by ``git diff --cached --raw --patch``."""
+    path: str
+    status: str
+    old_path: Optional[str] = None
+    old_sha: Optional[str] = None
+    new_sha: Optional[str] = None
+    old_mode: Optional[str] = None
+    new_mode: Optional[str] = None
+    size: Optional[int] = None  # blob size, of the old blob for deleted files
+    diff: Optional[str] = ""  # None when the patch was not read
+    truncated: bool = False  # the diff was cut at the requested size
+    cached: Optional[str] = None  # AI mode changes found in the diff cache, the patch is then not read
@@ -0,0 +1,140 @@
+import codecs
+import subprocess
+import threading
+import weakref
+from typing import Optional, Tuple
+
+from git.repo import Repo as GitRepo
+
+# git's own binary heuristic: a NUL byte in the first 8000 bytes
+BINARY_CHECK_SIZE = 8000
+DRAIN_CHUNK_SIZE = 1 << 16
+
+
+class BlobReader:
+    """
+    Reads objects through one long-running `git cat-file --batch` process.
+
+    Objects are requested by SHA (or any `<rev>:<path>` name) and their contents
+    read back from the same pipe, so reading the contents of many files costs a
+    single fork. The process is started on the first read and is safe to share
+    between threads.
+    """
+
+    def __init__(self, working_dir: str):
+        self.working_dir = working_dir
+        self._proc: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    def read(self, ref: str, max_size: Optional[int] = None, limit: Optional[int] = None) -> Tuple[int, Optional[bytes]]:
+        """
+        Return `(size, contents)` of an object.
+
+        Contents over `max_size` bytes are skipped on the pipe without being kept,
+        and None is returned in their place. With `limit`, only the first `limit`
+        bytes are kept and the rest is skipped. Raises KeyError when `ref` does
+        not name an object.
+        """
+        if "\n" in ref:
+            raise KeyError(ref)  # cannot be sent on the batch protocol
+        with self._lock:
+            proc = self._start()
+            proc.stdin.write(ref.encode('utf-8', 'surrogateescape') + b"\n")
+            proc.stdin.flush()
+            header = proc.stdout.readline()
+            if not header:
+                self._close()
+                raise OSError("git cat-file exited unexpectedly")
+            fields = header.split()
+            if len(fields) != 3:  # "<ref> missing" / "<ref> ambiguous"
+                raise KeyError(ref)
+            size = int(fields[2])
+            if max_size is not None and size > max_size:
+                self._drain(size + 1)
+                return size, None
+            if limit is not None and size > limit:
+                data = self._read_exact(limit)
+                self._drain(size - limit + 1)
+                return size, data
+            data = self._read_exact(size + 1)  # contents, then a LF
+            return size, data[:-1]
+
+    def read_text(self, ref: str, max_size: Optional[int] = None, limit: Optional[int] = None) -> Tuple[int, Optional[str]]:
+        """
+        Like `read`, decoded the way `git show` prints it (without the final newline).
+
+        Binary contents come back as "[Binary file]". A text cut at `limit` never
+        ends in the middle of a character.
+        """
+        # the binary check always sees its BINARY_CHECK_SIZE bytes, however small `limit` is
+        size, data = self.read(ref, max_size, None if limit is None else max(limit, BINARY_CHECK_SIZE))
+        if data is None:
+            return size, None
+        if b"\0" in data[:BINARY_CHECK_SIZE]:
+            return size, "[Binary file]"
+        if limit is not None:
+            data = data[:limit]
+        if len(data) < size:
+            return size, codecs.getincrementaldecoder('utf-8')('surrogateescape').decode(data)
+        text = data.decode('utf-8', 'surrogateescape')
+        return size, text[:-1] if text.endswith("\n") else text
+
+    def _start(self) -> subprocess.Popen:
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen(
+                ['git', 'cat-file', '--batch'],
+                cwd=self.working_dir,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+        return self._proc
+
+    def _read_exact(self, n: int) -> bytes:
+        data = self._proc.stdout.read(n)
+        if len(data) != n:
+            self._close()
+            raise OSError("git cat-file exited unexpectedly")
+        return data
+
+    def _drain(self, n: int) -> None:
+        while n > 0:
+            n -= len(self._read_exact(min(n, DRAIN_CHUNK_SIZE)))
+
+    def _close(self) -> None:
+        if self._proc is not None:
+            self._proc.stdin.close()
+            self._proc.stdout.close()
+            self._proc.wait()
+            self._proc = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+    def __del__(self):
+        try:
+            self._close()
+        except Exception:
+            pass
+
+
+_readers: "weakref.WeakKeyDictionary[GitRepo, BlobReader]" = weakref.WeakKeyDictionary()
+_readers_lock = threading.Lock()
+
+
+def get_blob_reader(repo: GitRepo) -> BlobReader:
+    """The repository's shared reader; its process ends when the repository object goes away."""
+    with _readers_lock:
+        reader = _readers.get(repo)
+        if reader is None:
+            reader = _readers[repo] = BlobReader(repo.working_dir)
+        return reader
+
+
+def close_blob_readers() -> None:
+    """End every reader's process; they start again on their next read."""
+    with _readers_lock:
+        readers = list(_readers.values())
+    for reader in readers:
+        reader.close()
@@ -1,28 +1,56 @@
 import os
+import json
+import subprocess
+import sys
+import time
+from collections import deque
 from git.repo import Repo as GitRepo
 import git
-from typing import List, Dict, Optional, Union
-import requests
+from typing import BinaryIO, Iterable, Iterator, List, Dict, Optional, Tuple, Union
 from urllib.parse import urlparse
 import traceback
 from git import GitCommandError, InvalidGitRepositoryError
 from rich.console import Console
+from git_wise.models.git_models import StagedFile
+from git_wise.utils.blob_reader import get_blob_reader
+from git_wise.utils.tracing import span
 
 console = Console()
 
-def get_repo(path=os.getcwd()) -> GitRepo:
+# Repositories by the directory they were looked up from, kept by `git-wise serve`
+_open_repos: Optional[Dict[str, GitRepo]] = None
+
+def keep_repos_open() -> None:
+    """Make get_repo return the same repository object for the same directory from now on."""
+    global _open_repos
+    if _open_repos is None:
+        _open_repos = {}
+
+def get_repo(path: Optional[str] = None) -> GitRepo:
+    path = path or os.getcwd()
+    if _open_repos is not None and path in _open_repos:
+        return _open_repos[path]
     try:
-        return GitRepo(path, search_parent_directories=True)
+        with span("repo discovery"):
+            repo = GitRepo(path, search_parent_directories=True)
+        if _open_repos is not None:
+            _open_repos[path] = repo
+        return repo
     except InvalidGitRepositoryError:
         raise InvalidGitRepositoryError(f"Not a git repository: {path}\n git-wise requires a git repository to work. you need go to a git repository first.🥹")
 
-def get_all_staged_diffs(repo: GitRepo = get_repo(), for_prompt: bool = True) -> Dict[str, Union[Dict, List[str]]]:
+def get_git_wise_dir(repo: GitRepo, *parts: str) -> str:
+    """Path for git-wise's per-repository state, kept in the (common) git directory."""
+    return os.path.join(repo.common_dir, "git-wise", *parts)
+
+def get_all_staged_diffs(repo: Optional[GitRepo] = None, for_prompt: bool = True, diff_cache=None) -> Dict[str, Union[Dict, List[str]]]:
     """
     Get all staged differences in the repository with two output modes.
     
     Args:
-        repo: Git repository object
+        repo: Git repository object, discovered from the working directory when omitted
         for_prompt: If True, use concise AI prompting format; if False, use detailed user format
+        diff_cache: A core.cache.DiffCache; in AI mode, files whose blob pair is in it are not diffed again
     
     Returns:
         Dictionary with file changes information, format varies by mode:
@@ -48,80 +76,345 @@ def get_all_staged_diffs(repo: GitRepo = get_repo(), for_prompt: bool = True) ->
         }
     """
 
-    diffs = {}
-    staged_files = set()
-    
     try:
-        # Handle detached HEAD state
-        try:
-            current_commit = repo.head.commit
-        except TypeError:
-            current_commit = None
-
-        # Get staged changes
-        if current_commit:
-            staged = repo.index.diff(current_commit)
-        else:
-            staged = repo.index.diff(None)
-        staged_files.update([(item.a_path, item.b_path) for item in staged])
-        # Process each file
-        for a_path, b_path in staged_files:
-            current_path = b_path or a_path
-            if current_path is None:
-                # Log the occurrence of a None path for debugging
-                print(f"Warning: Encountered None path. a_path: {a_path}, b_path: {b_path}")
-                continue
-
-            try:
-                status = get_file_status(a_path, b_path)
-                if status is None:
-                    # Log unexpected status for debugging
-                    print(f"Warning: Unexpected file status for {current_path}. a_path: {a_path}, b_path: {b_path}")
-                    continue
-
-                if status not in ["new", "modified", "deleted", "renamed"]:
-                    # Handle unexpected status
-                    print(f"Warning: Unhandled file status '{status}' for {current_path}")
-                    status = "unknown"
-
-                if for_prompt:
-                    file_info = process_file_ai_mode(repo, current_path, status, a_path)
-                else:
-                    file_info = process_file_user_mode(repo, current_path, status, a_path)
-
-                diffs[current_path] = file_info
-
-            except Exception as e:
-                error_info = {
-                    "type": "error",
-                    "error": str(e)
-                }
-                if for_prompt:
-                    error_info["changes"] = ""
-                else:
-                    error_info["content"] = ""
-                diffs[current_path] = error_info
-                if not for_prompt:
-                    console.print(f"[yellow]Warning: Error processing {current_path}: {str(e)}[/yellow]")
-
+        with span("diff collection", mode="ai" if for_prompt else "user") as attrs:
+            diffs = dict(iter_staged_diffs(repo or get_repo(), for_prompt, diff_cache=diff_cache))
+            attrs["files"] = len(diffs)
+            attrs["bytes"] = sum(
+                len(info[2]) if isinstance(info, list) else len(info.get("content") or "")
+                for info in diffs.values()
+            )
+        return diffs
     except Exception as e:
         if not for_prompt:
             console.print(f"[red]Error accessing repository: {str(e)}[/red]")
         return {}
 
-    return diffs
+def iter_staged_diffs(
+    repo: GitRepo,
+    for_prompt: bool = True,
+    max_bytes: Optional[int] = None,
+    diff_cache=None,
+) -> Iterator[Tuple[str, Union[Dict, List[str]]]]:
+    """
+    Yield `(path, file_info)` for each staged file, in the formats of `get_all_staged_diffs`.
+
+    Each file's content is only read when it is reached, so memory does not grow
+    with the size of the index. With `max_bytes`, at most about that much of each
+    file's content or diff is read; user mode entries then get a `truncated` flag.
+    AI mode changes come from `diff_cache` when possible, and new ones are put in it.
+    """
+    for staged_file in iter_staged_files(repo, for_prompt, max_diff_bytes=max_bytes, diff_cache=diff_cache):
+        current_path = staged_file.path
+        status = staged_file.status
+        try:
+            if status not in ["new", "modified", "deleted", "renamed"]:
+                # Handle unexpected status
+                print(f"Warning: Unhandled file status '{status}' for {current_path}")
+                status = "unknown"
+
+            blob = staged_file.old_sha if status == "deleted" else staged_file.new_sha
+            if for_prompt and staged_file.cached is not None:
+                file_info = [current_path, status, staged_file.cached]
+            elif for_prompt:
+                file_info = process_file_ai_mode(
+                    repo, current_path, status, staged_file.old_path, staged_file.diff, staged_file.size, blob
+                )
+                # only changes read from the patch: notes and errors are cheap, or not final
+                if diff_cache is not None and staged_file.diff is not None and not file_info[2].startswith("[Error"):
+                    diff_cache.put(current_path, staged_file.old_sha, staged_file.new_sha, file_info[2])
+            else:
+                file_info = process_file_user_mode(
+                    repo, current_path, status, staged_file.old_path, staged_file.diff, staged_file.size, blob, max_bytes
+                )
+                if max_bytes is not None:
+                    file_info["truncated"] = staged_file.truncated or (
+                        status in ("new", "deleted") and (staged_file.size or 0) > max_bytes
+                    )
+
+        except Exception as e:
+            file_info = {
+                "type": "error",
+                "error": str(e)
+            }
+            if for_prompt:
+                file_info["changes"] = ""
+            else:
+                file_info["content"] = ""
+                console.print(f"[yellow]Warning: Error processing {current_path}: {str(e)}[/yellow]")
+
+        yield current_path, file_info
+
+# git's raw status letters mapped onto the statuses used throughout git-wise
+RAW_STATUS_MAP = {
+    "A": "new",
+    "C": "new",
+    "M": "modified",
+    "T": "modified",
+    "D": "deleted",
+    "R": "renamed",
+}
+
+STAGED_DIFF_ARGS = ('--cached', '-M', '--raw', '--patch', '-z', '--no-abbrev', '--no-color', '--no-ext-diff')
+RAW_DIFF_ARGS = ('--cached', '-M', '--raw', '-z', '--no-abbrev')
+
+MAX_CONTENT_SIZE = 50000  # 50KB limit for new files and the changes of a file sent to the AI
+MAX_BLOB_SIZE = 1024 * 1024  # whole contents (new, deleted files) above 1MB are never read, only their size is reported
+MAX_EXCLUDE_ARGS_LENGTH = 16 * 1024  # above this, skipped patches are dropped while streaming
+
+def iter_staged_files(
+    repo: GitRepo,
+    for_prompt: bool = True,
+    max_diff_bytes: Optional[int] = None,
+    diff_cache=None,
+) -> Iterator[StagedFile]:
+    """
+    Yield every staged file with its patch, with a fixed number of git calls.
+
+    1. `git diff --cached --raw` lists the changes (status, modes, blob ids, paths).
+    2. One `git cat-file --batch-check` gives the size of every blob involved.
+    3. One `git diff --cached --raw --patch` produces the patches, leaving out
+       files whose patch is not needed: blobs over the size limits, deleted
+       files in AI mode, and new or deleted files in user mode, whose contents
+       are read by SHA through the blob reader instead. Binary files only
+       produce a "Binary files differ" line.
+
+    The patch output is parsed while it is being read: first the NUL separated
+    raw records, then each `diff --git` block is matched to its record in order.
+    Skipped files are yielded with `diff=None` and their `size` set. With
+    `max_diff_bytes`, each patch is cut at about that size and the rest of it
+    is read and dropped. In AI mode, files whose blob pair is in `diff_cache`
+    get `cached` set and are skipped like large ones.
+    """
+    records = list_staged_files(repo)
+    if not records:
+        return
+    with span("blob sizes") as attrs:
+        sizes = get_blob_sizes(repo, [r.old_sha if r.status == "deleted" else r.new_sha for r in records])
+        attrs["objects"] = len(sizes)
+    for record in records:
+        record.size = sizes.get(record.old_sha if record.status == "deleted" else record.new_sha)
+        record.diff = None
+        if diff_cache is not None and for_prompt and record.new_sha and needs_patch(record, for_prompt):
+            record.cached = diff_cache.get(record.path, record.old_sha, record.new_sha)
+    skipped = [r for r in records if r.cached is not None or not needs_patch(r, for_prompt)]
+    if len(skipped) == len(records):
+        yield from records
+        return
+
+    skip_paths = {r.path for r in skipped}
+    excludes = [f":(exclude,literal,top){path}" for r in skipped for path in filter(None, (r.path, r.old_path))]
+    if sum(len(e) + 1 for e in excludes) > MAX_EXCLUDE_ARGS_LENGTH:
+        excludes = []  # keep the command line short, the parser drops these patches instead
+    args = STAGED_DIFF_ARGS + (('--', *excludes) if excludes else ())
+
+    by_path = {r.path: r for r in records}
+    position = 0
+    # includes the time the consumer spends on each file, the patch is read as it goes
+    with span("staged patches", files=len(records) - len(skipped), skipped=len(skipped)) as attrs:
+        patch_bytes = 0
+        for patched in _iter_diff_process(repo, args, skip_paths, max_diff_bytes):
+            record = by_path.get(patched.path)
+            if record is None:
+                continue
+            index = records.index(record, position)
+            # yield skipped records in their original place
+            yield from records[position:index]
+            if record.path not in skip_paths:
+                record.diff = patched.diff
+                record.truncated = patched.truncated
+                patch_bytes += len(patched.diff or "")
+            yield record
+            position = index + 1
+        attrs["bytes"] = patch_bytes
+    yield from records[position:]
+
+def list_staged_files(repo: GitRepo) -> List[StagedFile]:
+    """Every staged file from a raw-only `git diff --cached`: statuses, paths, modes and blob ids, no patches."""
+    with span("staged files") as attrs:
+        records = list(_iter_diff_process(repo, RAW_DIFF_ARGS))
+        attrs["files"] = len(records)
+    return records
+
+def needs_patch(record: StagedFile, for_prompt: bool) -> bool:
+    """Whether the file's patch is read at all. Large new files never are."""
+    if for_prompt and record.status == "deleted":
+        return False  # AI mode only says "[File deleted]"
+    if not for_prompt and record.status in ("new", "deleted"):
+        return False  # whole contents are shown, read from the blob
+    return not is_too_large(record.status, record.size, for_prompt)
+
+def get_blob_sizes(repo: GitRepo, shas: List[Optional[str]]) -> Dict[str, int]:
+    """Sizes of the given objects from a single `git cat-file --batch-check`, without reading them."""
+    shas = sorted({sha for sha in shas if sha})
+    if not shas:
+        return {}
+    result = subprocess.run(
+        ['git', 'cat-file', '--batch-check=%(objectname) %(objectsize)'],
+        cwd=repo.working_dir,
+        input="\n".join(shas) + "\n",
+        capture_output=True,
+        text=True,
+    )
+    sizes = {}
+    for line in result.stdout.splitlines():
+        sha, _, size = line.partition(" ")
+        if size.isdigit():  # "<sha> missing" for submodule commits
+            sizes[sha] = int(size)
+    return sizes
+
+def _iter_diff_process(repo: GitRepo, args, skip_paths=frozenset(), max_diff_bytes=None) -> Iterator[StagedFile]:
+    proc = repo.git.diff(*args, as_process=True)
+    finished = False
+    try:
+        yield from parse_staged_diff_stream(proc.stdout, skip_paths=skip_paths, max_diff_bytes=max_diff_bytes)
+        finished = True
+    finally:
+        proc.stdout.close()
+        try:
+            proc.wait()
+        except GitCommandError:
+            if finished:
+                raise
+            # the consumer stopped early (e.g. the pager was closed), git got SIGPIPE
+
+def parse_staged_diff_stream(
+    stream: BinaryIO,
+    chunk_size: int = 1 << 16,
+    skip_paths=frozenset(),
+    max_diff_bytes: Optional[int] = None,
+) -> Iterator[StagedFile]:
+    """
+    Parse the output of `git diff --raw --patch -z` from a binary stream.
 
-def process_file_ai_mode(repo: GitRepo, current_path: str, status: str, a_path: Optional[str]) -> List[str]:
-    MAX_CONTENT_SIZE = 50000  # 50KB limit for AI processing
+    Patch lines of files in `skip_paths`, and of any file beyond `max_diff_bytes`,
+    are read and dropped, never kept in memory.
+    """
+    buffer = b""
+    eof = False
+
+    def read_more() -> bool:
+        nonlocal buffer, eof
+        if eof:
+            return False
+        data = stream.read(chunk_size)
+        if not data:
+            eof = True
+            return False
+        buffer += data
+        return True
+
+    def next_field() -> Optional[bytes]:
+        nonlocal buffer
+        while b"\0" not in buffer:
+            if not read_more():
+                return None
+        field, buffer = buffer.split(b"\0", 1)
+        return field
+
+    # Raw section: ":<old mode> <new mode> <old sha> <new sha> <status>\0<path>\0[<path>\0]",
+    # terminated by an empty field when a patch follows.
+    # git emits two patches (delete + add) for a type change and none for unmerged paths.
+    pending = deque()
+    while True:
+        header = next_field()
+        if not header:
+            break
+        old_mode, new_mode, old_sha, new_sha, raw_status = header.decode().lstrip(":").split(" ")
+        letter = raw_status[0]
+        paths = [next_field()]
+        if letter in "RC":
+            paths.append(next_field())
+        paths = [p.decode("utf-8", "surrogateescape") for p in paths if p is not None]
+        record = StagedFile(
+            path=paths[-1],
+            status=RAW_STATUS_MAP.get(letter, "unknown"),
+            old_path=paths[0] if letter in "RC" else None,
+            old_sha=None if set(old_sha) == {"0"} else old_sha,
+            new_sha=None if set(new_sha) == {"0"} else new_sha,
+            old_mode=old_mode,
+            new_mode=new_mode,
+        )
+        pending.append((record, {"T": 2, "U": 0}.get(letter, 1)))
+
+    def lines() -> Iterator[str]:
+        nonlocal buffer
+        while True:
+            while b"\n" not in buffer:
+                if not read_more():
+                    if buffer:
+                        yield buffer.decode("utf-8", "replace")
+                        buffer = b""
+                    return
+            line, buffer = buffer.split(b"\n", 1)
+            yield line.decode("utf-8", "replace")
+
+    current: Optional[StagedFile] = None
+    current_lines: List[str] = []
+    current_size = 0
+    remaining = 0
+    for line in lines():
+        if line.startswith("diff --git "):
+            if current is not None and remaining == 0:
+                current.diff = "\n".join(current_lines)
+                yield current
+                current = None
+            if current is None:
+                while pending and pending[0][1] == 0:
+                    yield pending.popleft()[0]
+                if not pending:
+                    break
+                current, remaining = pending.popleft()
+                current_lines = []
+                current_size = 0
+            remaining -= 1
+        elif current is None or line.startswith("* Unmerged path "):
+            continue
+        if current.path in skip_paths:
+            continue
+        current_size += len(line) + 1
+        if max_diff_bytes is not None and current_size > max_diff_bytes:
+            current.truncated = True
+            continue
+        current_lines.append(line)
+
+    if current is not None:
+        current.diff = "\n".join(current_lines)
+        yield current
+    for record, _ in pending:
+        yield record
+
+def process_file_ai_mode(
+    repo: GitRepo,
+    current_path: str,
+    status: str,
+    a_path: Optional[str],
+    diff: Optional[str] = None,
+    size: Optional[int] = None,
+    blob: Optional[str] = None,
+) -> List[str]:
+    """
+    Process file changes in AI mode (concise output).
 
+    When `diff` (the file's block from the staged patch) is given, everything is
+    derived from it and no git command is run for this file. When only the blob
+    `size` is known and it is over the limits, a size note is returned unread.
+    `blob` is the SHA of the file's contents (the old ones for deleted files).
+    """
     file_info = {
         "type": status,
         "content": ""
     }
 
     try:
-        if status == "new":
-            content = get_new_file_content(repo, current_path)
+        if diff is None and is_too_large(status, size, for_prompt=True):
+            file_info["content"] = large_file_note(status, size)
+
+        elif status == "new":
+            if diff is None:
+                content = get_new_file_content(repo, current_path, max_size=MAX_CONTENT_SIZE, sha=blob)
+            else:
+                content = content_from_patch(diff, "+")
             size = len(content.encode('utf-8'))
             if size <= MAX_CONTENT_SIZE:
                 file_info["content"] = content
@@ -129,12 +422,15 @@ def process_file_ai_mode(repo: GitRepo, current_path: str, status: str, a_path:
                 file_info["content"] = f"[Large new file: {size/1024:.1f}KB]"
         
         elif status == "modified":
-            diff = get_modified_file_diff(repo, current_path)
-            file_info["content"] = extract_diff_hunks(diff)
+            if diff is None:
+                diff = get_modified_file_diff(repo, current_path)
+            file_info["content"] = truncate_changes(extract_diff_hunks(diff))
         
         elif status == "renamed":
+            if diff is None:
+                diff = get_modified_file_diff(repo, current_path)
             file_info["old_path"] = a_path
-            file_info["content"] = extract_diff_hunks(get_modified_file_diff(repo, current_path))
+            file_info["content"] = truncate_changes(extract_diff_hunks(diff))
         
         elif status == "deleted":
             file_info["content"] = "[File deleted]"
@@ -144,28 +440,88 @@ def process_file_ai_mode(repo: GitRepo, current_path: str, status: str, a_path:
 
     return [current_path, file_info["type"], file_info["content"]]
 
-def process_file_user_mode(repo: GitRepo, current_path: str, status: str, a_path: Optional[str]) -> Dict:
-    """Process file changes in user mode (detailed output)"""
+def process_file_user_mode(
+    repo: GitRepo,
+    current_path: str,
+    status: str,
+    a_path: Optional[str],
+    diff: Optional[str] = None,
+    size: Optional[int] = None,
+    blob: Optional[str] = None,
+    max_bytes: Optional[int] = None,
+) -> Dict:
+    """Process file changes in user mode (detailed output). Contents are cut at `max_bytes`."""
     file_info = {
         "type": status,
         "content": "",
         "error": None
     }
 
-    if status == "new":
-        file_info["content"] = get_new_file_content(repo, current_path)
+    if diff is None and is_too_large(status, size, for_prompt=False):
+        file_info["content"] = large_file_note(status, size)
+        if status == "renamed":
+            file_info["old_path"] = a_path
+    elif status == "new":
+        if diff is None:
+            file_info["content"] = get_new_file_content(repo, current_path, max_size=MAX_BLOB_SIZE, sha=blob, limit=max_bytes)
+        else:
+            file_info["content"] = content_from_patch(diff, "+")
     elif status == "modified":
-        file_info["content"] = get_modified_file_diff(repo, current_path)
+        file_info["content"] = diff if diff is not None else get_modified_file_diff(repo, current_path)
     elif status == "deleted":
-        file_info["content"] = get_deleted_file_content(repo, current_path)
+        if diff is None:
+            file_info["content"] = get_deleted_file_content(repo, current_path, sha=blob, limit=max_bytes)
+        else:
+            file_info["content"] = content_from_patch(diff, "-")
     elif status == "renamed":
         file_info.update({
             "old_path": a_path,
-            "content": get_modified_file_diff(repo, current_path)
+            "content": diff if diff is not None else get_modified_file_diff(repo, current_path)
         })
 
     return file_info
 
+def is_too_large(status: str, size: Optional[int], for_prompt: bool) -> bool:
+    """
+    Whether a new file of `size` bytes is left unread (see `needs_patch`).
+
+    Only whole contents are limited by size: the patch of a large modified file
+    is usually a few lines, and is cut at MAX_CONTENT_SIZE instead (see `truncate_changes`).
+    """
+    if size is None or status != "new":
+        return False
+    return size > (MAX_CONTENT_SIZE if for_prompt else MAX_BLOB_SIZE)
+
+def truncate_changes(changes: str, limit: int = MAX_CONTENT_SIZE) -> str:
+    """Cut changes over `limit` bytes at a line boundary and say how much was left out."""
+    data = changes.encode('utf-8', 'surrogateescape')
+    if len(data) <= limit:
+        return changes
+    kept = data[:limit].rsplit(b'\n', 1)[0]
+    return kept.decode('utf-8', 'ignore') + f"\n[Changes truncated: {(len(data) - len(kept)) / 1024:.1f}KB more]"
+
+def large_file_note(status: str, size: int) -> str:
+    if status == "new":
+        return f"[Large new file: {size/1024:.1f}KB]"
+    return f"[Large file: {size/1024:.1f}KB, changes not shown]"
+
+def content_from_patch(diff: str, side: str) -> str:
+    """
+    Rebuild a whole file from the patch of an added ('+') or deleted ('-') file.
+
+    Matches what `git show` returns for the blob (without the final newline).
+    """
+    lines = []
+    in_hunk = False
+    for line in diff.split('\n'):
+        if not in_hunk:
+            if line.startswith(('Binary files ', 'GIT binary patch')):
+                return "[Binary file]"
+            in_hunk = line.startswith('@@')
+        elif line.startswith(side):
+            lines.append(line[1:])
+    return '\n'.join(lines)
+
 def extract_diff_hunks(diff_content: str) -> str:
     """Extract only the changed hunks from a diff output"""
     lines = diff_content.split('\n')
@@ -200,11 +556,23 @@ def get_file_status(a_path: Optional[str], b_path: Optional[str]) -> Optional[st
     except Exception:
         return None
 
-def get_new_file_content(repo: GitRepo, file_path: str) -> str:
-    """Get content of a new file."""
+def get_new_file_content(
+    repo: GitRepo,
+    file_path: str,
+    max_size: Optional[int] = None,
+    sha: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> str:
+    """
+    Get content of a new file, by blob `sha` or from the index.
+
+    Files over `max_size` bytes are not read, a size note is returned instead.
+    Only the first `limit` bytes are returned.
+    """
     try:
-        return repo.git.show(f':0:{file_path}')
-    except GitCommandError:
+        size, content = get_blob_reader(repo).read_text(sha or f':0:{file_path}', max_size, limit)
+        return large_file_note("new", size) if content is None else content
+    except (KeyError, OSError):
         try:
             if isinstance(repo.working_dir, tuple):
                 # If repo.working_dir is unexpectedly a 6tuple, use the first element
@@ -213,8 +581,10 @@ def get_new_file_content(repo: GitRepo, file_path: str) -> str:
                 working_dir = repo.working_dir
 
             full_path = os.path.join(working_dir, file_path)
+            if max_size is not None and os.path.getsize(full_path) > max_size:
+                return large_file_note("new", os.path.getsize(full_path))
             with open(full_path, 'r', encoding='utf-8') as f:
-                return f.read()
+                return f.read(limit if limit is not None else -1)
         except UnicodeDecodeError:
             return "[Binary file]"
         except TypeError as e:
@@ -229,61 +599,86 @@ def get_modified_file_diff(repo: GitRepo, file_path: str) -> str:
     except GitCommandError as e:
         return f"[Unable to get diff: {str(e)}]"
 
-def get_deleted_file_content(repo: GitRepo, file_path: str) -> str:
-    """Get content of a deleted file."""
+def get_deleted_file_content(repo: GitRepo, file_path: str, sha: Optional[str] = None, limit: Optional[int] = None) -> str:
+    """Get content of a deleted file, by blob `sha` or from HEAD, cut at `limit` bytes."""
     try:
-        return repo.git.show(f'HEAD:{file_path}')
-    except GitCommandError:
+        size, content = get_blob_reader(repo).read_text(sha or f'HEAD:{file_path}', MAX_BLOB_SIZE, limit)
+        return large_file_note("deleted", size) if content is None else content
+    except (KeyError, OSError):
         return "[Content not available]"
     
-def print_staged_changes(diffs: Dict[str, Union[Dict, List[str]]]) -> None:
-    """Pretty print staged changes."""
-    if not diffs:
-        console.print("[yellow]No staged changes found.[/yellow]")
-        return
+def print_staged_changes(
+    diffs: Union[Dict[str, Union[Dict, List[str]]], Iterable[Tuple[str, Union[Dict, List[str]]]]],
+    output: Optional[Console] = None,
+    preview_size: Optional[int] = 500,
+) -> None:
+    """
+    Pretty print staged changes.
+
+    `diffs` is a dict from `get_all_staged_diffs` or the lazy `iter_staged_diffs`;
+    files are printed as they come. Contents are cut at `preview_size` characters
+    (None prints them whole).
+    """
+    output = output or console
+    items = diffs.items() if isinstance(diffs, dict) else diffs
+    type_colors = {
+        "new": "green",
+        "modified": "yellow",
+        "deleted": "red",
+        "renamed": "blue",
+        "error": "red"
+    }
+
+    def print_content(content: str, truncated: bool = False) -> None:
+        preview = content if preview_size is None else content[:preview_size]
+        truncated = truncated or len(preview) < len(content)
+        output.print("Content preview:")
+        # written as is: rich's markup, highlighting and line wrapping cost seconds on large imports
+        output.file.write(preview + ("..." if truncated else "") + "\n")
+
+    printed_header = False
+    for file_path, info in items:
+        if not printed_header:
+            output.print("\n[bold blue]Staged Changes:[/bold blue]")
+            printed_header = True
 
-    console.print("\n[bold blue]Staged Changes:[/bold blue]")
-    for file_path, info in diffs.items():
-        
-        type_colors = {
-            "new": "green",
-            "modified": "yellow",
-            "deleted": "red",
-            "renamed": "blue",
-            "error": "red"
-        }
         if isinstance(info, list):
             color = type_colors.get(info[1], "white")
             
-            console.print(f"\n[{color}]File: {file_path}[/{color}]")
-            console.print(f"Type: {info[1]}")
+            output.print(f"\n[{color}]File: {file_path}[/{color}]")
+            output.print(f"Type: {info[1]}")
             
             if info[1] == "renamed":
-                console.print(f"Old path: {info[2]}")
+                output.print(f"Old path: {info[2]}")
             
             if info[1] == "error":
-                console.print(f"[red]Error: {info[2]}[/red]")
+                output.print(f"[red]Error: {info[2]}[/red]")
             elif info[1] == "new":
-                preview = info[2][:500] + ("..." if len(info[2]) > 500 else "")
-                console.print("Content preview:")
-                console.print(preview)
+                print_content(info[2])
         else:
             color = type_colors.get(info["type"], "white")
         
-            console.print(f"\n[{color}]File: {file_path}[/{color}]")
-            console.print(f"Type: {info['type']}")
+            output.print(f"\n[{color}]File: {file_path}[/{color}]")
+            output.print(f"Type: {info['type']}")
             
             if info["type"] == "renamed":
-                console.print(f"Old path: {info.get('old_path', 'unknown')}")
+                output.print(f"Old path: {info.get('old_path', 'unknown')}")
             
             if info.get("error"):
-                console.print(f"[red]Error: {info['error']}[/red]")
+                output.print(f"[red]Error: {info['error']}[/red]")
             elif content := info.get("content"):
-                preview = content[:500] + ("..." if len(content) > 500 else "")
-                console.print("Content preview:")
-                console.print(preview)
+                print_content(content, info.get("truncated", False))
+
+    if not printed_header:
+        output.print("[yellow]No staged changes found.[/yellow]")
 
-def get_current_repo_info(repo_path='.') -> Optional[Dict]:
+def get_current_repo_info(repo_path='.', offline: bool = False) -> Optional[Dict]:
+    """
+    Collect the repository context for the prompt.
+
+    Everything comes from the local repository, except the GitHub metadata which
+    is read from a cache and refreshed in the background (never in offline mode).
+    """
     try:
         repo = get_repo(repo_path)
         
@@ -304,7 +699,7 @@ def get_current_repo_info(repo_path='.') -> Optional[Dict]:
         try:
             if repo.remotes:
                 remote_url = repo.remotes.origin.url
-                github_info = get_github_info(remote_url)
+                github_info = get_cached_github_info(repo, remote_url, offline=offline)
                 if github_info:
                     project_info.update(github_info)
         except (AttributeError, git.exc.GitCommandError):
@@ -343,19 +738,97 @@ def get_current_repo_info(repo_path='.') -> Optional[Dict]:
         print(f"Warning: {str(e)}")
         return None
 
-def get_github_info(remote_url: str) -> Optional[Dict]:
+GITHUB_INFO_TTL = 24 * 60 * 60  # GitHub metadata barely changes
+GITHUB_INFO_RETRY = 60 * 60  # wait this long before retrying a failed fetch
+GITHUB_INFO_REFRESH_GRACE = 60  # do not start another refresh while one is running
+
+def get_cached_github_info(repo: GitRepo, remote_url: str, offline: bool = False) -> Optional[Dict]:
+    """
+    Return the cached GitHub metadata for `remote_url` without touching the network.
+
+    A missing or stale entry is refreshed by a detached background process, so
+    the next run gets fresh data and this one never waits for api.github.com.
+    """
+    if get_github_api_url(remote_url) is None:
+        return None
+
+    cache_path = get_git_wise_dir(repo, "github_info.json")
+    with span("github cache", offline=offline) as attrs:
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if entry.get('remote_url') != remote_url:
+                entry = None
+        except (OSError, ValueError):
+            entry = None
+        attrs["hit"] = bool(entry and entry.get('info'))
+
+        if not offline:
+            now = time.time()
+            ttl = GITHUB_INFO_TTL if entry and entry.get('info') else GITHUB_INFO_RETRY
+            stale = entry is None or now - entry.get('fetched', 0) > ttl
+            refreshing = entry is not None and now - entry.get('refresh_started', 0) < GITHUB_INFO_REFRESH_GRACE
+            attrs["refresh"] = stale and not refreshing
+            if stale and not refreshing:
+                entry = dict(entry or {}, remote_url=remote_url, refresh_started=now)
+                write_json_file(cache_path, entry)
+                refresh_github_info_in_background(cache_path, remote_url)
+
+    return entry.get('info') if entry else None
+
+def refresh_github_info_in_background(cache_path: str, remote_url: str) -> None:
+    """Fetch the GitHub metadata in a detached process that outlives this command."""
+    code = (
+        "import sys; from git_wise.utils.tracing import enable_tracing; enable_tracing(); "
+        "from git_wise.utils.git_utils import refresh_github_info; refresh_github_info(*sys.argv[1:])"
+    )
+    try:
+        subprocess.Popen(
+            [sys.executable, '-c', code, cache_path, remote_url],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    except OSError:
+        pass
+
+def refresh_github_info(cache_path: str, remote_url: str) -> None:
+    """Fetch the GitHub metadata and store it, failures are cached too."""
+    info = get_github_info(remote_url)
+    write_json_file(cache_path, {'remote_url': remote_url, 'fetched': time.time(), 'info': info})
+
+def write_json_file(path: str, data: Dict) -> None:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+def get_github_api_url(remote_url: str) -> Optional[str]:
     parsed_url = urlparse(remote_url)
     if 'github.com' not in parsed_url.netloc:
         return None
+    path_parts = parsed_url.path.strip('/').split('/')
+    if len(path_parts) < 2:
+        return None
+    owner, repo = path_parts[:2]
+    return f"https://api.github.com/repos/{owner}/{repo}"
 
-    try:
-        path_parts = parsed_url.path.strip('/').split('/')
-        if len(path_parts) < 2:
-            return None
-        owner, repo = path_parts[:2]
-        api_url = f"https://api.github.com/repos/{owner}/{repo}"
+def get_github_info(remote_url: str) -> Optional[Dict]:
+    import requests
 
-        response = requests.get(api_url, timeout=3)  # Short timeout
+    api_url = get_github_api_url(remote_url)
+    if api_url is None:
+        return None
+
+    try:
+        with span("github api") as attrs:
+            response = requests.get(api_url, timeout=3)  # Short timeout
+            attrs["status"] = response.status_code
         if response.status_code == 200:
             data = response.json()
             return {
@@ -0,0 +1,83 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Set
+
+from rich.console import Console
+from rich.table import Table
+
+from git_wise.utils.tracing import span
+
+# Run stages in the creating thread instead (used when profiling)
+RUN_INLINE = False
+
+_running: Set["Stage"] = set()  # stages whose thread has not finished, see wait_for_stages
+_running_lock = threading.Lock()
+
+
+class Stage:
+    """
+    One step of a command pipeline, started right away on a daemon thread.
+
+    Daemon threads (rather than a ThreadPoolExecutor) are used on purpose: a
+    stage whose result turns out not to be needed, e.g. client setup on a cache
+    hit, must not keep the process alive when the command is done. A process
+    that runs more commands waits for them with `wait_for_stages`.
+    """
+
+    def __init__(self, name: str, fn: Callable[..., Any], *args, **kwargs):
+        self.name = name
+        self.started: float = time.perf_counter()
+        self.finished: Optional[float] = None
+        self._future: Future = Future()
+        if RUN_INLINE:
+            self._run(fn, args, kwargs)
+            return
+        self._thread = threading.Thread(target=self._run, args=(fn, args, kwargs), name=f"git-wise {name}", daemon=True)
+        with _running_lock:
+            _running.add(self)
+        self._thread.start()
+
+    def _run(self, fn, args, kwargs):
+        try:
+            with span(f"stage {self.name}"):
+                self._future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            self._future.set_exception(e)
+        finally:
+            self.finished = time.perf_counter()
+            with _running_lock:
+                _running.discard(self)
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        """Wait for the stage and return its value, re-raising its exception (TimeoutError after `timeout` seconds)."""
+        return self._future.result(timeout)
+
+    @property
+    def duration(self) -> Optional[float]:
+        return None if self.finished is None else self.finished - self.started
+
+
+def wait_for_stages() -> None:
+    """Wait until every stage started so far has finished, including the ones whose result nobody asked for."""
+    while True:
+        with _running_lock:
+            stage = next(iter(_running), None)
+        if stage is None:
+            return
+        stage._thread.join()
+        with _running_lock:
+            _running.discard(stage)
+
+
+def print_stage_timings(console: Console, stages: List[Stage], origin: float) -> None:
+    """Print when each stage started and finished, relative to `origin` (perf_counter)."""
+    table = Table(title="Stage timings", title_justify="left", show_edge=False)
+    table.add_column("stage")
+    table.add_column("start", justify="right")
+    table.add_column("duration", justify="right")
+    for stage in stages:
+        duration = "running" if stage.duration is None else f"{stage.duration * 1000:.0f} ms"
+        table.add_row(stage.name, f"+{(stage.started - origin) * 1000:.0f} ms", duration)
+    table.add_row("[bold]wall clock[/bold]", "", f"[bold]{(time.perf_counter() - origin) * 1000:.0f} ms[/bold]")
+    console.print(table)
@@ -0,0 +1,91 @@
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional, TextIO
+
+# One JSON object per finished span, e.g.
+# {"span": "git diff", "start_ms": 12.1, "duration_ms": 40.3, "thread": "git-wise staged changes", "files": 120, "bytes": 53211}
+_output: Optional[TextIO] = None
+_lock = threading.Lock()
+_origin = time.perf_counter()
+
+
+def enable_tracing(target: Optional[str] = None) -> bool:
+    """
+    Write spans as JSON lines to `target`, or to GIT_WISE_TRACE when not given.
+
+    "1", "true" or "-" mean stderr, anything else is a file path (appended to).
+    A file traced to before is closed. Returns whether tracing is on.
+    """
+    global _output
+    if target is None and _output is not None:
+        return True
+    target = target or os.environ.get('GIT_WISE_TRACE', '')
+    if not target or target.lower() in ('0', 'false', 'no', 'off'):
+        return False
+    if target.lower() in ('1', 'true', 'yes', 'on', '-'):
+        output = sys.stderr
+    else:
+        output = open(target, 'a', buffering=1, encoding='utf-8')
+    with _lock:
+        previous, _output = _output, output
+    if previous is not None and previous is not sys.stderr and previous is not output:
+        previous.close()
+    return True
+
+
+def disable_tracing() -> None:
+    """Stop writing spans, closing the trace file if there is one."""
+    global _output
+    with _lock:
+        if _output is not None and _output is not sys.stderr:
+            _output.close()
+        _output = None
+
+
+def is_tracing() -> bool:
+    return _output is not None
+
+
+class span:
+    """
+    Time a block and, when tracing is on, write it as a JSON line on exit.
+
+        with span("git diff", files=len(paths)) as attrs:
+            ...
+            attrs["bytes"] = size
+
+    Attributes can be added to the yielded dict until the block ends. When tracing
+    is off this costs two attribute lookups.
+    """
+
+    __slots__ = ("name", "attrs", "started")
+
+    def __init__(self, name: str, **attrs: Any):
+        self.name = name
+        self.attrs: Dict[str, Any] = attrs
+
+    def __enter__(self) -> Dict[str, Any]:
+        self.started = time.perf_counter()
+        return self.attrs
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if _output is None:
+            return
+        finished = time.perf_counter()
+        record = {
+            "span": self.name,
+            "start_ms": round((self.started - _origin) * 1000, 3),
+            "duration_ms": round((finished - self.started) * 1000, 3),
+            "thread": threading.current_thread().name,
+        }
+        record.update(self.attrs)
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        line = json.dumps(record, default=str)
+        with _lock:
+            if _output is not None:
+                _output.write(line + "\n")
+                _output.flush()
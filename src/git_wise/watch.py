@@ -0,0 +1,204 @@
+"""
+`git-wise watch`: generate the commit message while the changes are staged.
+
+The index file is watched (inotify on Linux, polling elsewhere); once it has
+stopped changing for a moment the message for the staged tree is generated in
+the background and stored, keyed on the tree ID `git write-tree` gives for the
+index. The prepare-commit-msg hook (hook.py) computes the same tree ID when
+`git commit` runs and only has to read the stored message.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import subprocess
+import sys
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from git.repo import Repo as GitRepo
+
+from git_wise.config import load_config
+from git_wise.core.staged import generate_message, message_settings
+from git_wise.utils.tracing import span
+
+DEBOUNCE = 1.0  # seconds the index must stay unchanged before generating
+POLL_INTERVAL = 0.5  # seconds between index checks without inotify
+
+# from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class IndexWatcher:
+    """
+    Tells when a repository's index file changes.
+
+    git never writes the index in place: it writes index.lock and renames it, so
+    the git directory is watched for an `index` entry being moved in (or written,
+    by other tools). Without inotify the file's stat signature is polled.
+    """
+
+    def __init__(self, index_path: str, poll_interval: float = POLL_INTERVAL):
+        self.index_path = index_path
+        self.poll_interval = poll_interval
+        self._name = os.fsencode(os.path.basename(index_path))
+        self._fd = _inotify_watch(os.path.dirname(index_path) or ".")
+        self._signature = self._stat()
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._fd is not None
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.index_path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait up to `timeout` seconds (forever with None) for a change; True if there was one."""
+        if self._fd is None:
+            return self._poll(timeout)
+        while True:
+            readable, _, _ = select.select([self._fd], [], [], timeout)
+            if not readable:
+                return False
+            if self._read_events():
+                return True
+
+    def _read_events(self) -> bool:
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        changed = False
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b"\0")
+            changed = changed or name == self._name
+            offset += _EVENT_HEADER.size + length
+        return changed
+
+    def _poll(self, timeout: Optional[float]) -> bool:
+        waited = 0.0
+        stopped = threading.Event()
+        while timeout is None or waited < timeout:
+            interval = self.poll_interval if timeout is None else min(self.poll_interval, timeout - waited)
+            stopped.wait(interval)
+            waited += interval
+            signature = self._stat()
+            if signature != self._signature:
+                self._signature = signature
+                return True
+        return False
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def _inotify_watch(directory: str) -> Optional[int]:
+    """An inotify descriptor watching `directory`, or None where inotify is not available."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) < 0:
+        os.close(fd)  # e.g. out of watches (fs.inotify.max_user_watches)
+        return None
+    return fd
+
+
+def staged_tree(repo: GitRepo) -> Optional[str]:
+    """
+    The ID of the tree the index would be committed as, or None (e.g. unmerged paths).
+
+    Runs `git write-tree`, which stores the tree objects `git commit` is about to
+    write anyway. It honors GIT_INDEX_FILE, which git sets for `commit -a` and
+    `commit <paths>` while the hook runs.
+    """
+    result = subprocess.run(["git", "write-tree"], cwd=repo.working_dir, capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def precomputed_cache(repo: GitRepo):
+    from git_wise.core.cache import MessageCache
+    from git_wise.utils.git_utils import get_git_wise_dir
+    return MessageCache(get_git_wise_dir(repo, "precomputed"))
+
+
+def precomputed_key(tree: str, config: Dict) -> str:
+    from git_wise.core.cache import MessageCache, prompt_settings
+    from git_wise.core.prompts import PROMPT_VERSION
+    language, detail, provider_name, model = message_settings(config)
+    settings = prompt_settings(config.get('token_budget'), config.get('unlimited_chunk', False), filtered=True)
+    return MessageCache.make_key([tree], language, detail, f"{provider_name}/{model}", PROMPT_VERSION, settings)
+
+
+def precompute(repo: GitRepo, config: Dict) -> Optional[str]:
+    """
+    Generate and store the message for the current index, unless it already is.
+    Returns the tree ID when a new message was stored, or None.
+    """
+    with span("precompute") as attrs:
+        tree = staged_tree(repo)
+        head = repo.git.rev_parse("HEAD^{tree}") if repo.head.is_valid() else None
+        if tree is None or tree == head:
+            return None  # unmerged paths, or nothing staged
+        # `git write-tree` may have rewritten the index (its cached trees): that wakes
+        # the watcher once more and ends here
+        store = precomputed_cache(repo)
+        key = precomputed_key(tree, config)
+        attrs["hit"] = store.get(key) is not None
+        if attrs["hit"]:
+            return None
+        message = generate_message(repo, config)
+        if message is None or staged_tree(repo) != tree:
+            return None  # the index changed while generating; the watcher has seen that too
+        store.put(key, message.strip('`').strip())
+        return tree
+
+
+def watch(
+    repo: GitRepo,
+    debounce: float = DEBOUNCE,
+    on_event: Optional[Callable[[str], None]] = None,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    """Precompute the message whenever the staged changes settle, until `stop` is set."""
+    on_event = on_event or (lambda text: None)
+    watcher = IndexWatcher(os.path.join(repo.git_dir, "index"))
+    on_event(f"Watching {watcher.index_path} ({'inotify' if watcher.uses_inotify else 'polling'})")
+    stop = stop or threading.Event()
+    pending = True  # whatever is staged already
+    try:
+        while not stop.is_set():
+            if not pending:
+                # wake up now and then to notice `stop`
+                pending = watcher.wait(timeout=1.0)
+                continue
+            while watcher.wait(timeout=debounce):
+                pass  # still being staged
+            pending = False
+            try:
+                tree = precompute(repo, load_config())
+                if tree:
+                    on_event(f"Message ready for tree {tree[:12]}")
+            except Exception as e:
+                on_event(f"Generation failed: {e}")
+    finally:
+        watcher.close()
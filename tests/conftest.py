@@ -0,0 +1,23 @@
+import subprocess
+
+import pytest
+
+
+def git(repo_dir, *args):
+    """Run git in `repo_dir`, failing the test on an error, and return its output."""
+    return subprocess.run(['git', *args], cwd=repo_dir, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def init_repo(path):
+    """An empty repository at `path` (created if needed) that can commit."""
+    path.mkdir(parents=True, exist_ok=True)
+    git(path, 'init', '-q')
+    git(path, 'config', 'user.email', 'test@example.com')
+    git(path, 'config', 'user.name', 'test')
+    return path
+
+
+@pytest.fixture
+def git_repo(tmp_path):
+    """`tmp_path` as an empty repository."""
+    return init_repo(tmp_path)
@@ -0,0 +1,57 @@
+import pytest
+
+from conftest import git, init_repo
+
+from git_wise.batch import STATUS_CACHED, STATUS_EMPTY, STATUS_ERROR, expand_paths, run_batch
+from git_wise.core.cache import MessageCache
+from git_wise.core.staged import collect_prompt
+from git_wise.utils.git_utils import get_git_wise_dir, get_repo
+
+
+def make_repo(path, staged=True):
+    init_repo(path)
+    if staged:
+        (path / 'a.txt').write_text('a\n')
+        git(path, 'add', 'a.txt')
+    return str(path)
+
+
+def test_expand_paths(tmp_path):
+    first = make_repo(tmp_path / 'one')
+    second = make_repo(tmp_path / 'two')
+    git(first, 'commit', '-qm', 'init')
+    git(first, 'worktree', 'add', '-q', str(tmp_path / 'wt'))
+
+    assert expand_paths([str(tmp_path / 't*'), first, first + '/']) == [second, first]
+    assert expand_paths([first], worktrees=True) == [first, str(tmp_path / 'wt')]
+
+
+@pytest.fixture
+def api_key(monkeypatch, tmp_path):
+    # the workers are new processes: only the environment reaches them
+    monkeypatch.setenv('OPENAI_API_KEY', 'sk-test')
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('GIT_WISE_OFFLINE', '1')
+
+
+def test_results_per_repository(tmp_path, api_key):
+    cached = make_repo(tmp_path / 'cached')
+    prompt = collect_prompt(get_repo(cached), {})
+    MessageCache(get_git_wise_dir(get_repo(cached), 'messages')).put(prompt.cache_key, 'feat: add a')
+    empty = make_repo(tmp_path / 'empty', staged=False)
+    missing = str(tmp_path / 'missing')
+
+    emitted = []
+    results = run_batch([cached, empty, missing], {}, emit=emitted.append, jobs=2)
+
+    assert emitted == results
+    by_path = {result['path']: result for result in results}
+    assert by_path[cached]['status'] == STATUS_CACHED
+    assert by_path[cached]['message'] == 'feat: add a'
+    assert by_path[cached]['files'] == 1
+    assert by_path[empty]['status'] == STATUS_EMPTY
+    assert by_path[missing]['status'] == STATUS_ERROR and by_path[missing]['error']
+
+
+def test_nothing_to_do():
+    assert run_batch([], {}, emit=print) == []
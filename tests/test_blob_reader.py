@@ -0,0 +1,44 @@
+import pytest
+
+from conftest import git
+
+from git_wise.utils.blob_reader import BlobReader
+
+
+@pytest.fixture
+def reader(git_repo, tmp_path):
+    (tmp_path / 'a.txt').write_text('hello\n')
+    (tmp_path / 'big.txt').write_text('x' * 200000)
+    (tmp_path / 'bin.dat').write_bytes(b'\x00\x01\x02')
+    git(tmp_path, 'add', '.')
+    reader = BlobReader(str(tmp_path))
+    yield reader
+    reader.close()
+
+
+def test_reads_many_objects_through_one_process(reader, tmp_path):
+    sha = git(tmp_path, 'rev-parse', ':0:a.txt')
+    assert reader.read(sha) == (6, b'hello\n')
+    proc = reader._proc
+    assert reader.read_text(':0:a.txt') == (6, 'hello')
+    assert reader.read_text(':0:bin.dat') == (3, '[Binary file]')
+    assert reader._proc is proc
+
+
+def test_oversized_and_missing_objects(reader):
+    assert reader.read(':0:big.txt', max_size=1000) == (200000, None)
+    # the skipped contents were drained, the next answer is in sync
+    assert reader.read_text(':0:a.txt') == (6, 'hello')
+    with pytest.raises(KeyError):
+        reader.read(':0:missing.txt')
+    with pytest.raises(KeyError):
+        reader.read('a\nb')
+    assert reader.read_text(':0:a.txt') == (6, 'hello')
+
+
+def test_small_limit_still_detects_binary_files(reader, tmp_path):
+    (tmp_path / 'late.dat').write_bytes(b'a' * 500 + b'\x00' + b'b' * 500)
+    git(tmp_path, 'add', 'late.dat')
+    assert reader.read_text(':0:late.dat', limit=100) == (1001, '[Binary file]')
+    assert reader.read_text(':0:big.txt', limit=100) == (200000, 'x' * 100)
+    assert reader.read_text(':0:a.txt', limit=3) == (6, 'hel')
@@ -0,0 +1,99 @@
+import os
+
+from git_wise.core.cache import DIFF_CACHE_VERSION, DiffCache, MessageCache, prompt_settings
+
+
+def key(sections, **overrides):
+    options = dict(language='en', detail_level='brief', model='gpt-4o-mini', prompt_version='1')
+    options.update(overrides)
+    return MessageCache.make_key(sections, **options)
+
+
+def test_key_ignores_line_endings_and_trailing_whitespace():
+    assert key(['a.py\n+x = 1  \r\n']) == key(['a.py\n+x = 1\n'])
+    assert key(['a.py\n+x = 1']) != key(['a.py\n+x = 2'])
+    assert key(['a', 'b']) != key(['a\nb'])
+
+
+def test_key_covers_generation_options():
+    base = key(['a.py'])
+    assert base != key(['a.py'], language='zh')
+    assert base != key(['a.py'], detail_level='minimal')
+    assert base != key(['a.py'], model='gpt-4o')
+    assert base != key(['a.py'], prompt_version='2')
+
+
+def test_key_covers_prompt_settings():
+    default = prompt_settings(None, False, filtered=True)
+    assert key(['a.py'], settings=default) != key(['a.py'], settings=prompt_settings(8000, False, filtered=True))
+    assert key(['a.py'], settings=default) != key(['a.py'], settings=prompt_settings(None, True, filtered=True))
+    assert key(['a.py'], settings=default) != key(['a.py'], settings=prompt_settings(None, False, filtered=False))
+
+
+def test_round_trip(tmp_path):
+    cache = MessageCache(str(tmp_path / 'messages'))
+    assert cache.get('missing') is None
+    cache.put('k', 'feat: add cache')
+    assert cache.get('k') == 'feat: add cache'
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = MessageCache(str(tmp_path), max_bytes=300)
+    for i in range(3):
+        cache.put(f'k{i}', 'x' * 50)
+        os.utime(tmp_path / f'k{i}.json', (1000 + i, 1000 + i))
+    assert cache.get('k0') is not None  # a hit makes k0 the most recently used entry
+    for i in range(3, 5):
+        cache.put(f'k{i}', 'x' * 50)
+    assert cache.get('k1') is None
+    assert cache.get('k2') is None
+    assert cache.get('k0') is not None
+    assert sum(f.stat().st_size for f in tmp_path.iterdir()) <= 300
+
+
+class LengthCounter:
+    name = 'chars'
+
+    def __init__(self):
+        self.known = {}
+
+    def count(self, sections):
+        self.known.update((s, len(s)) for s in sections)
+
+
+def test_diff_cache_round_trip_with_token_counts(tmp_path):
+    old, new = 'a' * 40, 'b' * 40
+    cache = DiffCache(str(tmp_path))
+    assert cache.get('a.py', old, new) is None
+    cache.put('a.py', old, new, '@@ -1 +1 @@\n-x\n+y')
+    counter = LengthCounter()
+    sections = {'a.py': 'a.py\nmodified\n@@ -1 +1 @@\n-x\n+y'}
+    counter.count(sections.values())
+    cache.save(counter, sections)
+
+    cache = DiffCache(str(tmp_path))
+    assert cache.get('a.py', old, new) == '@@ -1 +1 @@\n-x\n+y'
+    counter = LengthCounter()
+    cache.seed(counter, sections)
+    assert counter.known == {sections['a.py']: len(sections['a.py'])}
+
+    # the same blobs under another path may diff differently (.gitattributes): another entry
+    cache = DiffCache(str(tmp_path))
+    assert cache.get('b.py', old, new) is None
+    counter = LengthCounter()
+    cache.seed(counter, {'b.py': 'b.py\nmodified\n@@ -1 +1 @@\n-x\n+y'})
+    assert counter.known == {}
+
+
+def test_diff_cache_new_files_and_unchanged_runs(tmp_path):
+    cache = DiffCache(str(tmp_path))
+    cache.put('new.py', None, 'c' * 40, 'print(1)')
+    cache.save()
+    assert [p.name for p in tmp_path.iterdir()] == [f"{DiffCache.make_key('new.py', None, 'c' * 40)}.json"]
+    assert DiffCache.make_key('new.py', None, 'c' * 40).startswith(f"v{DIFF_CACHE_VERSION}-{'0' * 40}-{'c' * 40}-")
+
+    cache = DiffCache(str(tmp_path))
+    assert cache.get('new.py', None, 'c' * 40) == 'print(1)'
+    mtime = os.stat(next(tmp_path.iterdir())).st_mtime_ns
+    cache.save()  # nothing new: nothing is written
+    assert os.stat(next(tmp_path.iterdir())).st_mtime_ns == mtime
@@ -0,0 +1,68 @@
+from git_wise.core.chunker import DiffChunker
+from git_wise.core.tokenizer import TokenCounter
+
+
+class ByteCounter:
+    """One token per UTF-8 byte, which makes multi-byte characters span several tokens."""
+
+    known = {}
+    upper_bound = TokenCounter.upper_bound
+    fits = TokenCounter.fits
+
+    def encode(self, message):
+        return list(message.encode('utf-8'))
+
+    def count_tokens(self, message):
+        return len(self.encode(message))
+
+    def count_tokens_batch(self, messages):
+        return [self.count_tokens(m) for m in messages]
+
+    def decode_bytes(self, tokens):
+        return bytes(tokens)
+
+
+def hunk(start, lines):
+    return '\n'.join([f'@@ -{start},{lines} +{start},{lines} @@'] + [f'+line {start + i}' for i in range(lines)])
+
+
+def test_small_sections_share_one_chunk():
+    chunker = DiffChunker(ByteCounter(), 1000)
+    sections = ['a.py\nmodified\n' + hunk(1, 3), 'b.py\nnew\nprint(1)']
+    chunks, total = chunker.chunk(sections)
+    assert chunks == ['\n'.join(sections)]
+    assert total == sum(len(s) for s in sections)
+
+
+def test_chunks_respect_budget_and_keep_files_whole():
+    counter = ByteCounter()
+    chunker = DiffChunker(counter, 200)
+    sections = [f'f{i}.py\nmodified\n' + hunk(1, 4) for i in range(10)]
+    chunks, _ = chunker.chunk(sections)
+    assert 1 < len(chunks) < len(sections)
+    assert all(counter.count_tokens(c) <= 200 for c in chunks)
+    assert '\n'.join(chunks) == '\n'.join(sections)
+
+
+def test_large_file_is_split_at_hunk_boundaries():
+    counter = ByteCounter()
+    chunker = DiffChunker(counter, 150)
+    hunks = [hunk(start, 5) for start in range(1, 60, 10)]
+    chunks, _ = chunker.chunk(['big.py\nmodified\n' + '\n'.join(hunks)])
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.startswith('big.py\nmodified\n@@')
+        assert counter.count_tokens(chunk) <= 150
+    body = [c[len('big.py\nmodified\n'):] for c in chunks]
+    assert '\n'.join(body).split('\n@@') == '\n'.join(hunks).split('\n@@')
+
+
+def test_oversized_line_is_cut_without_breaking_characters():
+    counter = ByteCounter()
+    chunker = DiffChunker(counter, 64)
+    line = '+' + 'é中😀' * 40
+    chunks, _ = chunker.chunk(['min.js\nnew\n' + line])
+    assert all('�' not in c for c in chunks)
+    bodies = [c.split('\n', 1)[1] for c in chunks]
+    assert ''.join(b.replace('\n', '') for b in bodies) == 'new' + line
+    assert all(counter.count_tokens(c) <= 64 for c in chunks)
@@ -6,4 +6,14 @@ def test_version():
     runner = CliRunner()
     result = runner.invoke(cli, ['--version'])
     assert result.exit_code == 0
-    assert 'Git-Wise Version:' in result.output
\ No newline at end of file
+    assert 'Git-Wise Version:' in result.output
+
+def test_import_does_not_load_heavy_dependencies():
+    import subprocess
+    import sys
+    code = (
+        "import sys, git_wise.cli; "
+        "print(','.join(m for m in ('openai', 'tiktoken', 'git', 'questionary', 'pyperclip', 'requests') if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ''
@@ -0,0 +1,126 @@
+import io
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from conftest import git, init_repo
+
+from git_wise import client
+from git_wise.client import forward, should_forward
+
+pytestmark = pytest.mark.skipif(not hasattr(__import__('socket'), 'AF_UNIX'), reason='needs Unix domain sockets')
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    path = str(tmp_path / 'git-wise.sock')
+    env = dict(os.environ, HOME=str(tmp_path), GIT_WISE_SOCKET=path, OPENAI_API_KEY='')
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('GIT_WISE_SOCKET', path)
+    monkeypatch.delenv('GIT_WISE_NO_DAEMON', raising=False)
+    proc = subprocess.Popen(
+        [sys.executable, '-c', 'from git_wise.daemon import serve; serve()'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while client.connect(path) is None:
+        assert proc.poll() is None, 'the daemon exited'
+        assert time.time() < deadline, 'the daemon did not start listening'
+        time.sleep(0.05)
+    yield path
+    from git_wise.daemon import stop
+    stop(path)
+    proc.wait(timeout=10)
+    assert not os.path.exists(path)
+
+
+def run(argv):
+    out, err = io.StringIO(), io.StringIO()
+    return forward(argv, stdout=out, stderr=err), out.getvalue(), err.getvalue()
+
+
+def test_commands_that_need_the_terminal_run_locally(monkeypatch):
+    monkeypatch.delenv('GIT_WISE_NO_DAEMON', raising=False)
+    assert should_forward(['start', '--split'])
+    assert should_forward(['show-diff'])
+    assert not should_forward(['start', '-i'])
+    assert not should_forward(['start', '--help'])
+    assert not should_forward(['start', '-ui'])
+    assert not should_forward(['start', '-si', '-l', 'en'])
+    assert should_forward(['start', '-li'])  # language "i"
+    assert should_forward(['start', '-k3', '-su'])
+    assert not should_forward(['config', '--model'])
+    assert not should_forward([])
+    monkeypatch.setenv('GIT_WISE_NO_DAEMON', '1')
+    assert not should_forward(['start'])
+
+
+def test_without_a_daemon_nothing_is_forwarded(tmp_path, monkeypatch):
+    monkeypatch.setenv('GIT_WISE_SOCKET', str(tmp_path / 'missing.sock'))
+    assert run(['show-diff']) == (None, '', '')
+
+
+def test_commands_run_in_the_callers_directory_and_environment(daemon, tmp_path, monkeypatch):
+    repo_dir = init_repo(tmp_path / 'repo')
+    (repo_dir / 'hello.txt').write_text('hello\n')
+    git(repo_dir, 'add', 'hello.txt')
+    monkeypatch.chdir(repo_dir)
+
+    status, out, _ = run(['show-diff', '--no-pager'])
+    assert status == 0
+    assert 'hello.txt' in out
+
+    # a new file staged between two commands is seen by the second one
+    (repo_dir / 'later.txt').write_text('later\n')
+    git(repo_dir, 'add', 'later.txt')
+    status, out, _ = run(['show-diff', '--no-pager'])
+    assert status == 0
+    assert 'later.txt' in out
+
+    elsewhere = tmp_path / 'not-a-repo'
+    elsewhere.mkdir()
+    monkeypatch.chdir(elsewhere)
+    monkeypatch.setenv('OPENAI_API_KEY', 'sk-test')
+    status, out, _ = run(['start'])
+    assert status == 1
+    assert 'Not a git repository' in out
+
+
+def test_interactive_config_falls_back_to_the_client(daemon, tmp_path):
+    (tmp_path / '.git-wise.yaml').write_text('interactive: true\n')
+    assert run(['start']) == (None, '', '')
+
+    opened = []
+    pager = client.LazyOutput(lambda: opened.append(True) or io.StringIO())
+    assert client.run_remote(client.connect(), ['start'], stdout=pager, tty=True) is None
+    assert not opened  # no empty pager before the command runs here
+
+
+def test_dropped_stages_finish_in_the_commands_state(tmp_path):
+    from git_wise.daemon import command_context
+    from git_wise.utils.pipeline import Stage
+    release = threading.Event()
+    seen = []
+
+    def not_needed():
+        release.wait(5)
+        seen.append((os.getcwd(), os.environ.get('GIT_WISE_TEST')))
+
+    with command_context({'env': {'GIT_WISE_TEST': 'client'}, 'cwd': str(tmp_path)}, io.BytesIO()):
+        Stage('not needed', not_needed)  # like client setup on a cache hit
+        threading.Timer(0.1, release.set).start()
+    assert seen == [(str(tmp_path), 'client')]
+    assert os.getcwd() != str(tmp_path) and 'GIT_WISE_TEST' not in os.environ
+
+
+def test_client_import_is_light():
+    code = (
+        "import sys, git_wise.client; "
+        "print(','.join(m for m in ('click', 'rich', 'openai', 'git') if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ''
@@ -0,0 +1,64 @@
+import pytest
+from git.repo import Repo as GitRepo
+
+from conftest import git
+
+from git_wise.core.filters import (
+    count_saved_tokens,
+    filter_staged_changes,
+    get_ignore_patterns,
+    is_minified,
+    matches_pattern,
+)
+from git_wise.utils.git_utils import get_all_staged_diffs
+
+
+@pytest.mark.parametrize('path, pattern, expected', [
+    ('web/dist/app.js', 'dist/', True),
+    ('dist.py', 'dist/', False),
+    ('static/app.min.js', '*.min.js', True),
+    ('static/app.js', '*.min.js', False),
+    ('docs/api/gen.md', 'docs/api/*', True),
+    ('other/docs/api/gen.md', 'docs/api/*', False),
+])
+def test_matches_pattern(path, pattern, expected):
+    assert matches_pattern(path, pattern) is expected
+
+
+def test_is_minified():
+    assert is_minified('+' + 'a=1;' * 300)
+    assert not is_minified('\n'.join('+x = 1' for _ in range(300)))
+    assert not is_minified('+' + 'x' * 600 + '\n' + '\n'.join('+y' for _ in range(50)))
+
+
+def test_filter_staged_changes(git_repo, tmp_path):
+    git(tmp_path, 'config', 'git-wise.ignore', 'fixtures/*')
+    (tmp_path / '.gitattributes').write_text('gen/** linguist-generated\n*.bin -diff\n')
+    (tmp_path / 'gen').mkdir()
+    (tmp_path / 'gen' / 'schema.py').write_text('X = 1\n' * 100)
+    (tmp_path / 'data.bin').write_text('payload\n')
+    (tmp_path / 'fixtures').mkdir()
+    (tmp_path / 'fixtures' / 'case.json').write_text('{}\n')
+    (tmp_path / 'bundle.js').write_text('var a=1;' * 200 + '\n')
+    (tmp_path / 'main.py').write_text('print("hi")\n')
+    git(tmp_path, 'add', '.')
+    repo = GitRepo(tmp_path)
+
+    diffs = get_all_staged_diffs(repo)
+    filtered, excluded = filter_staged_changes(repo, diffs, get_ignore_patterns(repo, {}))
+
+    reasons = {e.path: e.reason for e in excluded}
+    assert reasons == {
+        'gen/schema.py': 'generated (.gitattributes)',
+        'data.bin': '-diff (.gitattributes)',
+        'fixtures/case.json': 'ignored (fixtures/*)',
+        'bundle.js': 'minified',
+    }
+    assert filtered['main.py'] == diffs['main.py']
+    assert filtered['gen/schema.py'][2].startswith('[Excluded from prompt: generated')
+
+    class CharCounter:
+        def estimate_tokens_batch(self, messages):
+            return [len(m) for m in messages]
+
+    assert count_saved_tokens(excluded, CharCounter()) == sum(len(e.content) - len(e.stub) for e in excluded)
@@ -0,0 +1,303 @@
+import json
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from git_wise.core import generator as generator_module
+from git_wise.core.generator import AIProvider, CommitMessageGenerator
+from git_wise.core.tokenizer import TokenCounter
+
+
+class WordCounter:
+    """One token per whitespace separated word, no tiktoken download needed."""
+
+    upper_bound = TokenCounter.upper_bound
+    fits = TokenCounter.fits
+
+    def __init__(self, model=None):
+        self.known = {}
+
+    def encode(self, message):
+        return [ord(c) for c in message]
+
+    def count_tokens(self, message):
+        return len(message.split())
+
+    def count_tokens_batch(self, messages):
+        return [self.count_tokens(m) for m in messages]
+
+    def decode_bytes(self, tokens):
+        return ''.join(chr(t) for t in tokens).encode('utf-8')
+
+
+class FakeCompletions:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.short_answer = 0  # messages left out of structured answers
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def create(self, model, messages, **kwargs):
+        with self.lock:
+            self.calls.append(messages)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        system = messages[0]['content']
+        if 'summarizing one part' in system:
+            content = 'summary of ' + messages[-1]['content'].split()[0]
+        elif 'separate commits' in system:
+            count = messages[-1]['content'].count('### Commit')
+            content = json.dumps({'messages': [f'feat: commit {i + 1}' for i in range(count - self.short_answer)]})
+        else:
+            content = 'feat: final message'
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(total_tokens=10),
+        )
+
+
+@pytest.fixture
+def make_generator(monkeypatch):
+    monkeypatch.setattr(generator_module, 'TokenCounter', WordCounter)
+    monkeypatch.setattr(generator_module, 'get_client', lambda provider: None)
+
+    def make(max_tokens=20, max_chunks=2, delay=0.0, **kwargs):
+        monkeypatch.setattr(CommitMessageGenerator, 'MAX_TOKENS', max_tokens)
+        monkeypatch.setattr(CommitMessageGenerator, 'MAX_CHUNKS', max_chunks)
+        generator = CommitMessageGenerator(AIProvider.OPENAI, **kwargs)
+        completions = FakeCompletions(delay)
+        generator.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        return generator, completions
+
+    return make
+
+
+def sections(count):
+    return [f'file{i}.py modified ' + ' '.join(['+x'] * 15) for i in range(count)]
+
+
+def test_small_change_is_a_single_request(make_generator):
+    generator, completions = make_generator()
+    message, tokens = generator.generate_commit_message(sections(2), 'en', 'brief', {})
+    assert message == 'feat: final message'
+    assert tokens == 10
+    assert len(completions.calls) == 1
+    assert len(completions.calls[0]) == 4  # system + context + one user message per chunk
+
+
+def test_large_change_uses_concurrent_map_reduce(make_generator):
+    generator, completions = make_generator(max_concurrency=3, delay=0.05)
+    message, tokens = generator.generate_commit_message(sections(6), 'en', 'brief', {})
+    assert message == 'feat: final message'
+    assert len(completions.calls) == 7  # six summaries + the final request
+    assert tokens == 70
+    assert completions.peak == 3
+    final_user = [m['content'] for m in completions.calls[-1][2:]]
+    joined = '\n'.join(final_user)
+    assert joined.index('summary of file0.py') < joined.index('summary of file5.py')
+
+
+def test_unlimited_chunk_sends_everything_in_one_request(make_generator):
+    generator, completions = make_generator(unlimited_chunk=True)
+    generator.generate_commit_message(sections(6), 'en', 'brief', {})
+    assert len(completions.calls) == 1
+    assert len(completions.calls[0]) == 8
+
+
+def stream_chunk(content=None, total_tokens=None):
+    choices = [] if content is None else [SimpleNamespace(delta=SimpleNamespace(content=content))]
+    usage = None if total_tokens is None else SimpleNamespace(total_tokens=total_tokens)
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+def test_streamed_message_reports_deltas_and_timings(make_generator):
+    generator, completions = make_generator()
+
+    def create(model, messages, stream=False, stream_options=None, **kwargs):
+        assert stream and stream_options == {'include_usage': True}
+        time.sleep(0.02)
+        return iter([stream_chunk('feat: '), stream_chunk('stream it'), stream_chunk(None, total_tokens=42)])
+
+    completions.create = create
+    received = []
+    message, tokens = generator.generate_commit_message(sections(1), 'en', 'brief', {}, on_delta=received.append)
+    assert message == 'feat: stream it'
+    assert received == ['feat: ', 'stream it']
+    assert tokens == 42
+    stats = generator.last_stats
+    assert stats.total_tokens == 42
+    assert 0.02 <= stats.time_to_first_token <= stats.latency
+
+
+def test_split_groups_share_one_structured_request(make_generator):
+    generator, completions = make_generator(max_tokens=200)
+    groups = [sections(1), sections(2)]
+    messages, tokens = generator.generate_commit_messages(groups, 'en', 'brief', {})
+    assert messages == ['feat: commit 1', 'feat: commit 2']
+    assert tokens == 10 and len(completions.calls) == 1
+
+
+def test_split_groups_fall_back_to_one_request_each(make_generator):
+    generator, completions = make_generator(max_tokens=200)
+    completions.short_answer = 1
+    messages, tokens = generator.generate_commit_messages([sections(1), sections(2)], 'en', 'brief', {})
+    assert messages == ['feat: final message', 'feat: final message']
+    assert tokens == 30 and len(completions.calls) == 3
+
+    # too large for one request: straight to one request per group
+    generator, completions = make_generator(max_tokens=20)
+    messages, _ = generator.generate_commit_messages([sections(1), sections(1)], 'en', 'brief', {})
+    assert len(messages) == 2 and len(completions.calls) == 2
+
+
+def test_prompt_prefix_is_static_and_changes_come_last(make_generator):
+    generator, completions = make_generator()
+    first = {'current_branch': 'main', 'recent_commits': [{'message': 'a', 'date': datetime(2024, 1, 1)}]}
+    second = {'recent_commits': [{'message': 'b', 'date': datetime(2024, 1, 2)}], 'current_branch': 'dev'}
+    generator.generate_commit_message(sections(1), 'en', 'brief', first)
+    generator.generate_commit_message(sections(2), 'de', 'detailed', second)
+
+    (system_a, context_a, *changes_a), (system_b, context_b, *changes_b) = completions.calls
+    assert system_a == system_b
+    assert '{' not in system_a['content']
+    assert 'Language preference: de' in context_b['content'] and '"current_branch": "dev"' in context_b['content']
+    assert '2024-01-01 00:00:00' in context_a['content']
+    assert changes_b[0]['content'].startswith('file0.py modified')
+
+    # the same context is always rendered the same way
+    generator.generate_commit_message(sections(1), 'en', 'brief', dict(reversed(list(first.items()))))
+    assert completions.calls[2][1] == context_a
+
+
+def test_cached_prompt_tokens_are_reported(make_generator):
+    generator, completions = make_generator()
+
+    def create(model, messages, **kwargs):
+        usage = SimpleNamespace(total_tokens=100, prompt_tokens_details=SimpleNamespace(cached_tokens=64))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='feat: cached'))], usage=usage)
+
+    completions.create = create
+    generator.generate_commit_message(sections(1), 'en', 'brief', {})
+    generator.generate_commit_message(sections(1), 'en', 'brief', {})
+    assert generator.last_stats.cached_tokens == 64
+    assert generator.cached_tokens == 128
+
+
+class TransientError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f'status {status_code}')
+        self.status_code = status_code
+
+
+def test_rate_limits_are_retried_and_counted(make_generator):
+    generator, completions = make_generator()
+    generator.scheduler._sleep = lambda seconds: None
+    answer = completions.create
+    failures = [TransientError(429), TransientError(503)]
+
+    def create(model, messages, **kwargs):
+        if failures:
+            raise failures.pop(0)
+        return answer(model, messages, **kwargs)
+
+    completions.create = create
+    message, _ = generator.generate_commit_message(sections(1), 'en', 'brief', {})
+    assert message == 'feat: final message'
+    assert generator.last_stats.retries == 2
+    assert generator.retries == 2
+
+
+
+def test_concurrent_calls_keep_their_own_stats_and_prompt(make_generator):
+    generator, completions = make_generator()
+    generator.scheduler._sleep = lambda seconds: None
+    answer = completions.create
+    failures = [TransientError(429)]
+    failed = threading.Event()
+
+    def create(model, messages, **kwargs):
+        if 'b.py' in messages[-1]['content'] and failures:
+            failed.set()
+            raise failures.pop(0)
+        failed.wait(1)  # the other call retries in the meantime
+        return answer(model, messages, **kwargs)
+
+    completions.create = create
+    results = {}
+
+    def call(path):
+        generator.generate_commit_message([f'{path} modified'], 'en', 'brief', {})
+        results[path] = generator.last_stats, generator.last_prompt
+
+    threads = [threading.Thread(target=call, args=(path,)) for path in ('a.py', 'b.py')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results['a.py'][0].retries == 0 and results['b.py'][0].retries == 1
+    assert results['a.py'][1][-1]['content'] == 'a.py modified'
+    assert results['b.py'][1][-1]['content'] == 'b.py modified'
+    assert generator.last_stats is None  # nothing was called on this thread
+    assert generator.retries == 1
+
+def test_client_errors_and_shown_streams_are_not_retried(make_generator):
+    generator, completions = make_generator()
+    generator.scheduler._sleep = lambda seconds: None
+
+    def bad_request(model, messages, **kwargs):
+        raise TransientError(400)
+
+    completions.create = bad_request
+    with pytest.raises(TransientError):
+        generator.generate_commit_message(sections(1), 'en', 'brief', {})
+
+    def broken_stream():
+        yield stream_chunk('feat: ')
+        raise TransientError(502)
+
+    completions.create = lambda model, messages, **kwargs: broken_stream()
+    with pytest.raises(TransientError):
+        generator.generate_commit_message(sections(1), 'en', 'brief', {}, on_delta=lambda text: None)
+    assert generator.retries == 0
+
+
+def test_candidates_come_from_one_request(make_generator):
+    generator, completions = make_generator()
+    requested = []
+
+    def create(model, messages, n=1, **kwargs):
+        requested.append(n)
+        contents = ['feat: one', 'feat: two', 'feat: one'][:n]
+        choices = [SimpleNamespace(message=SimpleNamespace(content=content)) for content in contents]
+        return SimpleNamespace(choices=choices, usage=SimpleNamespace(total_tokens=30))
+
+    completions.create = create
+    candidates, tokens = generator.generate_candidates(sections(1), 'en', 'brief', {}, 3)
+    assert requested == [3]
+    assert candidates == ['feat: one', 'feat: two']  # duplicates are dropped
+    assert tokens == 30
+
+
+def test_regenerate_reuses_the_prompt(make_generator):
+    generator, completions = make_generator(max_chunks=4)
+    with pytest.raises(ValueError):
+        generator.regenerate('feat: final message')
+
+    generator.generate_commit_message(sections(3), 'en', 'brief', {})
+    prompt = completions.calls[-1]
+    requests = len(completions.calls)
+    messages, _ = generator.regenerate('feat: final message', hint='mention the tests')
+    assert messages == ['feat: final message']
+    assert len(completions.calls) == requests + 1  # no chunks are summarized again
+    retry = completions.calls[-1]
+    assert retry[:len(prompt)] == prompt
+    assert retry[len(prompt)] == {'role': 'assistant', 'content': 'feat: final message'}
+    assert 'mention the tests' in retry[-1]['content']
@@ -0,0 +1,207 @@
+import io
+
+from rich.console import Console
+
+import pytest
+from git.repo import Repo as GitRepo
+
+from conftest import git
+
+from git_wise.utils.git_utils import (
+    get_all_staged_diffs,
+    iter_staged_diffs,
+    iter_staged_files,
+    parse_staged_diff_stream,
+    print_staged_changes,
+    process_file_ai_mode,
+    process_file_user_mode,
+    STAGED_DIFF_ARGS,
+)
+
+
+@pytest.fixture
+def repo(git_repo, tmp_path):
+    (tmp_path / 'mod.txt').write_text('a\nb\nc\nd\ne\nf\ng\n')
+    (tmp_path / 'ren.txt').write_text(''.join(f'{i}\n' for i in range(50)))
+    (tmp_path / 'del.txt').write_text('gone\n')
+    git(tmp_path, 'add', '.')
+    git(tmp_path, 'commit', '-qm', 'init')
+
+    (tmp_path / 'mod.txt').write_text('a\nB\nc\nd\ne\nf\ng\n')
+    git(tmp_path, 'mv', 'ren.txt', 'renamed.txt')
+    with open(tmp_path / 'renamed.txt', 'a') as f:
+        f.write('extra\n')
+    git(tmp_path, 'rm', '-q', 'del.txt')
+    (tmp_path / 'new.txt').write_text('new\nfile')
+    (tmp_path / 'sp ace').mkdir()
+    (tmp_path / 'sp ace' / 'ü.txt').write_text('hi\n')
+    git(tmp_path, 'add', '-A')
+    return GitRepo(tmp_path)
+
+
+def test_iter_staged_files_statuses(repo):
+    files = {f.path: f for f in iter_staged_files(repo)}
+    assert {path: f.status for path, f in files.items()} == {
+        'del.txt': 'deleted',
+        'mod.txt': 'modified',
+        'new.txt': 'new',
+        'renamed.txt': 'renamed',
+        'sp ace/ü.txt': 'new',
+    }
+    assert files['renamed.txt'].old_path == 'ren.txt'
+    assert files['new.txt'].old_sha is None
+    assert len(files['mod.txt'].new_sha) == 40
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1 << 16])
+def test_parse_stream_is_chunk_independent(repo, chunk_size):
+    raw = repo.git.diff(*STAGED_DIFF_ARGS, stdout_as_string=False, strip_newline_in_stdout=False)
+    expected = list(parse_staged_diff_stream(io.BytesIO(raw)))
+    assert list(parse_staged_diff_stream(io.BytesIO(raw), chunk_size=chunk_size)) == expected
+
+
+def test_patch_output_matches_per_file_commands(repo):
+    for f in iter_staged_files(repo):
+        if f.status == 'renamed':
+            continue  # the per-file diff cannot see the rename source
+        assert (process_file_ai_mode(repo, f.path, f.status, f.old_path, f.diff)
+                == process_file_ai_mode(repo, f.path, f.status, f.old_path))
+        assert (process_file_user_mode(repo, f.path, f.status, f.old_path, f.diff)
+                == process_file_user_mode(repo, f.path, f.status, f.old_path))
+
+
+def test_get_all_staged_diffs_ai_mode(repo):
+    diffs = get_all_staged_diffs(repo)
+    assert diffs['new.txt'] == ['new.txt', 'new', 'new\nfile']
+    assert diffs['mod.txt'] == ['mod.txt', 'modified', '@@ -1,5 +1,5 @@\n-b\n+B']
+    assert diffs['del.txt'] == ['del.txt', 'deleted', '[File deleted]']
+    assert diffs['renamed.txt'][2].endswith('+extra')
+
+
+def test_type_change_and_empty_index(repo, tmp_path):
+    git(tmp_path, 'commit', '-qm', 'second')
+    assert list(iter_staged_files(repo)) == []
+
+    (tmp_path / 'mod.txt').unlink()
+    (tmp_path / 'mod.txt').symlink_to('new.txt')
+    (tmp_path / 'new.txt').write_text('changed\n')
+    git(tmp_path, 'add', '-A')
+    files = {f.path: f for f in iter_staged_files(repo)}
+    assert files['mod.txt'].status == 'modified'
+    assert files['mod.txt'].diff.count('diff --git') == 2
+    assert '+changed' in files['new.txt'].diff
+
+
+def test_github_info_is_served_from_cache_and_refreshed_in_background(repo, monkeypatch):
+    from git_wise.utils import git_utils
+
+    remote = 'https://github.com/creeponsky/git-wise'
+    spawned = []
+    monkeypatch.setattr(git_utils, 'refresh_github_info_in_background', lambda *args: spawned.append(args))
+    monkeypatch.setattr(git_utils, 'get_github_info', lambda url: {'description': 'fetched', 'language': 'Python'})
+
+    assert git_utils.get_cached_github_info(repo, remote, offline=True) is None
+    assert spawned == []
+
+    assert git_utils.get_cached_github_info(repo, remote) is None
+    assert len(spawned) == 1
+    # a refresh is already running, do not start another one
+    assert git_utils.get_cached_github_info(repo, remote) is None
+    assert len(spawned) == 1
+
+    git_utils.refresh_github_info(*spawned[0])
+    assert git_utils.get_cached_github_info(repo, remote) == {'description': 'fetched', 'language': 'Python'}
+    assert len(spawned) == 1
+
+    assert git_utils.get_cached_github_info(repo, 'https://gitlab.com/a/b') is None
+    assert len(spawned) == 1
+
+
+
+def test_diff_cache_skips_the_patches_of_known_blob_pairs(repo, tmp_path):
+    from git_wise.core.cache import DiffCache
+
+    cache_dir = str(tmp_path / '.git' / 'git-wise' / 'diffs')
+    expected = get_all_staged_diffs(repo)
+    cache = DiffCache(cache_dir)
+    assert get_all_staged_diffs(repo, diff_cache=cache) == expected
+    cache.save()
+
+    # one more edit: only that file is diffed again
+    (tmp_path / 'new.txt').write_text('new\nfile\nmore')
+    git(tmp_path, 'add', '-A')
+    files = {f.path: f for f in iter_staged_files(repo, diff_cache=DiffCache(cache_dir))}
+    assert files['new.txt'].cached is None and '+more' in files['new.txt'].diff
+    assert files['mod.txt'].diff is None and files['mod.txt'].cached == expected['mod.txt'][2]
+    assert files['renamed.txt'].cached == expected['renamed.txt'][2]
+    assert files['del.txt'].cached is None  # never diffed, nothing to cache
+
+    diffs = get_all_staged_diffs(repo, diff_cache=DiffCache(cache_dir))
+    assert diffs['new.txt'] == ['new.txt', 'new', 'new\nfile\nmore']
+    assert diffs['mod.txt'] == expected['mod.txt']
+
+@pytest.mark.parametrize('exclude_args_length', [16 * 1024, 0])
+def test_large_and_unneeded_patches_are_not_read(repo, tmp_path, monkeypatch, exclude_args_length):
+    from git_wise.utils import git_utils
+
+    monkeypatch.setattr(git_utils, 'MAX_BLOB_SIZE', 1000)
+    monkeypatch.setattr(git_utils, 'MAX_EXCLUDE_ARGS_LENGTH', exclude_args_length)
+    (tmp_path / 'big.txt').write_text('x' * 60000)
+    (tmp_path / 'mod.txt').write_text('m\n' * 600)
+    git(tmp_path, 'add', '-A')
+
+    files = {f.path: f for f in iter_staged_files(repo)}
+    assert files['big.txt'].diff is None and files['big.txt'].size == 60000
+    assert '+m' in files['mod.txt'].diff and files['mod.txt'].size == 1200  # only new files are limited
+    assert files['del.txt'].diff is None and files['del.txt'].size == 5
+    assert '+file' in files['new.txt'].diff
+    assert list(files) == [f.path for f in iter_staged_files(repo, for_prompt=False)]
+
+    diffs = get_all_staged_diffs(repo)
+    assert diffs['big.txt'] == ['big.txt', 'new', '[Large new file: 58.6KB]']
+    assert diffs['mod.txt'][2].startswith('@@')
+    assert diffs['del.txt'] == ['del.txt', 'deleted', '[File deleted]']
+    assert get_all_staged_diffs(repo, for_prompt=False)['del.txt']['content'] == 'gone'
+
+
+def test_large_modified_files_send_their_patch(repo, tmp_path):
+    from git_wise.utils import git_utils
+
+    lines = [f'line {i}' for i in range(120000)]
+    (tmp_path / 'large.txt').write_text('\n'.join(lines) + '\n')
+    git(tmp_path, 'add', 'large.txt')
+    git(tmp_path, 'commit', '-qm', 'large')
+    lines[5000] = 'changed'
+    (tmp_path / 'large.txt').write_text('\n'.join(lines) + '\n')
+    git(tmp_path, 'add', 'large.txt')
+    assert (tmp_path / 'large.txt').stat().st_size > git_utils.MAX_BLOB_SIZE
+
+    changes = get_all_staged_diffs(repo)['large.txt'][2]
+    assert '-line 5000\n+changed' in changes
+    assert '+changed' in get_all_staged_diffs(repo, for_prompt=False)['large.txt']['content']
+
+    (tmp_path / 'large.txt').write_text('\n'.join(f'new {i}' for i in range(120000)) + '\n')
+    git(tmp_path, 'add', 'large.txt')
+    rewritten = get_all_staged_diffs(repo)['large.txt'][2]
+    assert len(rewritten.encode()) < git_utils.MAX_CONTENT_SIZE + 100
+    assert rewritten.endswith('KB more]')
+
+
+def test_show_diff_reads_files_lazily_and_caps_their_size(repo, tmp_path):
+    (tmp_path / 'long.txt').write_text('x' * 100 + '\n')
+    (tmp_path / 'mod.txt').write_text('changed\n' * 50)
+    git(tmp_path, 'add', '-A')
+
+    changes = iter_staged_diffs(repo, for_prompt=False, max_bytes=40)
+    path, info = next(changes)
+    assert path == 'del.txt' and info['content'] == 'gone' and not info['truncated']
+    rest = dict(changes)
+    assert rest['long.txt']['content'] == 'x' * 40 and rest['long.txt']['truncated']
+    assert len(rest['mod.txt']['content']) <= 40 and rest['mod.txt']['truncated']
+    assert rest['renamed.txt']['old_path'] == 'ren.txt' and rest['renamed.txt']['truncated']
+
+    output = io.StringIO()
+    print_staged_changes(iter_staged_diffs(repo, for_prompt=False, max_bytes=40), Console(file=output), preview_size=None)
+    text = output.getvalue()
+    assert 'File: long.txt' in text and 'x' * 40 + '...' in text
+    assert 'File: del.txt' in text and 'gone\n' in text
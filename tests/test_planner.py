@@ -0,0 +1,84 @@
+import pytest
+
+from git_wise.core.planner import classify_path, count_changed_lines, plan_prompt, score_change
+from git_wise.core.tokenizer import TokenCounter
+
+
+class CharCounter:
+    known = {}
+    upper_bound = TokenCounter.upper_bound
+    fits = TokenCounter.fits
+
+    def count_tokens_batch(self, messages):
+        return [len(m) for m in messages]
+
+
+def hunk(lines, sign='+'):
+    return '\n'.join(['@@ -1,1 +1,1 @@'] + [f'{sign}line {i}' for i in range(lines)])
+
+
+@pytest.mark.parametrize('path, kind', [
+    ('src/app/main.py', 'source'),
+    ('tests/test_main.py', 'test'),
+    ('web/button.spec.ts', 'test'),
+    ('pkg/main_test.go', 'test'),
+    ('pyproject.toml', 'config'),
+    ('deploy/values.yaml', 'config'),
+    ('docs/conf.py', 'docs'),
+    ('README.md', 'docs'),
+])
+def test_classify_path(path, kind):
+    assert classify_path(path) == kind
+
+
+def test_count_changed_lines():
+    assert count_changed_lines('modified', hunk(3) + '\n' + hunk(2, '-')) == (3, 2)
+    assert count_changed_lines('new', 'a\nb\nc') == (3, 0)
+    assert count_changed_lines('new', '[Large new file: 80.0KB]') == (0, 0)
+
+
+def test_source_outranks_tests_and_docs_of_the_same_size():
+    source = score_change('src/a.py', 'modified', 10, 0)
+    assert source > score_change('tests/test_a.py', 'modified', 10, 0)
+    assert source > score_change('docs/a.md', 'modified', 10, 0)
+    assert score_change('src/a.py', 'renamed', 0, 0) > score_change('src/a.py', 'modified', 0, 0)
+
+
+def test_everything_is_sent_when_it_fits():
+    diffs = {
+        'src/a.py': ['src/a.py', 'modified', hunk(5)],
+        'tests/test_a.py': ['tests/test_a.py', 'modified', hunk(5)],
+    }
+    plan = plan_prompt(diffs, CharCounter(), budget=10_000)
+    assert plan.sections == ['\n'.join(change) for change in diffs.values()]
+    assert plan.summarized == []
+    assert plan.tokens == plan.full_tokens
+
+
+def test_budget_is_filled_by_priority_not_position():
+    diffs = {
+        # first in git order, but only a large test change
+        'tests/test_big.py': ['tests/test_big.py', 'modified', hunk(200)],
+        'src/core.py': ['src/core.py', 'modified', hunk(30)],
+        'src/util.py': ['src/util.py', 'modified', hunk(5)],
+    }
+    plan = plan_prompt(diffs, CharCounter(), budget=1000)
+
+    summarized = {f.path for f in plan.summarized}
+    assert summarized == {'tests/test_big.py'}
+    assert plan.tokens <= 1000
+    assert plan.tokens == sum(len(s) for s in plan.sections)
+    # sections keep the staged order, summaries are one line naming the file
+    assert [s.split('\n')[0] for s in plan.sections] == list(diffs)
+    summary = plan.sections[0].split('\n')
+    assert summary[:2] == ['tests/test_big.py', 'modified'] and len(summary) == 3
+    assert '+200 -0' in summary[2]
+
+
+def test_smaller_files_still_fill_the_budget_after_one_does_not_fit():
+    diffs = {
+        'src/huge.py': ['src/huge.py', 'modified', hunk(400)],
+        'docs/small.md': ['docs/small.md', 'modified', hunk(3)],
+    }
+    plan = plan_prompt(diffs, CharCounter(), budget=500)
+    assert [f.path for f in plan.summarized] == ['src/huge.py']
@@ -0,0 +1,51 @@
+import subprocess
+
+import pytest
+
+from git_wise.core import providers as providers_module
+from git_wise.core.providers import LOCAL_BASE_URL, get_client, get_providers, resolve_provider
+
+
+@pytest.fixture(autouse=True)
+def no_api_key(monkeypatch):
+    monkeypatch.setattr(providers_module, 'get_api_key', lambda: None)
+
+
+def test_config_updates_and_adds_providers():
+    providers = get_providers({'providers': {
+        'local': {'model': 'qwen2.5-coder', 'timeout': '5'},
+        'groq': {'base_url': 'https://api.groq.com/openai/v1', 'api_key': 'gsk', 'unknown': 1},
+    }})
+    assert providers['local'].base_url == LOCAL_BASE_URL
+    assert providers['local'].model == 'qwen2.5-coder' and providers['local'].timeout == 5.0
+    assert providers['groq'].resolve_api_key() == 'gsk'
+    assert providers['openai'].base_url is None
+
+
+def test_selection_order(tmp_path):
+    subprocess.run(['git', 'init', '-q'], cwd=tmp_path, check=True)
+    assert resolve_provider({}, cwd=tmp_path).name == 'openai'
+    assert resolve_provider({'provider': 'local'}, cwd=tmp_path).name == 'local'
+    subprocess.run(['git', 'config', 'git-wise.provider', 'openai'], cwd=tmp_path, check=True)
+    assert resolve_provider({'provider': 'local'}, cwd=tmp_path).name == 'openai'
+    assert resolve_provider({}, 'local', cwd=tmp_path).name == 'local'
+    with pytest.raises(ValueError):
+        resolve_provider({}, 'missing', cwd=tmp_path)
+
+
+def test_api_keys_and_shared_clients():
+    providers = get_providers({})
+    assert providers['openai'].resolve_api_key() is None
+    assert providers['local'].resolve_api_key() == 'not-needed'
+
+    client = get_client(providers['local'])
+    assert get_client(providers['local']) is client
+    assert str(client.base_url).startswith(LOCAL_BASE_URL)
+
+
+def test_openai_key_stays_with_openai(monkeypatch):
+    monkeypatch.setattr(providers_module, 'get_api_key', lambda: 'sk-secret')
+    providers = get_providers({'providers': {'ollama': {'base_url': 'http://127.0.0.1:11434/v1'}}})
+    assert providers['openai'].resolve_api_key() == 'sk-secret'
+    assert providers['local'].resolve_api_key() == 'not-needed'
+    assert providers['ollama'].resolve_api_key() == 'not-needed'
@@ -0,0 +1,118 @@
+import email.utils
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from git_wise.core.scheduler import RequestScheduler, TokenBucket, get_retry_after
+
+
+class Clock:
+    """Time that only passes when someone sleeps."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class Failure(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f'status {status_code}')
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+def failing(*errors, result='ok'):
+    errors = list(errors)
+
+    def request():
+        if errors:
+            raise errors.pop(0)
+        return result
+    return request
+
+
+def test_token_bucket_spreads_a_burst_over_the_minute():
+    clock = Clock()
+    bucket = TokenBucket(60, clock)  # one per second
+    assert bucket.reserve(60) == 0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    assert bucket.reserve(1) == pytest.approx(2.0)
+    clock.now += 2
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    # more than the whole budget waits for a full bucket, not forever
+    assert TokenBucket(60, clock).reserve(600) == 0
+
+
+def test_requests_per_minute_are_paced():
+    clock = Clock()
+    scheduler = RequestScheduler(requests_per_minute=2, sleep=clock.sleep, clock=clock)
+    for _ in range(4):
+        scheduler.run(lambda: None)
+    assert clock.now == pytest.approx(60)  # two at once, then one every 30 seconds
+
+
+def test_tokens_per_minute_use_the_estimate_and_the_real_usage():
+    clock = Clock()
+    scheduler = RequestScheduler(tokens_per_minute=1000, sleep=clock.sleep, clock=clock)
+    scheduler.run(lambda: None, tokens=400)
+    scheduler.record_usage(400, 1000)  # the answer used all of it
+    scheduler.run(lambda: None, tokens=500)
+    assert clock.now == pytest.approx(30)
+
+
+def test_retry_after_is_honored_and_pauses_everyone():
+    clock = Clock()
+    scheduler = RequestScheduler(sleep=clock.sleep, clock=clock)
+    retried = []
+    result = scheduler.run(failing(Failure(429, {'retry-after': '7'})), on_retry=lambda *args: retried.append(args))
+    assert result == 'ok'
+    assert clock.sleeps == [7.0]
+    assert scheduler.retries == 1 and retried[0][:2] == (0, 7.0)
+    assert scheduler._paused_until == 7.0
+
+
+
+def test_retries_reserve_the_tokens_only_once():
+    clock = Clock()
+    scheduler = RequestScheduler(tokens_per_minute=1000, sleep=clock.sleep, clock=clock)
+    scheduler.run(failing(Failure(429, {'retry-after': '1'}), Failure(429, {'retry-after': '1'})), tokens=600)
+    assert clock.sleeps == [1.0, 1.0]
+    # 600 of the budget are taken, not 1800
+    scheduler.run(lambda: None, tokens=400)
+    assert clock.now == pytest.approx(2)
+
+def test_backoff_grows_and_gives_up():
+    clock = Clock()
+    scheduler = RequestScheduler(max_retries=3, base_delay=1, sleep=clock.sleep, clock=clock)
+    with pytest.raises(Failure):
+        scheduler.run(failing(*[Failure(500)] * 4))
+    assert scheduler.retries == 3
+    assert all(0 <= delay <= 2 ** attempt for attempt, delay in enumerate(clock.sleeps))
+
+
+def test_only_transient_errors_are_retried():
+    scheduler = RequestScheduler(sleep=lambda seconds: None)
+    with pytest.raises(Failure):
+        scheduler.run(failing(Failure(401)))
+    with pytest.raises(Failure):
+        scheduler.run(failing(Failure(503)), retryable=lambda: False)
+    with pytest.raises(ValueError):
+        scheduler.run(failing(ValueError('bug')))
+    assert scheduler.retries == 0
+
+
+def test_get_retry_after():
+    assert get_retry_after(Failure(429, {'retry-after-ms': '1500'})) == 1.5
+    assert get_retry_after(Failure(429, {'retry-after': '3'})) == 3.0
+    later = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 < get_retry_after(Failure(429, {'retry-after': later})) <= 30
+    assert get_retry_after(Failure(429)) is None
+    assert get_retry_after(ValueError()) is None
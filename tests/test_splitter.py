@@ -0,0 +1,88 @@
+import pytest
+from git.repo import Repo as GitRepo
+
+from conftest import git
+
+from git_wise.core.splitter import create_commits, get_co_changes, split_commits
+from git_wise.models.git_models import StagedFile
+from git_wise.utils.exceptions import GitWiseError
+from git_wise.utils.git_utils import list_staged_files
+
+
+def paths(groups):
+    return [[change.path for change in group] for group in groups]
+
+
+def test_split_by_directory_with_a_size_limit():
+    changes = [StagedFile(p, 'modified') for p in ['a/1.py', 'a/2.py', 'a/3.py', 'b/1.py', 'README.md']]
+    assert paths(split_commits(changes, max_files_per_commit=2)) == [['a/1.py', 'a/2.py'], ['a/3.py'], ['b/1.py'], ['README.md']]
+    assert paths(split_commits(changes, max_files_per_commit=10)) == [['a/1.py', 'a/2.py', 'a/3.py'], ['b/1.py'], ['README.md']]
+
+
+def test_co_changes_and_renames_come_before_directories():
+    changes = [
+        StagedFile('src/api.py', 'modified'),
+        StagedFile('src/util.py', 'modified'),
+        StagedFile('tests/test_api.py', 'modified'),
+        StagedFile('lib/moved.py', 'renamed', old_path='old/moved.py'),
+        StagedFile('old/__init__.py', 'modified'),
+    ]
+    groups = split_commits(changes, max_files_per_commit=2, co_changes={('src/api.py', 'tests/test_api.py'): 3})
+    assert paths(groups) == [['src/api.py', 'tests/test_api.py'], ['src/util.py'], ['lib/moved.py', 'old/__init__.py']]
+
+
+@pytest.fixture
+def repo(git_repo, tmp_path):
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'docs').mkdir()
+    for round in range(2):
+        (tmp_path / 'src' / 'api.py').write_text(f'v = {round}\n')
+        (tmp_path / 'docs' / 'api.md').write_text(f'v{round}\n')
+        git(tmp_path, 'add', '.')
+        git(tmp_path, 'commit', '-qm', f'round {round}')
+    (tmp_path / 'src' / 'old.py').write_text('x = 1\n' * 20)
+    git(tmp_path, 'add', '.')
+    git(tmp_path, 'commit', '-qm', 'old')
+
+    (tmp_path / 'src' / 'api.py').write_text('v = 2\n')
+    (tmp_path / 'docs' / 'api.md').write_text('v2\n')
+    (tmp_path / 'docs' / 'new.md').write_text('new\n')
+    git(tmp_path, 'mv', 'src/old.py', 'src/new.py')
+    git(tmp_path, 'rm', '-qf', 'docs/api.md')
+    (tmp_path / 'docs' / 'api.md').write_text('unstaged\n')
+    git(tmp_path, 'add', 'src', 'docs/new.md')
+    return GitRepo(tmp_path)
+
+
+def test_get_co_changes(repo):
+    co_changes = get_co_changes(repo, list_staged_files(repo))
+    assert co_changes[('docs/api.md', 'src/api.py')] == 2
+    assert co_changes[('src/api.py', 'src/new.py')] == 0
+
+
+def test_create_commits_only_moves_head(repo, tmp_path):
+    staged = list_staged_files(repo)
+    staged_tree = git(tmp_path, 'write-tree')
+    head = git(tmp_path, 'rev-parse', 'HEAD')
+    groups = split_commits(staged, max_files_per_commit=2)
+
+    commits = create_commits(repo, groups, [f'commit {i}' for i in range(len(groups))])
+
+    assert len(commits) == len(groups) > 1
+    assert git(tmp_path, 'rev-parse', 'HEAD') == commits[-1]
+    assert git(tmp_path, 'rev-parse', f'HEAD~{len(groups)}') == head
+    assert git(tmp_path, 'rev-parse', 'HEAD^{tree}') == staged_tree
+    assert git(tmp_path, 'diff', '--cached', '--name-only') == ''
+    assert git(tmp_path, 'log', '--format=%s', f'-{len(groups)}').split('\n')[::-1] == [f'commit {i}' for i in range(len(groups))]
+    assert (tmp_path / 'docs' / 'api.md').read_text() == 'unstaged\n'
+    for commit, group in zip(commits, groups):
+        changed = git(tmp_path, 'diff', '--name-only', '-M', f'{commit}^', commit).split('\n')
+        assert sorted(changed) == sorted(change.path for change in group)
+
+
+def test_create_commits_checks_the_result(repo, tmp_path):
+    head = git(tmp_path, 'rev-parse', 'HEAD')
+    staged = list_staged_files(repo)
+    with pytest.raises(GitWiseError):
+        create_commits(repo, [staged[:1]], ['partial'])
+    assert git(tmp_path, 'rev-parse', 'HEAD') == head
@@ -0,0 +1,90 @@
+import hashlib
+import os
+
+import pytest
+
+from git_wise.core import tokenizer
+from git_wise.core.chunker import DiffChunker
+from git_wise.core.planner import plan_prompt
+from git_wise.core.tokenizer import TokenCounter, encoding_name, find_cached_encoding, tiktoken_cache_dir
+
+
+@pytest.fixture
+def no_tokenizer(monkeypatch):
+    def load_encoding(name):
+        raise AssertionError('the tokenizer was loaded')
+
+    monkeypatch.setattr(tokenizer, 'load_encoding', load_encoding)
+
+
+@pytest.mark.parametrize('model, name', [
+    ('gpt-4o-mini', 'o200k_base'),
+    ('gpt-4.1', 'o200k_base'),
+    ('gpt-4', 'cl100k_base'),
+    ('gpt-4-turbo', 'cl100k_base'),
+    ('gpt-3.5-turbo', 'cl100k_base'),
+    ('llama3.1:8b', 'o200k_base'),
+])
+def test_encoding_name(model, name):
+    assert encoding_name(model) == name
+
+
+def test_fits_uses_upper_bounds(no_tokenizer):
+    counter = TokenCounter()
+    assert counter.fits(['a' * 100, 'b' * 100], 200)
+    assert not counter.fits(['a' * 100, 'b' * 101], 200)
+    assert counter.fits(['é' * 60], 120)  # 2 bytes per character
+    counter.known['x' * 500] = 100
+    assert counter.fits(['x' * 500], 100)
+    assert not counter.loaded
+
+
+def test_small_changes_are_never_encoded(no_tokenizer):
+    counter = TokenCounter()
+    sections = ['a.py\nmodified\n@@ -1 +1 @@\n+x = 1', 'b.py\nnew\nprint(1)']
+    chunks, total = DiffChunker(counter, 1000).chunk(sections)
+    assert chunks == ['\n'.join(sections)]
+    assert total == sum(len(s) for s in sections)
+
+    plan = plan_prompt({'a.py': ['a.py', 'modified', '@@ -1 +1 @@\n+x = 1']}, counter, 1000)
+    assert plan.sections == ['a.py\nmodified\n@@ -1 +1 @@\n+x = 1']
+    assert not plan.summarized
+    assert not counter.loaded
+
+
+@pytest.fixture
+def clean_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(tokenizer, '_encodings', {})
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    monkeypatch.delenv('TIKTOKEN_CACHE_DIR', raising=False)
+    monkeypatch.delenv('DATA_GYM_CACHE_DIR', raising=False)
+    monkeypatch.setattr(tokenizer, 'BUNDLED_CACHE_DIR', str(tmp_path / 'bundled'))
+    return tmp_path
+
+
+def test_offline_without_a_cached_file_falls_back_to_estimates(clean_cache, monkeypatch):
+    monkeypatch.setenv('GIT_WISE_OFFLINE', '1')
+    counter = TokenCounter()
+    assert counter.count_tokens('abcdefg') == 3
+    assert counter.name == 'approximate'
+
+    text = '\x00a\x00é漢字 line\n'
+    assert counter.decode_bytes(counter.encode(text)).decode('utf-8') == text
+    assert counter.estimate_tokens_batch(['abcdef']) == [2]
+
+
+def test_cached_files_are_found_and_the_environment_restored(clean_cache, monkeypatch):
+    key = hashlib.sha1(tokenizer.ENCODING_URL.format(name='o200k_base').encode()).hexdigest()
+    assert find_cached_encoding('o200k_base') is None
+    bundled = clean_cache / 'bundled'
+    bundled.mkdir()
+    (bundled / key).write_bytes(b'')
+    assert find_cached_encoding('o200k_base') == str(bundled)
+
+    with tiktoken_cache_dir(None):
+        assert os.environ['TIKTOKEN_CACHE_DIR'] == tokenizer.get_cache_dir()
+    assert 'TIKTOKEN_CACHE_DIR' not in os.environ
+    monkeypatch.setenv('TIKTOKEN_CACHE_DIR', '/somewhere')
+    with tiktoken_cache_dir(str(bundled)):
+        assert os.environ['TIKTOKEN_CACHE_DIR'] == str(bundled)
+    assert os.environ['TIKTOKEN_CACHE_DIR'] == '/somewhere'
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from git_wise.utils import tracing
+from git_wise.utils.tracing import enable_tracing, is_tracing, span
+
+
+@pytest.fixture(autouse=True)
+def no_tracing(monkeypatch):
+    monkeypatch.delenv('GIT_WISE_TRACE', raising=False)
+    monkeypatch.setattr(tracing, '_output', None)
+
+
+def read_spans(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_spans_are_written_as_json_lines(tmp_path):
+    trace = tmp_path / 'trace.jsonl'
+    assert enable_tracing(str(trace))
+
+    with span('outer', files=3) as attrs:
+        with span('inner'):
+            pass
+        attrs['bytes'] = 120
+
+    inner, outer = read_spans(trace)
+    assert inner['span'] == 'inner'
+    assert outer['span'] == 'outer'
+    assert outer['files'] == 3 and outer['bytes'] == 120
+    assert outer['duration_ms'] >= inner['duration_ms'] >= 0
+    assert outer['start_ms'] <= inner['start_ms']
+
+
+def test_errors_are_recorded(tmp_path):
+    trace = tmp_path / 'trace.jsonl'
+    enable_tracing(str(trace))
+
+    with pytest.raises(ValueError):
+        with span('failing'):
+            raise ValueError('boom')
+
+    assert read_spans(trace)[0]['error'] == 'ValueError'
+
+
+def test_environment_variable(tmp_path, monkeypatch):
+    trace = tmp_path / 'trace.jsonl'
+    monkeypatch.setenv('GIT_WISE_TRACE', str(trace))
+    assert enable_tracing()
+    # already on: the environment is not read again
+    monkeypatch.setenv('GIT_WISE_TRACE', '0')
+    assert enable_tracing()
+
+    with span('step'):
+        pass
+    assert [s['span'] for s in read_spans(trace)] == ['step']
+
+
+def test_nothing_is_written_when_off(monkeypatch, capsys):
+    monkeypatch.setenv('GIT_WISE_TRACE', '0')
+    assert not enable_tracing()
+    assert not is_tracing()
+
+    with span('step') as attrs:
+        attrs['files'] = 1
+
+    assert capsys.readouterr() == ('', '')
+
+
+def test_switching_targets_closes_the_previous_file(tmp_path):
+    first, second = tmp_path / 'first.jsonl', tmp_path / 'second.jsonl'
+    enable_tracing(str(first))
+    handle = tracing._output
+    enable_tracing(str(second))
+    assert handle.closed
+
+    with span('step'):
+        pass
+    assert first.read_text() == ''
+    assert [s['span'] for s in read_spans(second)] == ['step']
+    tracing.disable_tracing()
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+from git.repo import Repo as GitRepo
+
+from conftest import git
+
+from git_wise import hook
+from git_wise.watch import IndexWatcher, precomputed_cache, precomputed_key, staged_tree
+
+
+@pytest.fixture
+def repo(git_repo, tmp_path, monkeypatch):
+    (tmp_path / 'a.txt').write_text('a\n')
+    git(tmp_path, 'add', 'a.txt')
+    monkeypatch.chdir(tmp_path)
+    return GitRepo(tmp_path)
+
+
+@pytest.mark.parametrize('poll', [False, True])
+def test_index_watcher_sees_staging(repo, poll):
+    watcher = IndexWatcher(os.path.join(repo.git_dir, 'index'), poll_interval=0.05)
+    if poll:
+        watcher.close()  # falls back to polling
+    try:
+        assert not watcher.wait(timeout=0.1)
+        with open(os.path.join(repo.working_dir, 'b.txt'), 'w') as f:
+            f.write('b\n')
+        git(repo.working_dir, 'add', 'b.txt')
+        assert watcher.wait(timeout=2)
+    finally:
+        watcher.close()
+
+
+def test_staged_tree_follows_the_index(repo):
+    tree = staged_tree(repo)
+    assert tree and tree == staged_tree(repo)
+    with open(os.path.join(repo.working_dir, 'b.txt'), 'w') as f:
+        f.write('b\n')
+    git(repo.working_dir, 'add', 'b.txt')
+    assert staged_tree(repo) != tree
+
+
+def test_hook_install_and_uninstall(repo):
+    path = hook.install(deadline=3)
+    assert os.access(path, os.X_OK)
+    assert '--deadline 3' in open(path).read()
+    assert hook.install() == path  # ours, so it is replaced
+    assert hook.uninstall() == path
+    assert not os.path.exists(path)
+    assert hook.uninstall() is None
+
+
+def test_hook_install_keeps_other_hooks(repo):
+    path = hook.get_hook_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write('#!/bin/sh\nexit 0\n')
+    with pytest.raises(FileExistsError):
+        hook.install()
+    assert hook.uninstall() is None
+    assert hook.install(force=True) == path
+
+
+def test_hook_fills_in_the_precomputed_message(repo, tmp_path):
+    precomputed_cache(repo).put(precomputed_key(staged_tree(repo), {}), 'feat: add a')
+    message_file = tmp_path / 'COMMIT_EDITMSG'
+    message_file.write_text('\n# Please enter the commit message\n')
+
+    assert hook.run(str(message_file), deadline=0) == 0
+    assert message_file.read_text() == 'feat: add a\n\n# Please enter the commit message\n'
+
+
+def test_hook_leaves_given_messages_alone(repo, tmp_path):
+    precomputed_cache(repo).put(precomputed_key(staged_tree(repo), {}), 'feat: add a')
+    message_file = tmp_path / 'COMMIT_EDITMSG'
+    message_file.write_text('my message\n')
+    assert hook.run(str(message_file), source='message') == 0
+    assert message_file.read_text() == 'my message\n'
+
+
+def test_hook_never_fails_the_commit(repo, tmp_path, monkeypatch, capsys):
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    monkeypatch.setattr('git_wise.config.CONFIG_FILE', str(tmp_path / 'missing.yaml'))
+    message_file = tmp_path / 'COMMIT_EDITMSG'
+    message_file.write_text('# comments\n')
+    assert hook.run(str(message_file), deadline=5) == 0
+    assert message_file.read_text() == '# comments\n'
+    assert 'git-wise: no commit message' in capsys.readouterr().err